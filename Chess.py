@@ -7,19 +7,73 @@
 #         b. Fixed illegal responses to "check" (not including castling)
 #         c. Lichess.org Anarcandy piece set, owned by Lichess.org
 #         d. Support to resign, draw, or create new game
+#         e. Headless game state (anarchist_chess.Position) instead of reading pieces back out of button images
+#         f. Support for the en passant rule
+#         g. A computer opponent that thinks in a background thread
+#         h. Draws by threefold repetition and the fifty-move rule can be claimed with the DRAW button
+#         i. Loading and saving games (PGN) and positions (FEN)
+#         j. Piece images are scaled once and cached on disk, and follow the window size
+#         k. The board is one canvas that redraws only the squares a move changed
+#         l. A picked up piece shows where it may go, and the path a horsey takes; pieces that can't move can't be
+#            picked up, which fixes the touchmove rule's infinite loop
+#         m. Undo, redo and takeback
+#         n. A PROFILE button that times the game's code and shows the numbers over the board; set
+#            ANARCHIST_CHESS_PROFILE=profile.json to profile from the start and write them out on exit
+#         o. Endgame tablebases (python3 -m anarchist_chess.tablebase): the computer plays solved endgames
+#            perfectly, and the status line tells who mates in how many moves
+#         p. An opening book (python3 -m anarchist_chess.book build games.pgn): the computer plays its openings from
+#            it, and the status line lists the book moves
+#         q. Each kink is declared once in anarchist_chess.rules and compiled into the rules of a game when it
+#            starts; castling out of and through check (castle-through-check) is one of them. The kinks of a
+#            new game are ticked under the buttons, or given as python3 Chess.py --rules b1,forced-ep
+#         r. The game is saved after every move, from a background thread, and picked up again when the program
+#            starts; python3 -m anarchist_chess.snapshot converts archives of saved games to and from PGN
+#         s. The window only opens when this file is run, so Board can be imported; the computer opponent also
+#            plays over UCI without Tk (python3 -m anarchist_chess.uci)
+#         t. Premoves: while the computer thinks, moves can be lined up and are played the moment they are legal.
+#            Clicks are queued and handled when Tk is idle, promotion is picked over the board instead of in a
+#            second window, and the time from a click to the board showing it is shown under the buttons
 # Future updates:
 #         a. Two moves per turn, utilizing the concept of "premove"
-#         b. Fix the infinite loop that occurs when the touchmove rule is violated
-#         c. Support for the en passant rule
-#         d. Forced en passant
-#         e. Visual indicator of how the "horsey" moves
-#         f. Castling through check, out of check, into check
+#         b. Castling into check
 
 import tkinter as tk
+from tkinter import filedialog  # asks which file to load a game from or save it to
 import string  # for a string to store alphabet
 import os, sys  # help with importing images
-from PIL import Image, ImageTk  # help with implementing images into GUI
-from PIL.ImageTk import PhotoImage
+import argparse  # reads --rules
+import atexit  # writes the profile out when the program ends
+import queue, threading  # lets the computer opponent think without freezing the window
+import time  # measures how long a click takes to show on the board
+from collections import deque  # clicks waiting to be handled
+from PIL import ImageTk  # help with implementing images into GUI
+from anarchist_chess import (WHITE, BLACK, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, Position, make_piece,
+                             parse_square, square_name, legal_moves, moves_by_destination)
+from anarchist_chess.attacks import horsey_turn, squares_of
+from anarchist_chess.book import Book
+from anarchist_chess.engine import Searcher
+from anarchist_chess.pgn import Game, read_games, read_fen, san
+from anarchist_chess.premove import PremoveQueue
+from anarchist_chess.profiling import Profiler, Stat
+from anarchist_chess.rules import ANARCHIST, KINKS, Rules
+from anarchist_chess.snapshot import Autosaver, read as read_snapshot
+from anarchist_chess.sprites import SpriteCache
+from anarchist_chess.tablebase import Tablebases, describe
+from anarchist_chess.transposition import TranspositionTable
+
+ENGINE_POLL_MS = 50  # how often the window checks whether the computer has found its move
+ENGINE_HASH_MB = 32  # memory the computer may use to remember positions it has searched
+BOOK_HINT_MOVES = 3  # book moves listed in the status line
+RESIZE_DELAY_MS = 150  # the board is laid out again once the window has stopped changing size for this long
+MIN_SQUARE_SIZE = 24  # pixels
+LIGHT_SQUARE = "gray"
+DARK_SQUARE = "green"
+SELECTED_SQUARE = "purple"
+DESTINATION_MARK = "purple"
+HORSEY_PATH = "orange"
+PREMOVE_SQUARE = "steel blue"
+PROFILE_ENV = "ANARCHIST_CHESS_PROFILE"  # file name to profile into from the start, written when the program ends
+PROFILE_REFRESH_MS = 500
 
 
 class Board(tk.Frame):
@@ -31,500 +85,632 @@ class Board(tk.Frame):
         self.parent = parent
         self.length = 8
         self.width = 8
-        self.config(height=100 * self.length, width=100 * self.width)
-        self.pack()
+        self.pack(fill=tk.BOTH, expand=True)
 
         # attributes of the board
-        self.square_color = None
-        self.squares = {}  # stores squares with pos as key and button as value
         self.ranks = string.ascii_lowercase[0:8]  # a to h
-        self.white_images = {}  # stores images of pieces
-        self.black_images = {}
-
-        # for convenience when calling all white or black pieces
-        # pyimage2 = "nothing" square, corresponds to "blank.png"
-        # then I didn't want to deal with copy-pasting shenanigans so I start black pieces at 8 and skip 9
-        # may eventually come back and tidy that naming scheme
-        self.white_pieces = ["pyimage1", "pyimage3", "pyimage4", "pyimage5", "pyimage6", "pyimage7"]
-        self.black_pieces = ["pyimage8", "pyimage10", "pyimage11", "pyimage12", "pyimage13", "pyimage14"]
+        self.sprites = None  # makes the piece images, see import_pieces()
+        self.piece_images = {}  # (piece code (see anarchist_chess.position), size) -> image drawn for it
+        self.square_size = 60  # pixels, follows the size of the canvas, see layout()
+        self.sprite_size = 48  # pieces fill four fifths of a square
+        self.board_x = 0  # canvas position of the top left corner of a8
+        self.board_y = 0
+        self.resize_job = None  # pending layout() while the window is being resized
+
+        # the board is drawn on one canvas: a rectangle and an image item per square, made once and then reused
+        self.canvas = tk.Canvas(self, width=8 * self.square_size, height=8 * self.square_size, highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Button-1>", self.click)
+        self.canvas.bind("<Configure>", self.resize_board)
+        self.square_items = []  # canvas rectangle of each square index
+        self.piece_items = []  # canvas image of each square index
+        self.marker_items = []  # canvas dot of each square index, shown on the picked up piece's destinations
+        self.path_items = []  # canvas lines showing the path of a picked up horsey, one per destination
+        self.selected = None  # square index shown as picked up
+        self.profiler = Profiler()  # times the functions wrapped by start_profiling(), nothing until then
+        self.profile_text = None  # canvas text showing the profile over the board, and the box behind it
+        self.profile_box = None
+        self.profile_job = None  # pending refresh_profile()
+
+        # the game state lives in a headless Position; the canvas only ever displays it
+        self.position = Position()
         self.buttons_pressed = 0
-        self.turns = 0
+        self.game_over = False
+        self.result = "*"  # result of the game as written in PGN, ex: "1-0"
+        self.status = tk.StringVar(self, value="")  # shown under the buttons, ex: "Checkmate, white wins"
+        # kink name -> whether the next new game is played with it; show_position() ticks the current game's
+        self.kinks = dict((name, tk.BooleanVar(self, value=kink in ANARCHIST.kinks)) for name, kink in KINKS.items())
 
         # each turn moves a piece on a square to a different square
         self.sq1 = None  # first square clicked
         self.sq2 = None
-        self.sq1_button = None  # button associated with the square clicked
-        self.sq2_button = None
-        self.piece_color = None
-
-        # castling rights
-        self.castleable_long_white = True
-        self.castleable_short_white = True
-        self.castleable_long_black = True
-        self.castleable_short_black = True
+        self.moves_cache = None  # legal moves of the position, worked out when first needed, see legal_move_list()
+        self.destinations = {}  # square -> legal moves of the picked up piece to that square (several if promoting)
+        self.clicks = deque()  # (square, time.perf_counter() of the click) not handled yet, see click()
+        self.click_job = None  # pending handle_clicks()
+        self.premoves = None  # PremoveQueue of the side playing the computer, see premove_queue()
+        self.premove_from = None  # square picked up to premove from
+        self.premove_squares = set()  # squares shown in PREMOVE_SQUARE
+        self.promotion_frame = None  # the buttons over the board asking what a pawn promotes to
+        self.input_latency = Stat()  # seconds from clicks to the board showing what they did
+        self.latency = tk.StringVar(self, value="")  # shown under the status line
+
+        # computer opponent settings, shown next to the RESIGN/DRAW/NEW GAME buttons
+        self.engine_color = tk.StringVar(self, value="Nobody")  # "Nobody", "White" or "Black"
+        self.engine_depth = tk.IntVar(self, value=4)  # deepest iteration the search may reach
+        self.engine_time = tk.DoubleVar(self, value=2.0)  # seconds the computer may think per move
+        self.engine_thread = None
+        self.engine_stop = None  # threading.Event telling the current search to give up
+        self.engine_results = queue.Queue()  # the worker thread puts its move here for the main thread to pick up
+        self.transpositions = TranspositionTable(ENGINE_HASH_MB)  # kept between moves so earlier work is reused
+        self.tablebases = Tablebases()  # solved endgames, if any have been generated
+        self.book = Book.open()  # opening moves, None if no book has been built
+        self.autosaver = Autosaver()  # writes the game to disk after every move, see autosave()
 
         self.set_squares()
 
-    def select_piece(self, button):  # called when a square button is pressed, consists of majority of the movement code
-
-        # what color is the piece that was just pressed?
-        if button["image"] in self.white_pieces and self.buttons_pressed == 0:  # checks color of first piece
-            self.piece_color = "white"
-        elif button["image"] in self.black_pieces and self.buttons_pressed == 0:
-            self.piece_color = "black"
-
-        if (self.piece_color == "white" and self.turns % 2 == 0) or \
-                (self.piece_color == "black" and self.turns % 2 == 1) or \
-                self.buttons_pressed == 1:  # makes sure player only moves on their turn
-            if self.buttons_pressed == 0:  # stores square and button of first square selected
-                self.sq1 = list(self.squares.keys())[
-                    list(self.squares.values()).index(button)]  # retrieves pos of piece
-                self.sq1_button = button
-                self.buttons_pressed += 1
-
-            elif self.buttons_pressed == 1:  # stores square and button of second square selected
-                self.sq2 = list(self.squares.keys())[list(self.squares.values()).index(button)]
-                self.sq2_button = button
-                if self.sq2 == self.sq1:  # prevents self-destruction and allows the user to choose a new piece
-                    self.buttons_pressed = 0
-                    return
-
-                if self.allowed_piece_move() and self.friendly_fire() is False:  # makes sure the move is "legal"
-                    # stores current square values for future use
-                    # ensures that multiple illegal moves can be made in a row without losing original state
-                    prev_sq1 = self.sq1
-                    prev_sq1_button_piece = self.sq1_button["image"]
-                    prev_sq2 = self.sq2
-                    prev_sq2_button_piece = self.sq2_button["image"]
-
-                    # moves the piece in square 1 to square 2 and clears square 1
-                    self.squares[self.sq2].config(image=self.sq1_button["image"])  # moves piece in sq1 to sq2
-                    self.squares[self.sq2].image = self.sq1_button["image"]
-                    self.squares[self.sq1].config(image=self.white_images["blank.png"])  # clears sq1
-                    self.squares[self.sq1].image = self.white_images["blank.png"]
-
-                    if self.in_check():  # the king may be moving into check, we can't allow that
-                        self.squares[prev_sq2].config(image=prev_sq2_button_piece)
-                        self.squares[prev_sq2].image = prev_sq2_button_piece
-                        self.squares[prev_sq1].config(image=prev_sq1_button_piece)
-                        self.squares[prev_sq1].image = prev_sq1_button_piece
-                        self.buttons_pressed = 0
-                        return
-
-                    else:  # runs if king is not in check, checks if kings or rooks have moved, preventing castling in the future
-                        self.buttons_pressed = 0
-                        self.turns += 1
-                        if (button["image"] == "pyimage5" and prev_sq2.count("8") == 1) or (
-                                button["image"] == "pyimage12" and prev_sq2.count(
-                            "1") == 1):  # checks for possible pawn promotion
-                            self.promotion_menu(self.piece_color)
-
-        else:
-            self.buttons_pressed = 0
+    def click(self, event):
+        """Turns a click on the canvas into the square clicked and queues it; the rules are only asked about it in
+        handle_clicks(), once Tk is idle, so a quick run of clicks is never held up by them"""
+        square = self.square_at(event.x, event.y)
+        if square is None:
+            return
+        self.clicks.append((square, time.perf_counter()))
+        if self.click_job is None:
+            self.click_job = self.after_idle(self.handle_clicks)
+
+    def handle_clicks(self):
+        """Handles every queued click in order, then times them once the board has been drawn"""
+        self.click_job = None
+        clicked = []
+        while self.clicks:
+            square, when = self.clicks.popleft()
+            self.select_piece(square_name(square))
+            clicked.append(when)
+        self.after_idle(self.shown, clicked)  # the canvas redraws in an idle callback queued ahead of this one
+
+    def shown(self, clicked):
+        """Records how long the clicks took to show on the board, and shows the numbers
+
+        :param clicked: time.perf_counter() of each click"""
+        now = time.perf_counter()
+        for when in clicked:
+            self.input_latency.add(now - when)
+        self.latency.set("Click to screen: %.1fms, p99 %.1fms over %d clicks" % (
+            1000 * (now - clicked[-1]), 1000 * self.input_latency.percentile(0.99), self.input_latency.calls))
+
+    def select_piece(self, pos):  # called when a square is clicked, consists of majority of the movement code
+        """Handles a click on the square pos. The first click picks a piece of the side to move, the second its destination.
+
+        :param pos: the square clicked as a string, ex: \"e2\""""
+        square = parse_square(pos)
+        if self.promotion_frame is not None:  # clicking the board instead of a piece to promote to takes it back
+            self.close_promotion()
+            return
+        if self.game_over:
+            return
+        if self.engine_to_move():  # the computer is thinking, so the click is for a premove
+            self.premove_click(square)
             return
 
-    def promotion_menu(self, color):  # creates menu to choose what piece to change the pawn to
-        """Creates and displays a promotion menu for the user to pick a piece to promote to.
-
-        :param color: A string that passes the piece color for accurate promotion icon colors"""
-
-        def generate_promo_piece(piece):
-            """Replaces the Button on the promotion square with the chosen promoted piece
+        if self.buttons_pressed == 0:  # stores the first square selected, if it holds a piece of the side to move
+            if self.position.color_at(square) != self.position.side:  # makes sure player only moves on their turn
+                return
+            # worked out once here, so the second click only has to look the square up
+            destinations = moves_by_destination(self.legal_move_list(), square)
+            if not destinations:  # the Touchmove rule would hold on to a piece that can't move forever
+                self.status.set("That piece has no legal moves")
+                return
+            self.sq1 = pos
+            self.destinations = destinations
+            self.buttons_pressed += 1
+            self.highlight(square)
+            return
 
-            The function also destroys the promotion window and allows the game to continue"""
-            self.squares[self.sq2].config(image=piece)
-            self.squares[self.sq2].image = piece
-            promo.destroy()
+        self.sq2 = pos  # stores the second square selected
+        if self.sq2 == self.sq1:  # prevents self-destruction and allows the user to choose a new piece
+            self.release()
+            return
+        if square not in self.destinations:  # the Touchmove rule keeps the piece selected
             return
 
-        def display_promo_menu(color):
-            """Displays the promotion menu with correct color
-
-            :param color: A string that passes the piece color for accurate promotion icon colors"""
-            if color == "white":
-                promo_knight = tk.Button(promo, text="Knight", command=lambda: generate_promo_piece(
-                    "pyimage4"))  # triggers generate_promo_piece function when selected
-                promo_knight.grid(row=0, column=0)
-                promo_bishop = tk.Button(promo, text="Bishop", command=lambda: generate_promo_piece("pyimage1"))
-                promo_bishop.grid(row=0, column=1)
-                promo_rook = tk.Button(promo, text="Rook", command=lambda: generate_promo_piece("pyimage7"))
-                promo_rook.grid(row=1, column=0)
-                promo_queen = tk.Button(promo, text="Queen", command=lambda: generate_promo_piece("pyimage6"))
-                promo_queen.grid(row=1, column=1)
-            else:
-                promo_knight = tk.Button(promo, text="Knight", command=lambda: generate_promo_piece("pyimage11"))
-                promo_knight.grid(row=0, column=0)
-                promo_bishop = tk.Button(promo, text="Bishop", command=lambda: generate_promo_piece("pyimage8"))
-                promo_bishop.grid(row=0, column=1)
-                promo_rook = tk.Button(promo, text="Rook", command=lambda: generate_promo_piece("pyimage14"))
-                promo_rook.grid(row=1, column=0)
-                promo_queen = tk.Button(promo, text="Queen", command=lambda: generate_promo_piece("pyimage13"))
-                promo_queen.grid(row=1, column=1)
-
-        promo = tk.Tk()  # creates a new menu with buttons depending on pawn color
-        promo.title("Choose what to promote your pawn to")
-        display_promo_menu(color)
-        promo.mainloop()
-        return
-
-    def friendly_fire(self):  # prevents capturing your own pieces
-        """Prevents capturing your own pieces.
-
-        @:return Boolean value determining whether 'friendly fire' has occurred, i.e. white tries to capture whtie"""
-        piece_2_color = self.sq2_button["image"]
-        return (self.piece_color == "white" and piece_2_color in self.white_pieces) or (
-                    self.piece_color == "black" and piece_2_color in self.black_pieces)
-
-    def clear_path(self, piece):  # makes sure that the squares in between sq1 and sq2 aren't occupied
-        """Ensures that the selected piece does not have occupied squares between sq1 and sq2
-
-        :param piece: string for the piece i.e. 'rook'"""
-        # pieces that move left to right OR up to down (rook and queen)
-        if piece == "rook" or piece == "queen":
-            # clear path along the vertical axis
-            if self.sq1[0] == self.sq2[0]:
-                pos1 = min(int(self.sq1[1]), int(self.sq2[1]))
-                pos2 = max(int(self.sq1[1]), int(self.sq2[1]))
-                for i in range(pos1 + 1, pos2):
-                    square_on_path = self.squares[self.sq1[0] + str(i)].cget("image")
-                    if square_on_path != "pyimage2":
-                        return False
-
-            # clear path along the horizontal axis
-            elif self.sq1[1] == self.sq2[1]:
-                pos1 = min(self.ranks.find(self.sq1[0]), self.ranks.find(self.sq2[0]))
-                pos2 = max(self.ranks.find(self.sq1[0]), self.ranks.find(self.sq2[0]))
-                for i in range(pos1 + 1, pos2):
-                    square_on_path = self.squares[self.ranks[i] + self.sq1[1]].cget("image")
-                    if square_on_path != "pyimage2":
-                        return False
-
-        # pieces that move diagonally
-        if piece == "bishop" or piece == "queen":
-            x1 = self.ranks.find(self.sq1[0])
-            x2 = self.ranks.find(self.sq2[0])
-            y1 = int(self.sq1[1])
-            y2 = int(self.sq2[1])
-
-            if y1 < y2:
-                if x1 < x2:  # NE direction
-                    for x in range(x1 + 1, x2):
-                        y1 += 1
-                        square_on_path = self.squares[self.ranks[x] + str(y1)].cget("image")
-                        if square_on_path != "pyimage2":
-                            return False
-                elif x1 > x2:  # NW direction
-                    for x in range(x1 - 1, x2, -1):
-                        y1 += 1
-                        square_on_path = self.squares[self.ranks[x] + str(y1)].cget("image")
-                        if square_on_path != "pyimage2":
-                            return False
-            elif y1 > y2:
-                if x1 < x2:  # SE direction
-                    for x in range(x1 + 1, x2):
-                        y1 -= 1
-                        square_on_path = self.squares[self.ranks[x] + str(y1)].cget("image")
-                        if square_on_path != "pyimage2":
-                            return False
-                if x1 > x2:  # SW direction
-                    for x in range(x1 - 1, x2, -1):
-                        y1 -= 1
-                        square_on_path = self.squares[self.ranks[x] + str(y1)].cget("image")
-                        if square_on_path != "pyimage2":
-                            return False
-        return True
-
-    def allowed_piece_move(self):  # checks whether the piece can move to square 2 based on their movement capabilities
-        # TODO: It may be here that we fix Touchmove...may have to do with False
-        """Checks whether the piece on pos1 can go to pos2 based on their movement capabilities.
-
-        :return Boolean value for whether the move is allowed.
-        If it isn't, the program simply allows the user to choose a different square."""
-
-        # redefine pyimage for readability; now we can refer to them simply as pieces on the board
-        wb, wk, wn, wp, wq, wr = "pyimage1", "pyimage3", "pyimage4", "pyimage5", "pyimage6", "pyimage7"
-        bb, bk, bn, bp, bq, br = "pyimage8", "pyimage10", "pyimage11", "pyimage12", "pyimage13", "pyimage14"
-
-        # If the supposed piece is Nothing then there is no way it is a legal move
-        if self.sq1_button["image"] == "pyimage2":  # or self.sq1_button["image"] == "pyimage9":
-            return False
-
-        # bishop's move: the change in x (rank) is the same as the change in y (file)
-        if (self.sq1_button["image"] == wb or self.sq1_button["image"] == bb) and self.clear_path(
-                "bishop"):
-            # if abs(int(self.sq1[1]) - int(self.sq2[1])) == abs(self.ranks.find(self.sq1[0]) - self.ranks.find(
-            #  self.sq2[0])):
-            #     return True
-            return abs(int(self.sq1[1]) - int(self.sq2[1])) == abs(
-                self.ranks.find(self.sq1[0]) - self.ranks.find(self.sq2[0]))
-
-        # knight's move: if x changes by 1, then y changes by 2. Else if x changes by 2, then y changes by 1
-        if self.sq1_button["image"] == wn or self.sq1_button["image"] == bn:
-            if (abs(int(self.sq1[1]) - int(self.sq2[1])) == 2) and (
-                    abs(self.ranks.find(self.sq1[0]) - self.ranks.find(self.sq2[0])) == 1):  # allows tall L moves
-                return True
-            if (abs(int(self.sq1[1]) - int(self.sq2[1])) == 1) and (
-                    abs(self.ranks.find(self.sq1[0]) - self.ranks.find(self.sq2[0])) == 2):  # allows wide L moves
-                return True
-
-        # King's move: it may be a 1 square adjacent move OR a castle
-        # we check adjacent attempt first because castle() catches all other move attempts
-        # TODO: Potentially this is where I fix illegal castle (including in, out of, through check; potentially rook moved)
-        if self.sq1_button["image"] == wk or self.sq1_button["image"] == bk:  # king movement
-            if (abs(int(self.sq1[1]) - int(self.sq2[1])) < 2) and (
-            abs(self.ranks.find(self.sq1[0]) - self.ranks.find(self.sq2[0]))) < 2:
-                if self.sq1_button["image"] == wk:
-                    self.disallow_castle("white", "wk", "short")  # parameter 'short' is unused
-                else:
-                    self.disallow_castle("black", "bk", "short")
-                return True
-            if self.castle() is True:
-                return True
-
-        # White pawn movement: If it starts on the 2nd rank, it can move two squares, else 1 square
-        # It may capture sideways
-        # TODO: En passant
-        if self.sq1_button["image"] == wp:
-            if "2" in self.sq1:  # allows for 2 space jump from starting pos
-                if (int(self.sq1[1]) + 1 == int(self.sq2[1]) or int(self.sq1[1]) + 2 == int(self.sq2[1])) and \
-                        self.sq1[0] == self.sq2[0] and self.sq2_button["image"] == "pyimage2":  # allows 2 sq movement
-                    in_front = self.squares[self.sq1[0] + str(int(self.sq1[1]) + 1)]
-                    if in_front["image"] == "pyimage2":  # makes sure that there is no piece blocking path
-                        return True
-            if int(self.sq1[1]) + 1 == int(self.sq2[1]) and self.sq1[0] == self.sq2[0] and \
-                    self.sq2_button["image"] == "pyimage2":  # allows 1 sq movement
-                return True
-            if int(self.sq1[1]) + 1 == int(self.sq2[1]) and \
-                    (abs(self.ranks.find(self.sq1[0]) - self.ranks.find(self.sq2[0]))) == 1 and \
-                    self.sq2_button["image"] != "pyimage2":  # allows the capturing of diagonal pieces
-                return True
-
-        # Black pawn movement: If it starts on the 7th rank, it can move two squares, else 1 square
-        # It may capture sideways
-        # TODO: En passant
-        if self.sq1_button["image"] == bp:
-            if "7" in self.sq1:  # allows for 2 space jump from starting pos
-                if (int(self.sq1[1]) == int(self.sq2[1]) + 1 or int(self.sq1[1]) == int(self.sq2[1]) + 2) and \
-                        self.sq1[0] == self.sq2[0] and self.sq2_button["image"] == "pyimage2":
-                    return True
-            if int(self.sq1[1]) == int(self.sq2[1]) + 1 and self.sq1[0] == self.sq2[0] and \
-                    self.sq2_button["image"] == "pyimage2":
-                return True
-            if int(self.sq1[1]) == int(self.sq2[1]) + 1 and \
-                    abs(self.ranks.find(self.sq1[0]) - self.ranks.find(self.sq2[0])) == 1 \
-                    and self.sq2_button["image"] != "pyimage2":  # allows the capturing of diagonal pieces
-                return True
-
-        # Queen movement: Can move within the same rank, the same file, the same diagonal
-        # It is the combination of a rook and a bishop
-        if (self.sq1_button["image"] == wq or self.sq1_button["image"] == bq) and self.clear_path("queen"):
-            if int(self.sq1[1]) == int(self.sq2[1]) or self.sq1[0] == self.sq2[
-                0]:  # only allows movement within same rank or file
-                return True
-            if abs(int(self.sq1[1]) - int(self.sq2[1])) == abs(
-                    self.ranks.find(self.sq1[0]) - self.ranks.find(self.sq2[0])):
-                return True
-
-        # Rook movement: Can move within the same rank or the same file
-        if self.sq1_button["image"] == wr or self.sq1_button["image"] == br:
-            if (int(self.sq1[1]) == int(self.sq2[1]) or self.sq1[0] == self.sq2[0]) and self.clear_path("rook"):
-                if self.sq1 == "a1":
-                    self.disallow_castle("white", "wr", "long")
-                if self.sq1 == "h1":
-                    self.disallow_castle("white", "wr", "short")
-                if self.sq1 == "a8":
-                    self.disallow_castle("black", "br", "long")
-                if self.sq1 == "h8":
-                    self.disallow_castle("black", "br", "short")
-                return True
-
-        # Well, then whatever piece is currently clicked on pos1 cannot go to pos2
-        return False
-
-    def disallow_castle(self, color, piece, direction):
-        if color == "white":
-            if piece == "wk":
-                self.castleable_short_white = False
-                self.castleable_long_white = False
-                return
-            if direction == "short":
-                self.castleable_short_white = False
-            else:
-                self.castleable_long_white = False
+        sq1 = parse_square(self.sq1)
+        moves = self.destinations[square]
+        self.release()
+        if len(moves) > 1:  # one move per piece a pawn can promote to
+            self.promotion_menu(self.position.side, lambda kind: self.play_move(sq1, square, kind))
         else:
-            if piece == "bk":
-                self.castleable_short_black = False
-                self.castleable_long_black = False
+            self.play_move(sq1, square, moves[0] >> 12 or QUEEN)
+
+    def premove_click(self, square):
+        """Handles a click while the computer is thinking: the first click picks a piece of the player's, the
+        second where to premove it to. Clicking anywhere else drops the premoves"""
+        premoves = self.premove_queue()
+        if self.premove_from is None:
+            destinations = premoves.destinations(self.position, square)
+            if not destinations:
+                if premoves:
+                    premoves.clear()
+                    self.show_premoves()
+                    self.status.set("Premoves cancelled")
                 return
-            if direction == "short":
-                self.castleable_short_black = False
-            else:
-                self.castleable_long_black = False
-        return
-
-    def castle(self):  # checks to see if the move entails a castle, and if a castle is allowed
-        """Checks to see if castle is allowed, i.e. king hasn't moved, rook in question hasn't moved, opponent doesn't see path
-        If castle is allowed, then hard-config the pieces.
+            self.premove_from = square
+            self.destinations = dict((to, []) for to in squares_of(destinations))
+            self.highlight(square)
+            return
 
-        Called from function allowed_piece_move() when a castle is attempted by either side
-        The game piece that this function acts on is thus a white king or black king, assigned already
+        sq1 = self.premove_from
+        premove = square in self.destinations
+        self.release()
+        if not premove:
+            return
+        if premoves.is_promotion(self.position, sq1, square):
+            self.promotion_menu(premoves.color, lambda kind: self.queue_premove(sq1, square, kind))
+        else:
+            self.queue_premove(sq1, square)
+
+    def premove_queue(self):
+        """:return the PremoveQueue of the side the computer plays against, made anew if the computer changed sides"""
+        color = BLACK if self.engine_color.get() == "White" else WHITE
+        if self.premoves is None or self.premoves.color != color:
+            self.premoves = PremoveQueue(color)
+            self.show_premoves()
+        return self.premoves
+
+    def queue_premove(self, sq1, sq2, promotion=EMPTY):
+        self.premove_queue().add(sq1, sq2, promotion)
+        self.show_premoves()
+        self.status.set("%d premove%s queued" % (len(self.premoves), "" if len(self.premoves) == 1 else "s"))
+
+    def clear_premoves(self):
+        if self.premoves is not None:
+            self.premoves.clear()
+            self.show_premoves()
+
+    def show_premoves(self):
+        """Colors the squares the queued premoves move from and to"""
+        squares = self.premoves.squares() if self.premoves is not None else set()
+        changed = squares ^ self.premove_squares
+        self.premove_squares = squares
+        for square in changed:
+            if square != self.selected:
+                self.canvas.itemconfigure(self.square_items[square], fill=self.square_fill(square))
+
+    def next_turn(self):
+        """Plays the player's first premove if it is their turn, or else lets the computer think if it is its turn"""
+        if not self.game_over and self.premoves and not self.engine_to_move():
+            move = self.premoves.take(self.position, self.legal_move_list())
+            self.show_premoves()
+            if move is False:
+                self.status.set("Premoves cancelled, the first one isn't legal")
+            elif move is not None:
+                self.play_move(move & 63, move >> 6 & 63, move >> 12 or QUEEN)
+                return
+        self.start_engine()
 
-        Updates the attribute \"castled\" as needed.
+    def release(self):
+        """Puts down the picked up piece, if there is one"""
+        self.buttons_pressed = 0
+        self.premove_from = None
+        self.destinations = {}
+        self.highlight(None)
+
+    def legal_move_list(self):
+        """:return the legal moves of the position, worked out once per position"""
+        if self.moves_cache is None:
+            self.moves_cache = legal_moves(self.position)
+        return self.moves_cache
+
+    def play_move(self, sq1, sq2, promotion=QUEEN):
+        """Plays a legal move on the position and redraws the squares it changed"""
+        self.release()
+        self.moves_cache = None
+        for square in self.position.apply_move(sq1, sq2, promotion):
+            self.draw_square(square)
+        self.update_status()
+        self.autosave()
+        self.after_idle(self.next_turn)  # lets the squares redraw before a premove or the computer goes on
+
+    def update_status(self):
+        """Announces checkmate and stalemate, and when a draw can be claimed; otherwise shows the book moves of the
+        position, or what the endgame tables say about it"""
+        side = "White" if self.position.side == WHITE else "Black"
+        if not self.legal_move_list():
+            self.game_over = True
+            if self.position.in_check():
+                self.result = "0-1" if side == "White" else "1-0"
+                self.status.set("Checkmate, " + ("black" if side == "White" else "white") + " wins")
+            else:
+                self.result = "1/2-1/2"
+                self.status.set("Stalemate")
+        elif self.position.can_claim_draw():
+            self.status.set(side + " may claim a draw with the DRAW button")
+        else:
+            self.status.set(self.book_hint() or self.tablebase_hint())
+
+    def book_hint(self):
+        """:return text such as \"Book: e4 45%, d4 30%, Nf3 10%\", or "" if the position isn't in the book"""
+        if self.book is None:
+            return ""
+        moves = self.book.moves(self.position)
+        if not moves:
+            return ""
+        total = sum(weight for _move, weight in moves)
+        return "Book: " + ", ".join("%s %d%%" % (san(self.position, move), round(100.0 * weight / total))
+                                    for move, weight in moves[:BOOK_HINT_MOVES])
+
+    def tablebase_hint(self):
+        """:return text such as \"Tablebase: white mates in 7 (Qd7)\", or "" if no table covers the position"""
+        found = self.tablebases.best_move(self.position)
+        if found is None:
+            return ""
+        move, result = found
+        return "Tablebase: %s (%s)" % (describe(result, self.position.side), san(self.position, move))
+
+    def claim_draw(self):
+        """Called by the DRAW button. Ends the game as a draw when the position has repeated three times
+        or fifty moves passed without a capture or pawn move; otherwise the players agree to a draw"""
+        if self.game_over:
+            return
+        self.stop_engine()
+        self.game_over = True
+        self.result = "1/2-1/2"
+        if not self.position.can_claim_draw():
+            self.status.set("Draw agreed")
+        elif self.position.repetitions() >= 2:
+            self.status.set("Draw by threefold repetition")
+        else:
+            self.status.set("Draw by the fifty-move rule")
+        self.autosave()
 
-        :return Boolean value representing whether the player successfully castled or not.
-        """
-        # TODO: Main error for castling out of check
-        # print("castle")
-        # if self.in_check():
-        #     print("is in")
-        #     return False
-        if self.castleable_short_white and self.sq2 == "g1":
-            for x in range(5, 7):
-                square_button = self.squares[self.ranks[x] + str(1)]
-                if square_button["image"] != "pyimage2":
-                    return False
-                self.squares["h1"].config(image="pyimage2")
-                self.squares["h1"].image = "pyimage2"
-                self.squares["f1"].config(image="pyimage7")
-                self.squares["f1"].image = "pyimage7"
-                return True
-        if self.castleable_long_white and self.sq2 == "c1" or self.sq2 == "b1":  # some people castle incorrectly with b1, but the software usually allows it
-            for x in range(1,
-                           4):  # checks to see if squares in between rook and king are empty and are not a possible move for opponent
-                square_button = self.squares[self.ranks[x] + str(1)]  # append str(1) gives a1, b1, etc
-                if square_button["image"] != "pyimage2":
-                    return False
-                self.squares["a1"].config(image="pyimage2")
-                self.squares["a1"].image = "pyimage2"
-                self.squares["d1"].config(image="pyimage7")
-                self.squares["d1"].image = "pyimage7"
-                return True
-        if self.castleable_short_black and self.sq2 == "g8":
-            for x in range(5, 7):
-                square_button = self.squares[self.ranks[x] + str(8)]
-                if square_button["image"] != "pyimage2":
-                    return False
-                self.squares["h8"].config(image="pyimage2")
-                self.squares["h8"].image = "pyimage2"
-                self.squares["f8"].config(image="pyimage14")
-                self.squares["f8"].image = "pyimage14"
-                return True
-        if self.castleable_long_black and self.sq2 == "c8" or self.sq2 == "b8":
-            for x in range(5, 7):
-                square_button = self.squares[self.ranks[x] + str(8)]
-                if square_button["image"] != "pyimage2":
-                    return False
-                self.squares["h8"].config(image="pyimage2")
-                self.squares["h8"].image = "pyimage2"
-                self.squares["f8"].config(image="pyimage14")
-                self.squares["f8"].image = "pyimage14"
-                return True
+    def resign(self):
+        """Called by the RESIGN button: the side to move gives up"""
+        if self.game_over:
+            return
+        self.stop_engine()
+        self.game_over = True
+        loser = self.position.side
+        self.result = "0-1" if loser == WHITE else "1-0"
+        self.status.set(("White" if loser == WHITE else "Black") + " resigns, " +
+                        ("black" if loser == WHITE else "white") + " wins")
+        self.autosave()
+
+    def undo(self):
+        """Called by the UNDO button: takes back the last move, which REDO can play again"""
+        self.step(self.position.undo)
+
+    def redo(self):
+        """Called by the REDO button"""
+        self.step(self.position.redo)
+
+    def take_back(self):
+        """Called by the TAKEBACK button: takes back the player's last move, along with the computer's reply if
+        it made one. Unlike UNDO, the moves are gone for good"""
+        self.step(self.position.undo)
+        if self.engine_to_move():
+            self.step(self.position.undo)
+        self.position.redo_moves = []
+
+    def step(self, action):
+        """Moves through the game's history with Position.undo() or Position.redo(), redrawing the squares changed
+
+        :param action: one of those two methods"""
+        self.stop_engine()
+        changed = action()
+        if changed is None:  # nothing left to undo or redo
+            return
+        self.close_promotion()
+        self.clear_premoves()
+        self.moves_cache = None
+        self.release()
+        self.game_over = False
+        self.result = "*"
+        for square in changed:
+            self.draw_square(square)
+        self.update_status()
+        self.autosave()
+        self.after_idle(self.start_engine)
+
+    def load(self):
+        """Called by the LOAD button. Asks for a file and shows the position (.fen) or the first game (.pgn) in it"""
+        path = filedialog.askopenfilename(parent=self, title="Load a game or position",
+                                          filetypes=[("Games and positions", "*.pgn *.fen"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            if path.lower().endswith(".fen"):
+                position = Position(read_fen(path), self.new_game_rules())
+            else:
+                game = next(read_games(path), None)
+                if game is None:
+                    raise ValueError("no game in " + os.path.basename(path))
+                position = game.replay()
+        except (OSError, ValueError) as error:  # unreadable file, bad FEN, or a move the rules don't allow
+            self.status.set("Could not load: " + str(error))
+            return
+        self.show_position(position)
+        self.update_status()
+        self.after_idle(self.start_engine)
+
+    def save(self):
+        """Called by the SAVE button. Writes the game so far as PGN, or just the current position as FEN"""
+        path = filedialog.asksaveasfilename(parent=self, title="Save the game or position", defaultextension=".pgn",
+                                            filetypes=[("Game", "*.pgn"), ("Position", "*.fen")])
+        if not path:
+            return
+        if path.lower().endswith(".fen"):
+            text = self.position.fen() + "\n"
         else:
-            return False
+            players = {"Nobody": ("?", "?"), "White": ("Computer", "?"), "Black": ("?", "Computer")}
+            white, black = players[self.engine_color.get()]
+            text = Game.from_position(self.position, {"White": white, "Black": black}, self.result).pgn()
+        try:
+            with open(path, "w") as file:
+                file.write(text)
+        except OSError as error:
+            self.status.set("Could not save: " + str(error))
+            return
+        self.status.set("Saved " + os.path.basename(path))
 
-    def in_check(self):
-        """Checks if either King is in check; if one is, the function prevents illegal moves
+    def engine_to_move(self):
+        """:return Boolean value for whether the computer plays the side to move"""
+        return self.engine_color.get() == ("White" if self.position.side == WHITE else "Black")
 
-        """
+    def start_engine(self):
+        """Starts the computer thinking in a worker thread if it is its turn.
 
-        # stores current square values for future use
-        # ensures that multiple illegal moves can be made in a row without losing original state
-        previous_sq1 = self.sq1
-        previous_sq1_button = self.sq1_button
-        previous_sq2 = self.sq2
-        previous_sq2_button = self.sq2_button
-
-        def revert_to_previous_values():
-            """Reverts the state of the squares to the previous square and button
-
-            :return Boolean value whether King is in \"check\" """
-
-            self.sq1 = previous_sq1
-            self.sq1_button = previous_sq1_button
-            self.sq2 = previous_sq2
-            self.sq2_button = previous_sq2_button
-
-        if self.piece_color == "white":
-            self.sq2 = self.find_king("pyimage3")
-
-            # iterating through each square on the board
-            for key in self.squares:
-                self.sq1 = key
-                self.sq1_button = self.squares[self.sq1]
-                # if the square's piece is black, then check if the King is on the piece's path, indicating "check"
-                if self.sq1_button["image"] in self.black_pieces:
-                    if self.allowed_piece_move():
-                        return True
-
-        if self.piece_color == "black":
-            self.sq2 = self.find_king("pyimage10")
-            for key in self.squares:
-                self.sq1 = key
-                self.sq1_button = self.squares[self.sq1]
-                if self.sq1_button["image"] in self.white_pieces:
-                    if self.allowed_piece_move():
-                        return True
-
-        # Then neither King was in check this turn, so revert to previous squares and return False
-        revert_to_previous_values()
-        return False
-
-    def find_king(self, king):
-        """Finds the square the king is on. Primarily used for determining if either King is in check each move
-
-        :parameter king: refers to the name of the King as a string, which may be white ("pyimage3") or black ("pyimage10")
-
-        :return King coordinates as a string, ex: \"e2\""""
-        for square in self.squares:  # squares is list of coords, so square is a coord, ex. e2
-            button = self.squares[square]  # button contains an image (piece) and a coord
-            if button["image"] == king:  # checks if the piece's coord is that of the King
-                return square
-
-    def set_squares(self):  # fills frame with buttons representing squares
-        """Fills frame with 64 buttons in 8x8 grid which represent squares. They alternate in color with h1 being white.
+        The search runs on a copy of the position; its move comes back through engine_results and poll_engine()"""
+        if self.engine_thread is not None or self.game_over or not self.engine_to_move() or \
+                not self.legal_move_list():
+            return
+        try:  # the settings are read here, Tk variables must not be touched from the worker thread
+            depth = max(1, self.engine_depth.get())
+            time_limit = max(0.05, self.engine_time.get())
+        except tk.TclError:  # a half-typed number in one of the boxes
+            depth, time_limit = 4, 2.0
+        position = self.position.copy()
+        stop = threading.Event()
+
+        def think():
+            move = Searcher(self.transpositions, tablebases=self.tablebases, book=self.book).search(
+                position, depth, time_limit, stop)[0]
+            self.engine_results.put((stop, move))
+
+        self.engine_stop = stop
+        self.engine_thread = threading.Thread(target=think, daemon=True)
+        self.engine_thread.start()
+        self.after(ENGINE_POLL_MS, self.poll_engine, stop)
+
+    def poll_engine(self, stop):
+        """Checks, from the Tk main loop, whether the worker thread has found its move, and plays it
+
+        :param stop: the threading.Event of the search being waited for"""
+        if stop is not self.engine_stop:  # that search was cancelled
+            return
+        while True:
+            try:
+                finished, move = self.engine_results.get_nowait()
+            except queue.Empty:
+                self.after(ENGINE_POLL_MS, self.poll_engine, stop)
+                return
+            if finished is stop:  # anything else is left over from a cancelled search
+                break
+        self.engine_thread = None
+        self.engine_stop = None
+        if move is not None and self.engine_to_move():
+            self.play_move(move & 63, move >> 6 & 63, move >> 12 or QUEEN)
+
+    def stop_engine(self):
+        """Tells a running search to give up and waits for it, so it can't go on writing the transposition table
+        the next search uses; it notices within a few thousand nodes. Its move will be ignored"""
+        if self.engine_stop is not None:
+            self.engine_stop.set()
+        if self.engine_thread is not None:
+            self.engine_thread.join()
+        self.engine_thread = None
+        self.engine_stop = None
+
+    def draw_square(self, square):
+        """Shows the piece the position has on the square (an index, see anarchist_chess.position)"""
+        piece = self.position.piece_at(square)
+        self.canvas.itemconfigure(self.piece_items[square], image=self.piece_image(piece) if piece != EMPTY else "")
+
+    def highlight(self, square):
+        """Shows square (None for none) as the one whose piece is picked up, with dots on the squares in
+        self.destinations and, for a horsey, the path it takes to each of them"""
+        if self.selected is not None:
+            self.canvas.itemconfigure(self.square_items[self.selected], fill=self.square_fill(self.selected))
+        for item in self.marker_items + self.path_items:
+            self.canvas.itemconfigure(item, state=tk.HIDDEN)
+        self.selected = square
+        if square is None:
+            return
+        self.canvas.itemconfigure(self.square_items[square], fill=SELECTED_SQUARE)
+        for destination in self.destinations:
+            self.canvas.itemconfigure(self.marker_items[destination], state=tk.NORMAL)
+        if self.position.piece_at(square) & 7 == KNIGHT:
+            for item, destination in zip(self.path_items, self.destinations):
+                self.canvas.coords(item, *self.horsey_path(square, destination))
+                self.canvas.itemconfigure(item, state=tk.NORMAL)
+
+    def horsey_path(self, sq1, sq2):
+        """:return canvas coordinates of the path a horsey takes from sq1 to sq2: where it starts, where it turns,
+        where it lands. It goes two squares straight and then one to the side, unless the rules make it step
+        through its leg square, one straight, before going on diagonally"""
+        turn = horsey_turn(sq1, sq2, 2 if self.position.rules.standard_horsey else 1)
+        return self.square_center(sq1) + self.square_center(turn) + self.square_center(sq2)
+
+    def square_center(self, square):
+        """:return (x, y) canvas coordinates of the middle of the square"""
+        return (self.board_x + (square & 7) * self.square_size + self.square_size // 2,
+                self.board_y + (7 - (square >> 3)) * self.square_size + self.square_size // 2)
+
+    def square_fill(self, square):
+        if square in self.premove_squares:
+            return PREMOVE_SQUARE
+        return DARK_SQUARE if (square >> 3) % 2 == (square & 7) % 2 else LIGHT_SQUARE
+
+    def square_at(self, x, y):
+        """:return the square index under canvas point (x, y), or None if it is off the board"""
+        file = (x - self.board_x) // self.square_size
+        row = (y - self.board_y) // self.square_size  # rows count down from the 8th rank
+        if not (0 <= file < 8 and 0 <= row < 8):
+            return None
+        return (7 - row) * 8 + file
+
+    def promotion_menu(self, color, on_choice):  # creates menu to choose what piece to change the pawn to
+        """Shows buttons over the board for the user to pick a piece to promote to. The window carries on while
+        they are up (it used to open a second Tk with its own mainloop); clicking the board takes the move back.
+
+        :param color: WHITE or BLACK, the color of the promoting pawn
+        :param on_choice: called with the chosen piece kind, ex: QUEEN"""
+        self.close_promotion()
+        promo = tk.Frame(self, relief=tk.RAISED, borderwidth=2)
+        tk.Label(promo, text="Promote your " + ("white" if color == WHITE else "black") + " pawn to").grid(
+            row=0, column=0, columnspan=2)
+        for index, (text, kind) in enumerate((("Knight", KNIGHT), ("Bishop", BISHOP), ("Rook", ROOK),
+                                              ("Queen", QUEEN))):
+            button = tk.Button(promo, text=text, command=lambda kind=kind: self.choose_promotion(on_choice, kind))
+            button.grid(row=1 + index // 2, column=index % 2)
+        promo.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+        self.promotion_frame = promo
+
+    def choose_promotion(self, on_choice, kind):
+        """Called by the promotion buttons: takes them away and finishes the move"""
+        self.close_promotion()
+        on_choice(kind)
+
+    def close_promotion(self):
+        if self.promotion_frame is not None:
+            self.promotion_frame.destroy()
+            self.promotion_frame = None
+
+    def set_squares(self):  # fills the canvas with rectangles representing squares
+        """Creates the canvas items of the 64 squares and their pieces. They alternate in color with h1 being light.
+        The items are made once; later games and resizes only change them.
 
         :return void
         """
-        for x in range(8):
-            for y in range(8):
-                if x % 2 == 0 and y % 2 == 0:  # alternates between dark/light tiles
-                    self.square_color = "green"
-                elif x % 2 == 1 and y % 2 == 1:
-                    self.square_color = "green"
-                else:
-                    self.square_color = "gray"
-
-                # highlights the selected starting square to indicate that choice
-                # the Touchmove rule requires the user to move the piece highlighted, if it is legal
-                # TODO: Fix issue where touchmove crashes program when no legal moves
-                B = tk.Button(self, bg=self.square_color, activebackground="purple")
-                B.grid(row=8 - x, column=y)
-                pos = self.ranks[y] + str(x + 1)
-                self.squares.setdefault(pos, B)  # creates list of square positions
-                self.squares[pos].config(command=lambda key=self.squares[pos]: self.select_piece(key))
-
-    def import_pieces(self):  # opens and stores images of pieces and prepares the pieces for the game for both sides
-        """Opens and stores images of pieces. Gets ready to put pieces on initial squares.
+        if self.square_items:
+            return
+        for square in range(64):
+            self.square_items.append(self.canvas.create_rectangle(0, 0, 0, 0, width=0, fill=self.square_fill(square)))
+            self.piece_items.append(self.canvas.create_image(0, 0))
+        for square in range(64):  # made after the pieces so they are drawn on top of them
+            self.marker_items.append(self.canvas.create_oval(0, 0, 0, 0, width=0, fill=DESTINATION_MARK,
+                                                             state=tk.HIDDEN))
+        for _ in range(8):  # a horsey has at most 8 destinations
+            self.path_items.append(self.canvas.create_line(0, 0, 0, 0, 0, 0, width=3, fill=HORSEY_PATH,
+                                                           arrow=tk.LAST, state=tk.HIDDEN))
+        self.profile_box = self.canvas.create_rectangle(0, 0, 0, 0, fill="black", state=tk.HIDDEN)
+        self.profile_text = self.canvas.create_text(6, 6, anchor=tk.NW, font=("Courier", 9), fill="white",
+                                                    state=tk.HIDDEN)
+        self.layout()
+
+    def toggle_profiling(self):
+        """Called by the PROFILE button: starts timing the game's code, with the numbers shown over the board,
+        or stops it again"""
+        if self.profiler.enabled():
+            self.stop_profiling()
+        else:
+            self.start_profiling()
+
+    def start_profiling(self):
+        """Wraps the functions worth watching in timers; see anarchist_chess.profiling"""
+        if self.profiler.enabled():
+            return
+        for name in ("handle_clicks", "select_piece", "play_move", "promotion_menu"):
+            self.profiler.wrap(Board, name)
+        for name in ("draw_square", "highlight", "layout"):
+            self.profiler.wrap(Board, name, "render: " + name)
+        # the rules as the window uses them; the computer's search calls the same functions from its thread, and
+        # timing those calls would slow it down and drown the window's numbers, so only this thread is timed
+        window = threading.current_thread()
+        self.profiler.wrap(sys.modules[__name__], "legal_moves", "legal_moves", thread=window)
+        for name in ("make_move", "unmake_move", "in_check", "is_legal", "allowed_piece_move", "clear_path",
+                     "is_attacked", "leaves_king_in_check", "check_info"):
+            self.profiler.wrap(Position, name, thread=window)
+        self.profiler.wrap(Searcher, "search", "engine: search")  # once per computer move, the whole think
+        for name in ("itemconfigure", "coords"):  # counted only, they are called for every square drawn
+            self.profiler.wrap(self.canvas, name, "widget: " + name, timed=False)
+        # the overlay calls the Canvas methods through the class, which the wrappers don't cover, so it
+        # doesn't count itself
+        tk.Canvas.itemconfigure(self.canvas, self.profile_box, state=tk.NORMAL)
+        tk.Canvas.itemconfigure(self.canvas, self.profile_text, state=tk.NORMAL)
+        self.refresh_profile()
+
+    def stop_profiling(self):
+        """Puts the original functions back, so nothing is timed any more"""
+        self.profiler.unwrap_all()
+        if self.profile_job is not None:
+            self.after_cancel(self.profile_job)
+            self.profile_job = None
+        self.canvas.itemconfigure(self.profile_box, state=tk.HIDDEN)
+        self.canvas.itemconfigure(self.profile_text, state=tk.HIDDEN)
+
+    def refresh_profile(self):
+        """Shows the latest numbers over the board, every PROFILE_REFRESH_MS while profiling"""
+        tk.Canvas.itemconfigure(self.canvas, self.profile_text, text=self.profiler.summary())
+        tk.Canvas.tag_raise(self.canvas, self.profile_box)
+        tk.Canvas.tag_raise(self.canvas, self.profile_text)
+        x1, y1, x2, y2 = self.canvas.bbox(self.profile_text)
+        tk.Canvas.coords(self.canvas, self.profile_box, x1 - 4, y1 - 4, x2 + 4, y2 + 4)
+        self.profile_job = self.after(PROFILE_REFRESH_MS, self.refresh_profile)
+
+    def import_pieces(self):  # prepares the piece images for both sides
+        """Gets the piece images ready. They are made by a SpriteCache (see anarchist_chess.sprites) when a square
+        first shows them, so nothing is decoded here.
 
         The programmer may wish to adjust the filepaths depending on the file location of the pieces.
 
         :return void
         """
-        path = os.path.join(os.path.dirname(__file__), "White")  # stores white pieces images into dicts
-        w_dirs = os.listdir(path)
-        for file in w_dirs:
-            img = Image.open(path + "\\" + file)
-            img = img.resize((80, 80), Image.ANTIALIAS)
-            img = ImageTk.PhotoImage(image=img)
-            self.white_images.setdefault(file, img)
-
-        path = os.path.join(os.path.dirname(__file__), "Black")  # stores black pieces images into dicts
-        b_dirs = os.listdir(path)
-        for file in b_dirs:
-            img = Image.open(path + "\\" + file)
-            img = img.resize((80, 80), Image.ANTIALIAS)
-            img = ImageTk.PhotoImage(image=img)
-            self.black_images.setdefault(file, img)
+        self.sprites = SpriteCache(os.path.dirname(os.path.abspath(__file__)))
+        self.piece_images = {}
+
+    def piece_image(self, piece):
+        """:return the PhotoImage of a piece code at the current sprite size, made on first use"""
+        key = (piece, self.sprite_size)
+        image = self.piece_images.get(key)
+        if image is None:
+            image = ImageTk.PhotoImage(image=self.sprites.piece(piece, self.sprite_size))
+            self.piece_images[key] = image
+        return image
+
+    def resize_board(self, event):
+        """Called when the canvas changes size; the board is laid out again once the resizing settles"""
+        if self.resize_job is not None:
+            self.after_cancel(self.resize_job)
+        self.resize_job = self.after(RESIZE_DELAY_MS, self.layout)
+
+    def layout(self):
+        """Sizes the squares to fill the canvas and scales the pieces to match"""
+        self.resize_job = None
+        if self.canvas.winfo_ismapped():
+            width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        else:  # before the window shows, the requested size is all there is
+            width, height = int(self.canvas["width"]), int(self.canvas["height"])
+        size = max(MIN_SQUARE_SIZE, min(width, height) // 8)
+        self.square_size = size
+        self.board_x = max(0, (width - 8 * size) // 2)
+        self.board_y = max(0, (height - 8 * size) // 2)
+        dot = max(3, size // 8)  # radius of the destination marks
+        for square in range(64):
+            x = self.board_x + (square & 7) * size
+            y = self.board_y + (7 - (square >> 3)) * size
+            self.canvas.coords(self.square_items[square], x, y, x + size, y + size)
+            self.canvas.coords(self.piece_items[square], x + size // 2, y + size // 2)
+            self.canvas.coords(self.marker_items[square], x + size // 2 - dot, y + size // 2 - dot,
+                               x + size // 2 + dot, y + size // 2 + dot)
+        self.highlight(self.selected)  # a horsey's path is drawn in canvas coordinates, which just changed
+
+        sprite_size = size * 4 // 5
+        if sprite_size != self.sprite_size:
+            self.sprite_size = sprite_size
+            self.piece_images.clear()  # the SpriteCache still has the scaled images of the old size, if it comes back
+            if self.sprites is not None:
+                for square in range(64):
+                    self.draw_square(square)
 
     def set_starting_position(self):  # places pieces in starting positions
         """Places pieces in their starting position.
@@ -532,58 +718,113 @@ class Board(tk.Frame):
         :return void
         """
 
-        # organizing the white pieces
-        dict_rank1_pieces = {"a1": "r.png", "b1": "n.png", "c1": "b.png", "d1": "q.png", "e1": "k.png", "f1": "b.png",
-                             "g1": "n.png", "h1": "r.png"}
-        dict_rank2_pieces = {"a2": "p.png", "b2": "p.png", "c2": "p.png", "d2": "p.png", "e2": "p.png", "f2": "p.png",
-                             "g2": "p.png", "h2": "p.png"}
-        # organizing the black pieces
-        dict_rank7_pieces = {"a7": "p.png", "b7": "p.png", "c7": "p.png", "d7": "p.png", "e7": "p.png", "f7": "p.png",
-                             "g7": "p.png", "h7": "p.png"}
-        dict_rank8_pieces = {"a8": "r.png", "b8": "n.png", "c8": "b.png", "d8": "q.png", "e8": "k.png", "f8": "b.png",
-                             "g8": "n.png", "h8": "r.png"}
-
-        # inserting images into buttons
-        for key in dict_rank1_pieces:
-            starting_piece = dict_rank1_pieces[key]
-            self.squares[key].config(image=self.white_images[starting_piece])
-            self.squares[key].image = self.white_images[starting_piece]
-
-        for key in dict_rank2_pieces:
-            starting_piece = dict_rank2_pieces[key]
-            self.squares[key].config(image=self.white_images[starting_piece])
-            self.squares[key].image = self.white_images[starting_piece]
-
-        for key in dict_rank7_pieces:
-            starting_piece = dict_rank7_pieces[key]
-            self.squares[key].config(image=self.black_images[starting_piece])
-            self.squares[key].image = self.black_images[starting_piece]
-
-        for key in dict_rank8_pieces:
-            starting_piece = dict_rank8_pieces[key]
-            self.squares[key].config(image=self.black_images[starting_piece])
-            self.squares[key].image = self.black_images[starting_piece]
-
-        for rank in range(3, 7):  # fill ranks 3,4,5,6 with blank pieces
-            for file in range(8):  # there are 8 squares (buttons) in each rank
-                starting_piece = "blank.png"
-                pos = self.ranks[file] + str(rank)
-                self.squares[pos].config(image=self.white_images[starting_piece])
-                self.squares[pos].image = self.white_images[starting_piece]
-
-
-root = tk.Tk()  # creates main window with the board and creates board object
-root.geometry("800x800")
-board = Board(root)
-print(board.ranks)
-board.import_pieces()
-board.set_starting_position()
-
-button_resign = tk.Button(root, text="RESIGN", height=1, width=5, command=lambda: board.set_squares())
-button_resign.pack()
-button_draw = tk.Button(root, text="DRAW", height=1, width=5, command=lambda: board.set_squares())
-button_draw.pack()
-button_newgame = tk.Button(root, text="NEW GAME", height=1, width=10, command=lambda: board.set_squares())
-button_newgame.pack()
-
-board.mainloop()
+        self.show_position(Position(rules=self.new_game_rules()))
+
+    def new_game_rules(self):
+        """:return the Rules with the kinks ticked under the buttons"""
+        return Rules.parse(",".join(name for name, ticked in self.kinks.items() if ticked.get()))
+
+    def show_position(self, position):
+        """Replaces the game with the given position and redraws every square"""
+        self.stop_engine()
+        for name, ticked in self.kinks.items():  # the boxes show the rules of the game on the board
+            ticked.set(KINKS[name] in position.rules.kinks)
+        self.close_promotion()
+        self.clear_premoves()
+        self.position = position
+        self.moves_cache = None
+        self.release()
+        self.game_over = False
+        self.result = "*"
+        self.status.set("")
+        for square in range(64):
+            self.draw_square(square)
+        self.autosave()
+
+    def autosave(self):
+        """Has the game written to disk in the background, so it can be picked up again by resume()"""
+        self.autosaver.save(self.position, self.result)
+
+    def resume(self):
+        """Shows the game autosaved when the program last ran, or starts a new one if that game was over"""
+        try:
+            position, result = read_snapshot(self.autosaver.path)
+        except (OSError, ValueError):  # no game was saved yet, or the file is from another version
+            position, result = None, "*"
+        if position is None or result != "*":
+            self.set_starting_position()
+            return
+        self.show_position(position)
+        self.update_status()
+
+
+def main(argv=None):
+    """Opens the window and plays until it is closed; importing this file only defines Board"""
+    parser = argparse.ArgumentParser(prog="python3 Chess.py", description="Plays Anarchist Chess in a window.")
+    parser.add_argument("--rules", type=Rules.parse,
+                        help="start a new game with these kinks, ex: b1,forced-ep (default: carry on the saved game)")
+    args = parser.parse_args(argv)
+
+    root = tk.Tk()  # creates main window with the board and creates board object
+    root.geometry("800x800")
+    board = Board(root)
+    board.import_pieces()
+    if args.rules is not None:
+        board.show_position(Position(rules=args.rules))
+    else:
+        board.resume()
+    atexit.register(board.autosaver.close)  # the last move's save may still be waiting for the thread
+    if os.environ.get(PROFILE_ENV):
+        board.start_profiling()
+        atexit.register(board.profiler.dump, os.environ[PROFILE_ENV])
+
+    button_resign = tk.Button(root, text="RESIGN", height=1, width=5, command=lambda: board.resign())
+    button_resign.pack()
+    button_draw = tk.Button(root, text="DRAW", height=1, width=5, command=lambda: board.claim_draw())
+    button_draw.pack()
+    button_newgame = tk.Button(root, text="NEW GAME", height=1, width=10, command=lambda: board.set_starting_position())
+    button_newgame.pack()
+    button_undo = tk.Button(root, text="UNDO", height=1, width=5, command=lambda: board.undo())
+    button_undo.pack()
+    button_redo = tk.Button(root, text="REDO", height=1, width=5, command=lambda: board.redo())
+    button_redo.pack()
+    button_takeback = tk.Button(root, text="TAKEBACK", height=1, width=10, command=lambda: board.take_back())
+    button_takeback.pack()
+    button_profile = tk.Button(root, text="PROFILE", height=1, width=10, command=lambda: board.toggle_profiling())
+    button_profile.pack()
+    button_load = tk.Button(root, text="LOAD", height=1, width=5, command=lambda: board.load())
+    button_load.pack()
+    button_save = tk.Button(root, text="SAVE", height=1, width=5, command=lambda: board.save())
+    button_save.pack()
+    status_label = tk.Label(root, textvariable=board.status)
+    status_label.pack()
+    latency_label = tk.Label(root, textvariable=board.latency)
+    latency_label.pack()
+
+    # the computer opponent: which side it plays, how deep it searches and how long it may think per move
+    engine_label = tk.Label(root, text="Computer plays")
+    engine_label.pack()
+    engine_menu = tk.OptionMenu(root, board.engine_color, "Nobody", "White", "Black",
+                                command=lambda choice: board.start_engine())
+    engine_menu.pack()
+    depth_label = tk.Label(root, text="Depth")
+    depth_label.pack()
+    depth_box = tk.Spinbox(root, from_=1, to=64, width=4, textvariable=board.engine_depth)
+    depth_box.pack()
+    time_label = tk.Label(root, text="Seconds per move")
+    time_label.pack()
+    time_box = tk.Spinbox(root, from_=0.1, to=600, increment=0.5, width=5, textvariable=board.engine_time)
+    time_box.pack()
+
+    # the kinks, as declared in anarchist_chess.rules; ticking them changes the rules of the next NEW GAME
+    kinks_label = tk.Label(root, text="Kinks for a new game")
+    kinks_label.pack()
+    for name in KINKS:
+        kink_box = tk.Checkbutton(root, text=name, variable=board.kinks[name])
+        kink_box.pack()
+
+    board.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# Rules of Anarchist Chess, usable without Tk.
+# Chess.py renders a Position from this package; nothing in here needs a display.
+
+from .position import (WHITE, BLACK, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, START_FEN, Position,
+                       make_piece, piece_kind, piece_color, parse_square, square_name, encode_move, move_name,
+                       parse_move)
+from .movegen import legal_moves, is_checkmate, is_stalemate, moves_by_destination
+from .rules import Rules, STANDARD, ANARCHIST
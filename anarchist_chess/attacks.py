@@ -0,0 +1,168 @@
+# Attack tables for every square, built once when the module is imported.
+# Sets of squares are bitboards: Python ints where bit n stands for square n (a1 = 0, h8 = 63),
+# so checking a knight jump or a clear path is a table lookup and an AND instead of walking the board.
+
+# (file step, rank step) of each direction; squares grow in the first four, shrink in the last four
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1))
+NORTH, EAST, NORTH_EAST, NORTH_WEST, SOUTH, WEST, SOUTH_WEST, SOUTH_EAST = range(8)
+ROOK_DIRECTIONS = (NORTH, EAST, SOUTH, WEST)
+BISHOP_DIRECTIONS = (NORTH_EAST, NORTH_WEST, SOUTH_WEST, SOUTH_EAST)
+
+# how two squares are aligned, see ALIGNMENT
+NOT_ALIGNED = 0
+ORTHOGONAL = 1
+DIAGONAL = 2
+
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_STEPS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+
+
+def _on_board(file, rank):
+    return 0 <= file < 8 and 0 <= rank < 8
+
+
+def _step_table(steps):
+    """:return for each square, the bitboard of squares one of the steps away"""
+    table = []
+    for square in range(64):
+        file, rank = square & 7, square >> 3
+        bits = 0
+        for file_step, rank_step in steps:
+            if _on_board(file + file_step, rank + rank_step):
+                bits |= 1 << (square + file_step + 8 * rank_step)
+        table.append(bits)
+    return table
+
+
+def _ray_table():
+    """:return RAYS[direction][square], the squares from square to the edge of the board (square excluded)"""
+    table = []
+    for file_step, rank_step in DIRECTIONS:
+        rays = []
+        for square in range(64):
+            file, rank = (square & 7) + file_step, (square >> 3) + rank_step
+            bits = 0
+            while _on_board(file, rank):
+                bits |= 1 << (rank * 8 + file)
+                file += file_step
+                rank += rank_step
+            rays.append(bits)
+        table.append(rays)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table(KNIGHT_STEPS)
+KING_ATTACKS = _step_table(KING_STEPS)
+# PAWN_ATTACKS[color][square]: squares a pawn of that color on square captures on (white = 0 moves up the board)
+PAWN_ATTACKS = [_step_table(((-1, 1), (1, 1))), _step_table(((-1, -1), (1, -1)))]
+RAYS = _ray_table()
+
+
+def _knight_leg_table():
+    """:return for each square, (leg square, the two knight targets behind it) for each straight first step"""
+    table = []
+    for square in range(64):
+        file, rank = square & 7, square >> 3
+        legs = []
+        for file_step, rank_step in ((0, 1), (1, 0), (0, -1), (-1, 0)):
+            if not _on_board(file + file_step, rank + rank_step):
+                continue
+            targets = 0
+            for side in (-1, 1):  # after the straight step the knight goes one diagonal further out
+                x = file + 2 * file_step + (side if file_step == 0 else 0)
+                y = rank + 2 * rank_step + (side if rank_step == 0 else 0)
+                if _on_board(x, y):
+                    targets |= 1 << (y * 8 + x)
+            if targets:
+                legs.append((square + file_step + 8 * rank_step, targets))
+        table.append(tuple(legs))
+    return table
+
+
+# KNIGHT_LEGS[square]: for the "leg" horsey, ((leg square, targets), ...): the targets need the leg square empty
+KNIGHT_LEGS = _knight_leg_table()
+
+# BETWEEN[a][b]: squares strictly between a and b on their shared line, 0 if they share none
+# LINE[a][b]: the whole line through a and b, edge to edge, 0 if they share none
+# ALIGNMENT[a][b]: ORTHOGONAL, DIAGONAL or NOT_ALIGNED
+BETWEEN = [[0] * 64 for _ in range(64)]
+LINE = [[0] * 64 for _ in range(64)]
+ALIGNMENT = [[NOT_ALIGNED] * 64 for _ in range(64)]
+for _direction, (_file_step, _rank_step) in enumerate(DIRECTIONS):
+    for _a in range(64):
+        _line = RAYS[_direction][_a] | RAYS[(_direction + 4) % 8][_a] | (1 << _a)
+        _file, _rank = (_a & 7) + _file_step, (_a >> 3) + _rank_step
+        _walked = 0
+        while _on_board(_file, _rank):
+            _b = _rank * 8 + _file
+            BETWEEN[_a][_b] = _walked
+            LINE[_a][_b] = _line
+            ALIGNMENT[_a][_b] = ORTHOGONAL if _direction in ROOK_DIRECTIONS else DIAGONAL
+            _walked |= 1 << _b
+            _file += _file_step
+            _rank += _rank_step
+del _direction, _file_step, _rank_step, _a, _line, _file, _rank, _walked, _b
+
+
+def lowest_square(bits):
+    """:return the smallest square in a non-empty bitboard"""
+    return (bits & -bits).bit_length() - 1
+
+
+def highest_square(bits):
+    """:return the largest square in a non-empty bitboard"""
+    return bits.bit_length() - 1
+
+
+def squares_of(bits):
+    """Yields each square in the bitboard, lowest first"""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+def _slide(square, occupied, directions):
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            # the ray stops at the first piece met, which is the nearest one in the direction of travel
+            blocker = (blockers & -blockers).bit_length() - 1 if direction < 4 else blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+
+def knight_leg_attacks(square, occupied):
+    """:return squares a horsey that has to step through its leg square attacks from square"""
+    attacks = 0
+    for leg, targets in KNIGHT_LEGS[square]:
+        if not occupied >> leg & 1:
+            attacks |= targets
+    return attacks
+
+
+def horsey_turn(sq1, sq2, straight):
+    """:return the square where a horsey going from sq1 to sq2 turns: straight squares along the long side of its L
+    (2 for the usual jump, 1 for a horsey that steps through its leg square), from where it goes on to sq2"""
+    file_step, rank_step = (sq2 & 7) - (sq1 & 7), (sq2 >> 3) - (sq1 >> 3)
+    if abs(rank_step) == 2:
+        return sq1 + 8 * (straight if rank_step > 0 else -straight)
+    return sq1 + (straight if file_step > 0 else -straight)
+
+
+def rook_attacks(square, occupied):
+    """:return squares a rook on square attacks, given the bitboard of occupied squares"""
+    return _slide(square, occupied, ROOK_DIRECTIONS)
+
+
+def bishop_attacks(square, occupied):
+    """:return squares a bishop on square attacks, given the bitboard of occupied squares"""
+    return _slide(square, occupied, BISHOP_DIRECTIONS)
+
+
+def queen_attacks(square, occupied):
+    """:return squares a queen on square attacks, given the bitboard of occupied squares"""
+    return _slide(square, occupied, range(8))
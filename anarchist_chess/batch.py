@@ -0,0 +1,407 @@
+# The rules for many positions at once, with NumPy.
+# For database work the questions are the same for millions of positions (is the side to move in check, is this
+# move legal), so instead of asking a Position each time, a Batch holds them all as arrays and answers for every
+# position with a handful of array operations. Bitboards are numpy.uint64 with the layout of anarchist_chess.attacks
+# (bit n is square n, a1 = 0). The answers are the ones Position.is_legal(), in_check() and attack_map() give.
+# NumPy is only needed by this module, the rest of the package runs without it.
+#
+# Usage:
+#     batch = Batch(boards, sides, castling)           boards is N x 64 piece codes, see anarchist_chess.position
+#     batch.in_check()                                 N Booleans
+#     batch.legal(moves)                               one encoded move per position
+#     batch.legal(moves, rows)                         any number of moves, rows[i] is the position of moves[i]
+#     python -m anarchist_chess.batch --positions 100000     compare against a loop over Positions and time both
+
+import argparse
+import random
+import sys
+import time
+
+import numpy
+
+from .attacks import PAWN_ATTACKS, KNIGHT_ATTACKS, KING_ATTACKS, BETWEEN, ALIGNMENT, ORTHOGONAL, DIAGONAL
+from .movegen import legal_moves
+from .position import WHITE, BLACK, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE_SHORT, WHITE_LONG, \
+    BLACK_SHORT, BLACK_LONG, Position
+from .rules import HOMES, Rules, ANARCHIST
+
+ZERO = numpy.uint64(0)
+ONE = numpy.uint64(1)
+
+
+def _table(values):
+    """:return a list of Python int bitboards (or nested lists of them) as a numpy.uint64 array"""
+    return numpy.array(values, dtype=numpy.uint64)
+
+
+PAWN_ATTACKS_TABLE = _table(PAWN_ATTACKS)  # [color, square]
+KNIGHT_ATTACKS_TABLE = _table(KNIGHT_ATTACKS)
+KING_ATTACKS_TABLE = _table(KING_ATTACKS)
+BETWEEN_TABLE = _table(BETWEEN)  # [a, b]
+ALIGNMENT_TABLE = numpy.array(ALIGNMENT, dtype=numpy.uint8)
+
+# squares a piece can't come from when it steps file_step files to the side, so nothing wraps around the board
+_FILE_MASKS = {}
+for _file_step in range(-2, 3):
+    _FILE_MASKS[_file_step] = numpy.uint64(sum(1 << square for square in range(64)
+                                               if 0 <= (square & 7) + _file_step < 8))
+del _file_step
+
+ROOK_STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+BISHOP_STEPS = ((1, 1), (-1, 1), (-1, -1), (1, -1))
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+
+
+def castles(rules):
+    """:return dict of the castles the rules allow, by the King's destination: (color, right needed, rook from,
+    rook to, where the King starts), worked out from Rules.castle_rooks; the squares the King may not pass when
+    attacked come from Rules.castle_passed"""
+    table = {}
+    for color, (home, destinations) in enumerate(zip(HOMES, rules.castle_rooks)):
+        for to, (rook_home, rook_square) in destinations.items():
+            if rook_home > home:
+                right = WHITE_SHORT if color == WHITE else BLACK_SHORT
+            else:
+                right = WHITE_LONG if color == WHITE else BLACK_LONG
+            table[to] = (color, right, rook_home, rook_square, home)
+    return table
+
+
+def shift(bits, file_step, rank_step):
+    """:return the bitboards with every square moved by the step; squares that would leave the board are dropped"""
+    bits = bits & _FILE_MASKS[file_step]
+    steps = file_step + 8 * rank_step
+    return bits << numpy.uint64(steps) if steps > 0 else bits >> numpy.uint64(-steps)
+
+
+def square_bits(squares):
+    """:return the bitboards of the given squares, 0 where the square is negative (no square)"""
+    squares = numpy.asarray(squares, dtype=numpy.int64)
+    return numpy.where(squares >= 0, ONE << numpy.maximum(squares, 0).astype(numpy.uint64), ZERO)
+
+
+def slide(sliders, occupied, steps):
+    """:return the squares the sliders attack along the steps, each ray stopping at the first piece it meets"""
+    empty = ~occupied
+    attacks = numpy.zeros_like(sliders)
+    for file_step, rank_step in steps:
+        ray = sliders
+        for _ in range(7):
+            ray = shift(ray, file_step, rank_step)
+            attacks |= ray
+            ray &= empty
+    return attacks
+
+
+def knight_attacks(knights, occupied, standard_horsey):
+    """:return the squares the knights attack; a horsey that steps through its leg needs the leg square empty"""
+    attacks = numpy.zeros_like(knights)
+    if standard_horsey:
+        for file_step, rank_step in KNIGHT_STEPS:
+            attacks |= shift(knights, file_step, rank_step)
+        return attacks
+    empty = ~occupied
+    for file_step, rank_step in ROOK_STEPS:
+        legs = shift(knights, file_step, rank_step) & empty
+        for side in (-1, 1):  # then one diagonal step further out
+            attacks |= shift(legs, file_step or side, rank_step or side)
+    return attacks
+
+
+def knights_attacking(targets, knights, occupied, standard_horsey):
+    """:return the knights that attack a target square (one target per position, or none)"""
+    if standard_horsey:
+        return knight_attacks(targets, occupied, True) & knights
+    # going backwards from the target: one diagonal step to the leg square, which has to be empty, then on along
+    # either of that diagonal's straight parts to where the horsey stands
+    empty = ~occupied
+    found = numpy.zeros_like(targets)
+    for file_step, rank_step in BISHOP_STEPS:
+        legs = shift(targets, file_step, rank_step) & empty
+        found |= shift(legs, file_step, 0) | shift(legs, 0, rank_step)
+    return found & knights
+
+
+def pawn_attacks(pawns, colors):
+    """:return the squares the pawns capture on; colors gives the color of each position's pawns"""
+    up = shift(pawns, -1, 1) | shift(pawns, 1, 1)
+    down = shift(pawns, -1, -1) | shift(pawns, 1, -1)
+    return numpy.where(colors == WHITE, up, down)
+
+
+class Batch:
+    """N positions as arrays, see the module comment"""
+
+    def __init__(self, boards, sides, castling, ep_squares=None, rules=ANARCHIST):
+        """:param boards: N x 64 piece codes, a1 first, as in Position.board
+        :param sides: N colors to move
+        :param castling: N castling rights bits, as in Position.castling
+        :param ep_squares: N en passant squares, -1 for none; none anywhere by default
+        :param rules: the kinks all the positions are played with"""
+        self.boards = numpy.ascontiguousarray(boards, dtype=numpy.uint8)
+        if self.boards.ndim != 2 or self.boards.shape[1] != 64:
+            raise ValueError("boards should be N x 64, not %s" % (self.boards.shape,))
+        count = len(self.boards)
+        self.sides = numpy.asarray(sides, dtype=numpy.uint8).reshape(count)
+        self.castling = numpy.asarray(castling, dtype=numpy.uint8).reshape(count)
+        if ep_squares is None:
+            self.ep_squares = numpy.full(count, -1, dtype=numpy.int64)
+        else:
+            self.ep_squares = numpy.asarray(ep_squares, dtype=numpy.int64).reshape(count)
+        self.rules = rules
+        self.castles = castles(rules)
+        self.rows = numpy.arange(count)
+
+        # pieces[code] is the bitboard of each piece code in every position: the 64 Booleans of a row packed into
+        # 8 bytes, little end first, read as one number
+        self.pieces = numpy.zeros((16, count), dtype=numpy.uint64)
+        for color in (WHITE, BLACK):
+            for kind in range(PAWN, KING + 1):
+                code = kind | color << 3
+                packed = numpy.packbits(self.boards == code, axis=1, bitorder="little")
+                self.pieces[code] = packed.view("<u8").reshape(count)
+        self.occupancy = numpy.array([numpy.bitwise_or.reduce(self.pieces[1:7], axis=0),
+                                      numpy.bitwise_or.reduce(self.pieces[9:15], axis=0)])
+        self.occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        # square of each color's King, -1 for none
+        self.kings = numpy.full((2, count), -1, dtype=numpy.int64)
+        for color in (WHITE, BLACK):
+            has_king, square = numpy.nonzero(self.boards == (KING | color << 3))
+            self.kings[color, has_king] = square
+
+    def __len__(self):
+        return len(self.boards)
+
+    @staticmethod
+    def from_positions(positions, rules=None):
+        """:param rules: the kinks to play with, those of the first position by default"""
+        if rules is None:
+            rules = positions[0].rules if positions else ANARCHIST
+        # piece codes fit in a byte, so the boards go through one bytes object rather than N lists
+        boards = numpy.frombuffer(b"".join(bytes(position.board) for position in positions),
+                                  dtype=numpy.uint8).reshape(-1, 64)
+        return Batch(boards, [position.side for position in positions],
+                     [position.castling for position in positions],
+                     [-1 if position.ep_square is None else position.ep_square for position in positions], rules)
+
+    def side_pieces(self, kind, colors, rows):
+        """:return the bitboards of the pieces of kind belonging to colors[i] in position rows[i]"""
+        return self.pieces[kind | colors.astype(numpy.int64) << 3, rows]
+
+    def attack_map(self, colors=None, rows=None):
+        """:return the bitboards of every square a piece of the given color attacks, as Position.attack_map()
+
+        :param colors: one color, or one per position; the side not to move by default
+        :param rows: the positions to look at, all of them by default"""
+        if rows is None:
+            rows = self.rows
+        if colors is None:
+            colors = 1 - self.sides[rows]
+        colors = numpy.broadcast_to(numpy.asarray(colors, dtype=numpy.uint8), rows.shape)
+        occupied = self.occupied[rows]
+        queens = self.side_pieces(QUEEN, colors, rows)
+        attacked = pawn_attacks(self.side_pieces(PAWN, colors, rows), colors)
+        attacked |= knight_attacks(self.side_pieces(KNIGHT, colors, rows), occupied,
+                                   self.rules.standard_horsey)
+        attacked |= slide(self.side_pieces(BISHOP, colors, rows) | queens, occupied, BISHOP_STEPS)
+        attacked |= slide(self.side_pieces(ROOK, colors, rows) | queens, occupied, ROOK_STEPS)
+        kings = self.side_pieces(KING, colors, rows)
+        for file_step, rank_step in BISHOP_STEPS + ROOK_STEPS:
+            attacked |= shift(kings, file_step, rank_step)
+        return attacked
+
+    def attacked(self, targets, colors, enemy_pieces, occupied):
+        """:return for each position, whether a piece of colors attacks the square in targets (a bitboard holding
+        one square or none), looking out from the target like Position.is_attacked()
+
+        :param enemy_pieces: function of kind returning the attackers' bitboards of that kind"""
+        queens = enemy_pieces(QUEEN)
+        hits = slide(targets, occupied, ROOK_STEPS) & (enemy_pieces(ROOK) | queens)
+        hits |= slide(targets, occupied, BISHOP_STEPS) & (enemy_pieces(BISHOP) | queens)
+        hits |= knights_attacking(targets, enemy_pieces(KNIGHT), occupied, self.rules.standard_horsey)
+        hits |= pawn_attacks(targets, 1 - colors) & enemy_pieces(PAWN)
+        kings = enemy_pieces(KING)
+        for file_step, rank_step in BISHOP_STEPS + ROOK_STEPS:
+            hits |= shift(targets, file_step, rank_step) & kings
+        return hits != 0
+
+    def in_check(self, rows=None):
+        """:return for each position, whether the side to move is in check"""
+        if rows is None:
+            rows = self.rows
+        sides = self.sides[rows]
+        enemies = 1 - sides
+        kings = square_bits(self.kings[sides, rows])
+        return self.attacked(kings, enemies, lambda kind: self.side_pieces(kind, enemies, rows), self.occupied[rows])
+
+    def legal(self, moves, rows=None):
+        """Checks moves the way Position.is_legal() does: the piece may move there, the King isn't left in check,
+        and en passant is played when the rules force it. Promotion pieces are ignored.
+
+        :param moves: encoded moves, see anarchist_chess.position.encode_move()
+        :param rows: the position each move is for, by default moves[i] is for position i
+        :return array of Booleans"""
+        moves = numpy.asarray(moves, dtype=numpy.int64)
+        rows = self.rows if rows is None else numpy.asarray(rows, dtype=numpy.int64)
+        sq1 = moves & 63
+        sq2 = moves >> 6 & 63
+        legal = self.plain_legal(sq1, sq2, rows)
+        if not self.rules.forced_en_passant:
+            return legal
+        # when any en passant capture is legal, nothing else is
+        ep_squares = self.ep_squares[rows]
+        sides = self.sides[rows]
+        has_ep = ep_squares >= 0
+        ep_capture = has_ep & (sq2 == ep_squares) & (self.boards[rows, sq1] == (PAWN | sides << 3))
+        forced = numpy.zeros(len(rows), dtype=bool)
+        for side in (-1, 1):  # the pawns that could take are beside the pawn that just moved two squares
+            pawns = numpy.where(sides == WHITE, ep_squares - 8, ep_squares + 8) + side
+            files_ok = has_ep & ((ep_squares & 7) + side >= 0) & ((ep_squares & 7) + side < 8)
+            pawns = numpy.where(files_ok, pawns, 0)
+            is_pawn = files_ok & (self.boards[rows, pawns] == (PAWN | sides << 3))
+            forced |= is_pawn & self.plain_legal(pawns, numpy.maximum(ep_squares, 0), rows)
+        return legal & (ep_capture | ~forced)
+
+    def plain_legal(self, sq1, sq2, rows):
+        """:return for each move, whether it is legal, leaving forced en passant aside"""
+        boards = self.boards
+        piece = boards[rows, sq1].astype(numpy.int64)
+        target = boards[rows, sq2].astype(numpy.int64)
+        sides = self.sides[rows].astype(numpy.int64)
+        kind = piece & 7
+        occupied = self.occupied[rows]
+        bit1 = ONE << sq1.astype(numpy.uint64)
+        bit2 = ONE << sq2.astype(numpy.uint64)
+        ep_squares = self.ep_squares[rows]
+
+        # what allowed_piece_move() checks: the side's own piece, not onto its own pieces, and how the kind moves
+        movable = (piece != EMPTY) & (piece >> 3 == sides) & (sq1 != sq2) & ((target == EMPTY) |
+                                                                               (target >> 3 != sides))
+        forward = numpy.where(sides == WHITE, 8, -8)
+        pawn_start = numpy.where(sides == WHITE, 1, 6)
+        one_step = (sq2 == sq1 + forward) & (target == EMPTY)
+        middle = square_bits(numpy.clip(sq1 + forward, 0, 63))
+        two_steps = (sq2 == sq1 + 2 * forward) & (sq1 >> 3 == pawn_start) & ((occupied & (bit2 | middle)) == 0)
+        pawn_captures = (PAWN_ATTACKS_TABLE[sides, sq1] & bit2) != 0
+        ep_capture = (kind == PAWN) & pawn_captures & (sq2 == ep_squares)
+        pawn_ok = one_step | two_steps | pawn_captures & ((target != EMPTY) | (sq2 == ep_squares))
+
+        knight_ok = (KNIGHT_ATTACKS_TABLE[sq1] & bit2) != 0
+        if not self.rules.standard_horsey:
+            rank_steps = (sq2 >> 3) - (sq1 >> 3)
+            legs = numpy.where(numpy.abs(rank_steps) == 2, sq1 + 4 * rank_steps,
+                               sq1 + numpy.sign((sq2 & 7) - (sq1 & 7)))
+            legs = numpy.where(knight_ok, legs, sq1)
+            knight_ok &= (occupied & square_bits(legs)) == 0
+
+        alignment = ALIGNMENT_TABLE[sq1, sq2]
+        clear = (BETWEEN_TABLE[sq1, sq2] & occupied) == 0
+        bishop_ok = (alignment == DIAGONAL) & clear
+        rook_ok = (alignment == ORTHOGONAL) & clear
+        queen_ok = (alignment != 0) & clear
+
+        # castling: the right, the rook at home, nothing between them, and the King not passing an attacked square
+        castle = numpy.zeros(len(rows), dtype=bool)
+        rook_from = numpy.full(len(rows), -1, dtype=numpy.int64)
+        rook_to = numpy.full(len(rows), -1, dtype=numpy.int64)
+        castling = self.castling[rows]
+        candidates = (kind == KING) & (piece == (KING | sides << 3))
+        passed_attacked = None
+        for to, (color, right, rook_home, rook_square, king_home) in self.castles.items():
+            attempt = candidates & (sq1 == king_home) & (sq2 == to) & (sides == color)
+            if not attempt.any():
+                continue
+            if passed_attacked is None:
+                passed_attacked = self.attack_map(1 - sides, rows)
+            passed_bits = numpy.uint64(self.rules.castle_passed[to])
+            ok = attempt & ((castling & right) != 0) & (boards[rows, rook_home] == (ROOK | color << 3)) & \
+                ((occupied & numpy.uint64(BETWEEN[king_home][rook_home])) == 0) & \
+                ((passed_attacked & passed_bits) == 0)
+            castle |= ok
+            rook_from = numpy.where(ok, rook_home, rook_from)
+            rook_to = numpy.where(ok, rook_square, rook_to)
+        king_ok = ((KING_ATTACKS_TABLE[sq1] & bit2) != 0) | castle
+
+        allowed = movable & numpy.select(
+            [kind == PAWN, kind == KNIGHT, kind == BISHOP, kind == ROOK, kind == QUEEN, kind == KING],
+            [pawn_ok, knight_ok, bishop_ok, rook_ok, queen_ok, king_ok], False)
+        if not allowed.any():
+            return allowed
+
+        # play the move on the bitboards that matter and look at the King
+        capture_squares = numpy.where(ep_capture, sq2 - forward, sq2)
+        captured = square_bits(capture_squares)
+        after = (occupied & ~bit1 & ~captured) | bit2
+        after = (after & ~square_bits(rook_from)) | square_bits(rook_to)
+        enemies = 1 - sides
+        kings = numpy.where(kind == KING, sq2, self.kings[sides, rows])
+        exposed = self.attacked(square_bits(kings), enemies,
+                                lambda kind: self.side_pieces(kind, enemies, rows) & ~captured, after)
+        return allowed & ~exposed
+
+
+def sample(count, rules, seed=0, max_plies=120):
+    """Plays random games and keeps positions from them, each with a move to ask about: a legal one, or a random
+    move of one of the side's pieces, which is mostly illegal
+
+    :return (positions, moves)"""
+    rng = random.Random(seed)
+    positions = []
+    moves = []
+    position = Position(rules=rules)
+    while len(positions) < count:
+        legal = legal_moves(position)
+        if not legal or len(position.history) >= max_plies:
+            position = Position(rules=rules)
+            continue
+        own = [square for square in range(64) if position.color_at(square) == position.side]
+        if rng.random() < 0.5:
+            moves.append(rng.choice(legal))
+        else:
+            moves.append(rng.choice(own) | rng.randrange(64) << 6)
+        positions.append(position.copy())
+        position.make_move(rng.choice(legal))
+    return positions, moves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.batch",
+                                     description="Times the batch rules against a loop over Positions.")
+    parser.add_argument("--positions", type=int, default=100000)
+    parser.add_argument("--rules", type=Rules.parse, default=ANARCHIST, help="kinks to play with, ex: b1,forced-ep")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    positions, moves = sample(args.positions, args.rules, args.seed)
+    print("%d positions, rules %s" % (len(positions), args.rules.name()))
+
+    start = time.perf_counter()
+    loop_checks = [position.in_check() for position in positions]
+    loop_legal = [position.is_legal(move & 63, move >> 6 & 63) for position, move in zip(positions, moves)]
+    loop_attacks = [position.attack_map(1 - position.side) for position in positions]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = Batch.from_positions(positions, args.rules)
+    convert_time = time.perf_counter() - start
+    batch_checks = batch.in_check()
+    batch_legal = batch.legal(moves)
+    batch_attacks = batch.attack_map()
+    batch_time = time.perf_counter() - start
+
+    wrong = 0
+    for index in range(len(positions)):
+        if loop_checks[index] != batch_checks[index] or loop_legal[index] != batch_legal[index] or \
+                loop_attacks[index] != int(batch_attacks[index]):
+            wrong += 1
+            if wrong <= 10:
+                print("differs: %s %s" % (positions[index].fen(), moves[index]))
+    print("loop:  %.3fs, %.0f positions/sec" % (loop_time, len(positions) / loop_time))
+    print("batch: %.3fs (%.3fs of it making the arrays), %.0f positions/sec, %.1fx" % (
+        batch_time, convert_time, len(positions) / batch_time, loop_time / batch_time))
+    print("%d legal moves, %d checks, %d differences" % (sum(loop_legal), sum(loop_checks), wrong))
+    return 1 if wrong else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
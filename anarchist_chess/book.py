@@ -0,0 +1,291 @@
+# Opening books: the moves played from each position of a collection of games, looked up by the position's
+# Zobrist key (see anarchist_chess.zobrist) so the computer and the hint know the opening without searching it.
+# The format follows Polyglot's: after a header, fixed-width records of (key, move, weight, learn), sorted by key and
+# then move, big-endian so the bytes sort the same way the numbers do. A reader memory-maps the file and
+# binary-searches it, so opening even a large book costs nothing.
+# Building streams the games in and counts moves in a dict of bounded size; each time the dict fills up it is sorted
+# and written out as a run to a temporary file, and the runs are merged at the end. Memory stays the same however
+# many games there are.
+#
+# Usage:
+#     python -m anarchist_chess.book build games.pgn more.pgn --plies 24          writes the default book
+#     python -m anarchist_chess.book build games.pgn --output small.bin --min-games 3
+#     python -m anarchist_chess.book probe "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+
+import argparse
+import heapq
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from .pgn import read_games, parse_san, san
+from .position import WHITE, Position, move_name
+from .rules import Rules, ANARCHIST
+
+# the file starts with a header as long as a record: magic and format version
+HEADER = struct.Struct(">6sH8x")
+MAGIC = b"ACBOOK"
+VERSION = 1
+RECORD = struct.Struct(">QHHI")  # key, move (as encoded by anarchist_chess.position), weight, learn
+RUN_RECORD = struct.Struct(">QHII")  # key, move, weight not yet scaled to 16 bits, games, in the temporary runs
+MAX_WEIGHT = 0xFFFF
+DEFAULT_PLIES = 24  # moves of each game that go into the book
+DEFAULT_ENTRIES = 1 << 20  # (key, move) pairs counted in memory before they are written out as a run
+READ_RECORDS = 4096  # records read at a time from each run while merging
+
+# weight a move earns from a game, by the result for the side that played it; as in Polyglot, a win counts twice
+WIN_WEIGHT = 2
+DRAW_WEIGHT = 1
+LOSS_WEIGHT = 0
+
+
+def default_path():
+    """:return where the book is kept, under $XDG_CACHE_HOME (~/.cache by default)"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "anarchist-chess", "book.bin")
+
+
+class Book:
+    """A book file, memory-mapped"""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size \
+                else b""
+        try:
+            if len(self.data) < HEADER.size:
+                raise ValueError("%s is not a book" % path)
+            magic, version = HEADER.unpack_from(self.data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("%s is not a version %d book" % (path, VERSION))
+            if (len(self.data) - HEADER.size) % RECORD.size:
+                raise ValueError("%s is cut short" % path)
+        except (ValueError, struct.error):
+            self.close()
+            raise
+        self.size = (len(self.data) - HEADER.size) // RECORD.size  # records in the book
+
+    @staticmethod
+    def open(path=None):
+        """:return the Book at path (by default the default book), or None if there is none or it can't be read"""
+        try:
+            return Book(path or default_path())
+        except (OSError, ValueError):
+            return None
+
+    def record(self, number):
+        """:return (key, move, weight, learn) of the record"""
+        return RECORD.unpack_from(self.data, HEADER.size + number * RECORD.size)
+
+    def entries(self, key):
+        """:return list of (move, weight) stored for the key, by binary search"""
+        low, high = 0, self.size
+        while low < high:  # the first record whose key is not below the one looked for
+            middle = (low + high) // 2
+            if self.record(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.size:
+            record_key, move, weight, _learn = self.record(low)
+            if record_key != key:
+                break
+            found.append((move, weight))
+            low += 1
+        return found
+
+    def moves(self, position):
+        """:return list of (move, weight) of the position, heaviest first, leaving out moves that aren't legal in it;
+        a key shared by two positions, or a book built with other rules, could otherwise suggest one"""
+        legal = []
+        for move, weight in self.entries(position.key):
+            sq1, sq2, promotion = move & 63, move >> 6 & 63, move >> 12
+            if weight and position.is_legal(sq1, sq2) and bool(promotion) == position.is_promotion(sq1, sq2):
+                legal.append((move, weight))
+        legal.sort(key=lambda entry: -entry[1])
+        return legal
+
+    def choose(self, position, rng=random):
+        """:return a book move picked at random, more often the heavier it is, or None if the position isn't in
+        the book"""
+        moves = self.moves(position)
+        if not moves:
+            return None
+        pick = rng.randrange(sum(weight for _move, weight in moves))
+        for move, weight in moves:
+            pick -= weight
+            if pick < 0:
+                return move
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b""
+        self.size = 0
+
+
+def game_weights(game, plies, rules=None):
+    """Yields (key, move, weight) for the first plies moves of a game; stops early at a move that can't be played
+
+    :param rules: Rules to replay with, by default those of the game's Rules tag"""
+    try:
+        position = Position(game.start_fen(), rules or game.rules())
+    except ValueError:  # a FEN tag that can't be read
+        return
+    for text in game.moves[:plies]:
+        try:
+            move = parse_san(position, text)
+        except ValueError:
+            return
+        if game.result == "1/2-1/2" or game.result == "*":
+            weight = DRAW_WEIGHT
+        else:
+            weight = WIN_WEIGHT if (game.result == "1-0") == (position.side == WHITE) else LOSS_WEIGHT
+        yield position.key, move, weight
+        position.make_move(move)
+
+
+def write_run(counts, directory):
+    """Writes counted (key, move) -> weight << 32 | games out sorted, to a temporary file
+
+    :return the file's path"""
+    handle, path = tempfile.mkstemp(prefix="book-run-", suffix=".tmp", dir=directory)
+    with os.fdopen(handle, "wb") as file:
+        pack = RUN_RECORD.pack
+        file.writelines(pack(key, move, min(packed >> 32, 0xFFFFFFFF), packed & 0xFFFFFFFF)
+                        for (key, move), packed in sorted(counts.items()))
+    return path
+
+
+def read_run(path):
+    """Yields the (key, move, weight, games) records of a run in order, a few thousand at a time"""
+    with open(path, "rb") as file:
+        while True:
+            block = file.read(READ_RECORDS * RUN_RECORD.size)
+            if not block:
+                return
+            yield from RUN_RECORD.iter_unpack(block)
+
+
+def merge_runs(paths):
+    """Merges sorted runs, adding up the weights and games of a (key, move) found in several of them
+
+    :return generator of (key, list of (move, weight, games)) in key order"""
+    key, moves = None, []
+    for record_key, move, weight, games in heapq.merge(*(read_run(path) for path in paths)):
+        if record_key != key:
+            if moves:
+                yield key, moves
+            key, moves = record_key, []
+        if moves and moves[-1][0] == move:
+            moves[-1] = (move, moves[-1][1] + weight, moves[-1][2] + games)
+        else:
+            moves.append((move, weight, games))
+    if moves:
+        yield key, moves
+
+
+def build(paths, output=None, plies=DEFAULT_PLIES, min_games=1, rules=None, max_entries=DEFAULT_ENTRIES,
+          out=sys.stdout):
+    """Builds a book from PGN files, in bounded memory (see the top of this file)
+
+    :param output: file to write, by default default_path()
+    :param min_games: leave out positions reached in fewer games than this
+    :param rules: Rules to replay every game with, by default each game's Rules tag, or the Anarchist rules
+    :param max_entries: (key, move) pairs counted in memory before they are written out as a run
+    :return dict of numbers about the book"""
+    output = output or default_path()
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    games = moves = 0
+    runs = []
+    # (key, move) -> weight << 32 | games, one int per pair; games is kept apart so min_games counts lost games too
+    counts = {}
+    try:
+        for path in paths:
+            for game in read_games(path):
+                games += 1
+                for key, move, weight in game_weights(game, plies, rules):
+                    moves += 1
+                    counts[key, move] = counts.get((key, move), 0) + (weight << 32 | 1)
+                    if len(counts) >= max_entries:
+                        runs.append(write_run(counts, directory))
+                        counts = {}
+        if counts or not runs:
+            runs.append(write_run(counts, directory))
+            counts = {}
+
+        positions = records = 0
+        temporary = "%s.%d.tmp" % (output, os.getpid())  # renamed into place, so a reader never sees half a book
+        with open(temporary, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION))
+            for key, found in merge_runs(runs):
+                if sum(games for _move, _weight, games in found) < min_games:
+                    continue
+                weights = [(move, weight) for move, weight, _games in found if weight]
+                if not weights:  # every game that played from here lost
+                    continue
+                heaviest = max(weight for _move, weight in weights)
+                scale = max(1, -(-heaviest // MAX_WEIGHT))  # only how the moves of a position compare matters
+                positions += 1
+                for move, weight in weights:
+                    file.write(RECORD.pack(key, move, max(1, weight // scale), 0))
+                    records += 1
+        os.replace(temporary, output)
+    finally:
+        for path in runs:
+            os.remove(path)
+    elapsed = time.perf_counter() - start
+    out.write("%d games, %d moves, %d runs, %d positions, %d book moves, %.1fs, %.0f games/sec\n" % (
+        games, moves, len(runs), positions, records, elapsed, games / elapsed if elapsed else 0.0))
+    out.flush()
+    return {"games": games, "moves": moves, "runs": len(runs), "positions": positions, "records": records,
+            "seconds": round(elapsed, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.book",
+                                     description="Builds and probes opening books.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    builder = commands.add_parser("build", help="build a book from PGN files")
+    builder.add_argument("paths", nargs="+", help="PGN files to read")
+    builder.add_argument("--output", help="book to write (default: %s)" % default_path())
+    builder.add_argument("--plies", type=int, default=DEFAULT_PLIES, help="moves of each game to take")
+    builder.add_argument("--min-games", type=int, default=1, help="leave out positions played in fewer games")
+    builder.add_argument("--rules", type=Rules.parse,
+                         help="kinks to replay with, ex: b1,forced-ep (default: each game's Rules tag, else b1)")
+    builder.add_argument("--max-entries", type=int, default=DEFAULT_ENTRIES,
+                         help="moves counted in memory before they are written out to a temporary file")
+    prober = commands.add_parser("probe", help="list the book moves of a position")
+    prober.add_argument("fen")
+    prober.add_argument("--book", help="book to read (default: %s)" % default_path())
+    prober.add_argument("--rules", type=Rules.parse, default=ANARCHIST)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build(args.paths, args.output, args.plies, args.min_games, args.rules, max(1, args.max_entries))
+        return 0
+    try:
+        book = Book(args.book or default_path())
+        position = Position(args.fen, args.rules)
+    except (OSError, ValueError) as error:  # no book, or not a FEN
+        print(error)
+        return 1
+    moves = book.moves(position)
+    if not moves:
+        print("the position is not in the book")
+        return 1
+    total = sum(weight for _move, weight in moves)
+    for move, weight in moves:
+        print("%-8s %-6s %5d  %5.1f%%" % (san(position, move), move_name(move), weight, 100.0 * weight / total))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
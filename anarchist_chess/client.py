@@ -0,0 +1,118 @@
+# A small client for anarchist_chess.server, used by the load test and for trying the server out by hand.
+#
+# Usage:
+#     python -m anarchist_chess.client --rules b1 --time 300 --increment 2
+#     then type moves such as e2e4, or "resign"
+
+import argparse
+import asyncio
+import json
+import sys
+
+from .movegen import legal_moves
+from .position import Position, parse_move
+from .rules import Rules
+from .server import DEFAULT_PORT, COLOR_NAMES
+
+
+class Client:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    async def connect(host="127.0.0.1", port=DEFAULT_PORT):
+        reader, writer = await asyncio.open_connection(host, port)
+        return Client(reader, writer)
+
+    def send(self, **message):
+        self.writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+    async def receive(self):
+        """:return the next message from the server, or None once it has closed the connection"""
+        line = await self.reader.readline()
+        return json.loads(line) if line else None
+
+    async def wait_for(self, event):
+        """:return the next message of the given event, skipping others"""
+        while True:
+            message = await self.receive()
+            if message is None:
+                raise ConnectionError("the server closed the connection")
+            if message.get("event") == event:
+                return message
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def play(host, port, rules, base_time, increment):
+    """Seeks a game and plays it from the terminal, printing the board after every move"""
+    client = await Client.connect(host, port)
+    client.send(op="seek", rules=rules.name(), time=base_time, increment=increment)
+    print("waiting for an opponent...")
+    start = await client.wait_for("start")
+    game = start["game"]
+    position = Position(rules=Rules.parse(start["rules"]))
+    print("game %d, you play %s" % (game, start["color"]))
+
+    async def type_moves():
+        loop = asyncio.get_running_loop()
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                return
+            text = line.strip()
+            if text == "resign":
+                client.send(op="resign", game=game)
+            elif text:
+                client.send(op="move", game=game, move=text)
+
+    typing = asyncio.ensure_future(type_moves())
+    try:
+        while True:
+            message = await client.receive()
+            if message is None:
+                print("the server closed the connection")
+                break
+            event = message.get("event")
+            if event == "move":
+                try:
+                    move = parse_move(message["move"])
+                except ValueError:
+                    move = None
+                if move not in legal_moves(position):
+                    print("the server sent a move the rules don't allow: %s" % message["move"])
+                    break
+                position.make_move(move)
+                print("%s  clocks %s  %s to move" % (message["move"], message["clocks"], COLOR_NAMES[position.side]))
+                print(position.fen())
+            elif event == "error":
+                print("error: " + message["message"])
+            elif event == "end":
+                print("game over: %s (%s)" % (message["result"], message["reason"]))
+                break
+    finally:
+        typing.cancel()
+        await client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.client", description="Plays a game on a server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--rules", type=Rules.parse, default=Rules(), help="kinks to play with, ex: b1,forced-ep")
+    parser.add_argument("--time", type=float, default=0, help="seconds on each clock, 0 for no clock")
+    parser.add_argument("--increment", type=float, default=0, help="seconds added after every move")
+    args = parser.parse_args(argv)
+    asyncio.run(play(args.host, args.port, args.rules, args.time, args.increment))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+# The computer opponent: iterative deepening alpha-beta search with quiescence and move ordering.
+# A Searcher only touches the Position it is given, so it can run in a worker thread on a copy of the game.
+
+import time
+
+from .evaluate import evaluate, PIECE_VALUES
+from .movegen import legal_moves
+from .position import EMPTY, PAWN
+from .tablebase import WIN, LOSS
+from .transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+MATE = 100000  # score of giving mate right now; mate in n plies scores MATE - n
+INFINITY = 1000000
+MAX_DEPTH = 64
+CHECK_EVERY = 1024  # nodes between looks at the clock
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget runs out or the search is told to stop"""
+
+
+class Searcher:
+
+    def __init__(self, tt=None, tt_megabytes=16, tablebases=None, book=None):
+        """:param tt: a TranspositionTable to share with other searches, or None to make one
+        :param tt_megabytes: size of the table made when tt is None
+        :param tablebases: anarchist_chess.tablebase.Tablebases to look endgames up in, or None
+        :param book: anarchist_chess.book.Book to play openings from, or None"""
+        self.tt = tt if tt is not None else TranspositionTable(tt_megabytes)
+        self.tablebases = tablebases
+        self.book = book
+        self.nodes = 0
+        self.deadline = None
+        self.stop_event = None
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]  # quiet moves that caused a cutoff at each ply
+        self.history = {}  # (piece, to square) -> how often that quiet move caused a cutoff
+        self.pv_move = 0  # best move of the previous iteration, tried first at the root
+
+    def search(self, position, max_depth=MAX_DEPTH, time_limit=None, stop_event=None, on_iteration=None):
+        """Searches the position with iterative deepening until max_depth or time_limit is reached.
+
+        The position is played through with make/unmake and is left as it was found.
+
+        :param max_depth: deepest iteration to run
+        :param time_limit: seconds to think for, or None for no limit
+        :param stop_event: a threading.Event that stops the search early when set
+        :param on_iteration: called with (depth, score, best move, nodes) after every finished iteration
+        :return (best move, score) for the side to move; best move is None if there are no legal moves, and a
+        book move scores 0"""
+        self.prepare(time_limit, stop_event)
+        moves = legal_moves(position)
+        if not moves:
+            return None, -MATE if position.in_check() else 0
+        if self.tablebases is not None:  # a solved endgame needs no search
+            found = self.tablebases.best_move(position)
+            if found is not None:
+                return found[0], tablebase_score(found[1], 0)
+        if self.book is not None:  # nor does a known opening
+            move = self.book.choose(position)
+            if move is not None:
+                return move, 0
+        best_move, best_score = moves[0], -INFINITY
+        for depth in range(1, max(1, min(max_depth, MAX_DEPTH)) + 1):
+            try:
+                score, move = self.search_root(position, moves, depth)
+            except SearchTimeout:
+                break  # the unfinished iteration is thrown away, the previous one still stands
+            best_move, best_score = move, score
+            self.pv_move = move
+            if on_iteration is not None:
+                on_iteration(depth, score, move, self.nodes)
+            if abs(score) >= MATE - MAX_DEPTH:  # a forced mate was found, searching deeper changes nothing
+                break
+        return best_move, best_score
+
+    def prepare(self, time_limit=None, stop_event=None, new_search=True):
+        """Resets the counters and the clock before a search; search() calls it, other drivers of alpha_beta()
+        such as the parallel root splitter call it themselves
+
+        :param new_search: False when continuing the same search, so the table keeps treating its entries as fresh"""
+        self.nodes = 0
+        self.deadline = None if time_limit is None else time.monotonic() + time_limit
+        self.stop_event = stop_event
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        self.pv_move = 0
+        if new_search:
+            self.tt.new_search()
+
+    def search_root(self, position, moves, depth):
+        alpha = -INFINITY
+        best_move = moves[0]
+        for move in self.order_moves(position, moves, 0, self.pv_move):
+            position.make_move(move)
+            try:
+                score = -self.alpha_beta(position, depth - 1, -INFINITY, -alpha, 1)
+            finally:
+                position.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        self.tt.store(position.key, best_move, depth, EXACT, score_to_tt(alpha, 0))
+        return alpha, best_move
+
+    def alpha_beta(self, position, depth, alpha, beta, ply):
+        """:return the score of the position for the side to move, searched depth plies further"""
+        self.count_node()
+        if position.halfmove_clock >= 100 or position.repetitions():  # heading for a draw the opponent can claim
+            return 0
+        if self.tablebases is not None:
+            result = self.tablebases.probe(position)
+            if result is not None:
+                return tablebase_score(result, ply)
+        in_check = position.in_check()
+        if in_check:  # checks are searched one ply deeper so forcing lines aren't cut off at the horizon
+            depth += 1
+        if depth <= 0:
+            return self.quiescence(position, alpha, beta, ply)
+
+        key = position.key
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move, tt_depth, bound, score = entry
+            if tt_depth >= depth:
+                score = score_from_tt(score, ply)
+                if bound == EXACT or bound == LOWER and score >= beta or bound == UPPER and score <= alpha:
+                    return score
+
+        moves = legal_moves(position)
+        if not moves:
+            return -(MATE - ply) if in_check else 0
+        if ply >= MAX_DEPTH:
+            return evaluate(position)
+
+        board = position.board
+        original_alpha = alpha
+        best = 0
+        for move in self.order_moves(position, moves, ply, tt_move):
+            position.make_move(move)
+            try:
+                score = -self.alpha_beta(position, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                position.unmake_move()
+            if score >= beta:
+                if board[move >> 6 & 63] == EMPTY and not move >> 12:
+                    self.remember_cutoff(position, move, ply, depth)
+                self.tt.store(key, move, depth, LOWER, score_to_tt(beta, ply))
+                return beta
+            if score > alpha:
+                alpha = score
+                best = move
+        self.tt.store(key, best, depth, EXACT if alpha > original_alpha else UPPER, score_to_tt(alpha, ply))
+        return alpha
+
+    def quiescence(self, position, alpha, beta, ply):
+        """Searches captures and promotions only, until the position is quiet enough to evaluate"""
+        self.count_node()
+        stand_pat = evaluate(position, alpha, beta)
+        if stand_pat >= beta:
+            return beta
+        if stand_pat > alpha:
+            alpha = stand_pat
+        if ply >= MAX_DEPTH:
+            return alpha
+
+        board = position.board
+        ep_square = position.ep_square
+        captures = [move for move in legal_moves(position)
+                    if board[move >> 6 & 63] != EMPTY or move >> 12 or
+                    (move >> 6 & 63) == ep_square and board[move & 63] & 7 == PAWN]
+        for move in self.order_moves(position, captures, ply, 0):
+            position.make_move(move)
+            try:
+                score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            finally:
+                position.unmake_move()
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def order_moves(self, position, moves, ply, first_move):
+        """:return the moves sorted best-looking first: first_move, captures of big pieces by small ones,
+        promotions, killer moves, then quiet moves by their history score"""
+        board = position.board
+        killers = self.killers[ply] if ply <= MAX_DEPTH else (0, 0)
+        history = self.history
+
+        def priority(move):
+            if move == first_move:
+                return 1 << 30
+            mover = board[move & 63]
+            victim = board[move >> 6 & 63]
+            if victim != EMPTY:
+                return (1 << 20) + PIECE_VALUES[victim & 7] * 10 - PIECE_VALUES[mover & 7] // 10
+            if move >> 12:
+                return (1 << 20) + PIECE_VALUES[move >> 12] * 10
+            if move == killers[0]:
+                return 1 << 19
+            if move == killers[1]:
+                return (1 << 19) - 1
+            return history.get((mover, move >> 6 & 63), 0)
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def remember_cutoff(self, position, move, ply, depth):
+        """Records a quiet move that refuted a line, so it is tried early in sibling positions"""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        key = (position.board[move & 63], move >> 6 & 63)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+    def count_node(self):
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0:
+            if self.deadline is not None and time.monotonic() >= self.deadline or \
+                    self.stop_event is not None and self.stop_event.is_set():
+                raise SearchTimeout()
+
+
+def score_to_tt(score, ply):
+    """Mate scores count plies from the root; the table stores them counted from the position itself"""
+    if score >= MATE - MAX_DEPTH:
+        return score + ply
+    if score <= -(MATE - MAX_DEPTH):
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE - MAX_DEPTH:
+        return score - ply
+    if score <= -(MATE - MAX_DEPTH):
+        return score + ply
+    return score
+
+
+def tablebase_score(result, ply):
+    """:return the search score of a tablebase result (see Tablebases.probe()) found ply plies from the root"""
+    outcome, plies = result
+    if outcome == WIN:
+        return MATE - ply - plies
+    if outcome == LOSS:
+        return -(MATE - ply - plies)
+    return 0
+
+
+def best_move(position, max_depth=MAX_DEPTH, time_limit=None):
+    """Convenience wrapper: searches a copy of the position with a fresh Searcher
+
+    :return the best move found, or None if there are no legal moves"""
+    return Searcher().search(position.copy(), max_depth, time_limit)[0]
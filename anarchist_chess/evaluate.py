@@ -0,0 +1,248 @@
+# Static evaluation for the computer opponent: material and piece-square tables tapered from the middlegame to the
+# endgame, plus mobility and King safety. Scores are in centipawns from the point of view of the side to move.
+# Material and piece-square values are running totals that Position keeps up to date as pieces are put down and
+# picked up (see anarchist_chess.piece_square), so that part costs a few operations instead of a walk over the board.
+# Mobility and King safety hang on every slider's lines, which one move can open or close anywhere on the board, so
+# they are worked out for all of a color's pieces at once with bitboard fills, and left out when the running total
+# is so far outside the search window that they couldn't bring it back (lazy evaluation).
+#
+# Usage:
+#     python -m anarchist_chess.evaluate                      check the running totals and time evaluations
+#     python -m anarchist_chess.evaluate --games 200 --seconds 3
+
+import argparse
+import random
+import sys
+import time
+
+from .attacks import KING_ATTACKS
+from .movegen import legal_moves
+from .piece_square import PIECE_VALUES, PIECE_SQUARE, FULL_PHASE, unpack  # the engine takes PIECE_VALUES from here
+from .position import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, Position
+from .rules import ANARCHIST
+
+MOBILITY = 4  # per square a knight, bishop, rook or queen attacks that isn't taken by a piece of its own
+KING_ZONE_ATTACK = 8  # per square next to the King the enemy attacks, in the middlegame
+SHIELD_PAWN = 12  # per pawn in front of the King, in the middlegame
+LAZY_MARGIN = 200  # mobility and King safety are assumed to stay within this many centipawns
+
+FULL = (1 << 64) - 1
+NOT_A_FILE = FULL ^ 0x0101010101010101
+NOT_H_FILE = FULL ^ 0x8080808080808080
+NOT_AB_FILES = NOT_A_FILE & (NOT_A_FILE << 1)
+NOT_GH_FILES = NOT_H_FILE & (NOT_H_FILE >> 1)
+# (shift, squares a step may land on) of each sliding direction; the mask stops steps wrapping around the board edge
+ORTHOGONAL_STEPS = ((8, FULL), (-8, FULL), (1, NOT_A_FILE), (-1, NOT_H_FILE))
+DIAGONAL_STEPS = ((9, NOT_A_FILE), (7, NOT_H_FILE), (-7, NOT_A_FILE), (-9, NOT_H_FILE))
+
+KING_ZONES = [KING_ATTACKS[square] | 1 << square for square in range(64)]
+# SHIELDS[color][King square]: the squares one and two ranks in front of the King, on its file and the next ones
+SHIELDS = [[0] * 64, [0] * 64]
+for _square in range(64):
+    for _color, _forward in ((WHITE, 1), (BLACK, -1)):
+        for _file in range((_square & 7) - 1, (_square & 7) + 2):
+            for _rank in ((_square >> 3) + _forward, (_square >> 3) + 2 * _forward):
+                if 0 <= _file < 8 and 0 <= _rank < 8:
+                    SHIELDS[_color][_square] |= 1 << (_rank * 8 + _file)
+del _square, _color, _forward, _file, _rank
+
+
+def _fill(sliders, empty, shift, mask):
+    """:return the squares the sliders attack in one direction, all of them at once (a Kogge-Stone fill)"""
+    open_squares = empty & mask
+    if shift > 0:
+        sliders |= open_squares & (sliders << shift)
+        open_squares &= open_squares << shift
+        sliders |= open_squares & (sliders << 2 * shift)
+        open_squares &= open_squares << 2 * shift
+        sliders |= open_squares & (sliders << 4 * shift)
+        return (sliders << shift) & mask
+    shift = -shift
+    sliders |= open_squares & (sliders >> shift)
+    open_squares &= open_squares >> shift
+    sliders |= open_squares & (sliders >> 2 * shift)
+    open_squares &= open_squares >> 2 * shift
+    sliders |= open_squares & (sliders >> 4 * shift)
+    return (sliders >> shift) & mask
+
+
+def piece_attacks(position, color):
+    """:return bitboard of the squares the color's knights, bishops, rooks and queens attack.
+    Horseys are taken to jump, whatever the rules say; a blocked leg changes little for an estimate."""
+    pieces = position.pieces
+    base = color << 3
+    empty = FULL ^ position.occupied
+    knights = pieces[base | KNIGHT]
+    one = (knights << 1) & NOT_A_FILE | (knights >> 1) & NOT_H_FILE
+    two = (knights << 2) & NOT_AB_FILES | (knights >> 2) & NOT_GH_FILES
+    attacks = (one << 16 | one >> 16 | two << 8 | two >> 8) & FULL
+    lines = pieces[base | ROOK] | pieces[base | QUEEN]
+    if lines:
+        for shift, mask in ORTHOGONAL_STEPS:
+            attacks |= _fill(lines, empty, shift, mask)
+    diagonals = pieces[base | BISHOP] | pieces[base | QUEEN]
+    if diagonals:
+        for shift, mask in DIAGONAL_STEPS:
+            attacks |= _fill(diagonals, empty, shift, mask)
+    return attacks
+
+
+def pawn_attacks(position, color):
+    """:return bitboard of the squares the color's pawns attack"""
+    pawns = position.pieces[color << 3 | PAWN]
+    if color == WHITE:
+        return ((pawns << 7) & NOT_H_FILE | (pawns << 9) & NOT_A_FILE) & FULL
+    return (pawns >> 9) & NOT_H_FILE | (pawns >> 7) & NOT_A_FILE
+
+
+def positional(position, phase):
+    """:return mobility and King safety, from white's point of view
+
+    :param phase: how much of the middlegame is left, 0 to FULL_PHASE; King safety fades out with it"""
+    pieces = position.pieces
+    occupancy = position.occupancy
+    attacks = (piece_attacks(position, WHITE), piece_attacks(position, BLACK))
+    score = MOBILITY * (bin(attacks[WHITE] & ~occupancy[WHITE]).count("1") -
+                        bin(attacks[BLACK] & ~occupancy[BLACK]).count("1"))
+    if phase:
+        safety = 0
+        for color, sign in ((WHITE, 1), (BLACK, -1)):
+            king = position.kings[color]
+            if king is None:
+                continue
+            enemy = 1 - color
+            attacked = attacks[enemy] | pawn_attacks(position, enemy)
+            if position.kings[enemy] is not None:
+                attacked |= KING_ATTACKS[position.kings[enemy]]
+            safety += sign * (SHIELD_PAWN * bin(SHIELDS[color][king] & pieces[color << 3 | PAWN]).count("1") -
+                              KING_ZONE_ATTACK * bin(KING_ZONES[king] & attacked).count("1"))
+        score += safety * phase // FULL_PHASE
+    return score
+
+
+def taper(packed):
+    """:return (score from white's point of view, phase) of a packed running total, blending its middlegame and
+    endgame scores by how many pieces are left"""
+    middlegame, endgame, phase = unpack(packed)
+    if phase > FULL_PHASE:  # promotions can put more on the board than there was at the start
+        phase = FULL_PHASE
+    return (middlegame * phase + endgame * (FULL_PHASE - phase)) // FULL_PHASE, phase
+
+
+def evaluate(position, alpha=None, beta=None):
+    """:return the score of the position for the side to move, in centipawns
+
+    :param alpha: with beta, the search window; a position whose material and piece-square score is LAZY_MARGIN
+                  or more outside it is scored on those alone"""
+    score, phase = taper(position.score)
+    if position.side == BLACK:
+        score = -score
+    if alpha is not None and (score + LAZY_MARGIN <= alpha or score - LAZY_MARGIN >= beta):
+        return score
+    extra = positional(position, phase)
+    return score + extra if position.side == WHITE else score - extra
+
+
+def recompute(position):
+    """:return the packed running total of the position worked out from scratch, square by square; Position keeps
+    its own up to date, this is for checking it"""
+    total = 0
+    for square, piece in enumerate(position.board):
+        total += PIECE_SQUARE[piece][square]
+    return total
+
+
+def evaluate_from_scratch(position):
+    """:return what evaluate() returns, without using the running totals"""
+    score, phase = taper(recompute(position))
+    score += positional(position, phase)
+    return score if position.side == WHITE else -score
+
+
+def check_consistency(games, plies, rules=ANARCHIST, seed=0, out=sys.stdout):
+    """Plays random games, taking moves back now and then, and compares the running totals with a recompute after
+    every make and unmake
+
+    :return the number of positions that disagreed"""
+    rng = random.Random(seed)
+    checked = wrong = 0
+    for _game in range(games):
+        position = Position(rules=rules)
+        start = position.score
+        for _ply in range(plies):
+            moves = legal_moves(position)
+            if not moves:
+                break
+            if position.history and rng.random() < 0.2:
+                position.unmake_move()
+            else:
+                position.make_move(rng.choice(moves))
+            checked += 1
+            if position.score != recompute(position) or evaluate(position) != evaluate_from_scratch(position):
+                wrong += 1
+                out.write("running totals disagree with a recompute: %s\n" % position.fen())
+        while position.history:
+            position.unmake_move()
+        if position.score != start:
+            wrong += 1
+            out.write("taking every move back didn't restore the running totals\n")
+    out.write("%d positions checked against a recompute, %d disagreed\n" % (checked, wrong))
+    return wrong
+
+
+def sample_positions(count, rules=ANARCHIST, seed=0, max_plies=80):
+    """:return list of positions from random games, spread over the opening, middlegame and endgame"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position(rules=rules)
+        for _ply in range(rng.randrange(max_plies)):
+            moves = legal_moves(position)
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        positions.append(position)
+    return positions
+
+
+def benchmark(positions, seconds, out=sys.stdout):
+    """Times each way of evaluating over the positions for about seconds each
+
+    :return dict of name -> evaluations per second"""
+    ways = (("material and piece-square, from scratch", lambda position: taper(recompute(position))),
+            ("material and piece-square, running totals", lambda position: taper(position.score)),
+            ("full, from scratch", evaluate_from_scratch),
+            ("full, running totals", evaluate),
+            ("lazy cutoff, running totals", lambda position: evaluate(position, 100000, 100001)))
+    rates = {}
+    for name, way in ways:
+        count = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while time.perf_counter() < deadline:
+            for position in positions:
+                way(position)
+            count += len(positions)
+        rates[name] = count / (time.perf_counter() - start)
+        out.write("%-44s %10.0f evaluations/sec\n" % (name, rates[name]))
+    out.flush()
+    return rates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.evaluate",
+                                     description="Checks the running evaluation totals and times evaluations.")
+    parser.add_argument("--games", type=int, default=100, help="random games to check the running totals over")
+    parser.add_argument("--plies", type=int, default=120, help="moves per random game")
+    parser.add_argument("--positions", type=int, default=200, help="positions to time evaluations on")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time spent on each way of evaluating")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    wrong = check_consistency(args.games, args.plies, seed=args.seed)
+    benchmark(sample_positions(args.positions, seed=args.seed), args.seconds)
+    return 1 if wrong else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
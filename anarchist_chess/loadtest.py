@@ -0,0 +1,177 @@
+# Load test for anarchist_chess.server: plays thousands of games between simulated players over localhost and
+# reports moves per second and how long the server took to confirm each move.
+# Every simulated player keeps its own Position, picks a random legal move when it is its turn, and times the
+# move from sending it to hearing it pushed back.
+#
+# Usage:
+#     python -m anarchist_chess.loadtest --games 2000 --concurrency 500       starts its own server process
+#     python -m anarchist_chess.loadtest --port 8765 --games 100               uses a server that is running
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from .client import Client
+from .movegen import legal_moves
+from .position import Position, move_name, parse_move
+from .rules import Rules, ANARCHIST
+from .server import COLOR_NAMES
+
+
+class Results:
+
+    def __init__(self):
+        self.latencies = []  # seconds from sending a move to the server pushing it back
+        self.moves = 0
+        self.games = 0
+        self.errors = 0
+        self.endings = {}  # reason -> games
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def simulated_player(host, port, rules, base_time, max_plies, rng, results):
+    """Seeks a game and plays random legal moves until it ends; white resigns after max_plies"""
+    client = await Client.connect(host, port)
+    try:
+        client.send(op="seek", rules=rules.name(), time=base_time, increment=0)
+        start = await client.wait_for("start")
+        game = start["game"]
+        color = COLOR_NAMES.index(start["color"])
+        position = Position(rules=rules)
+        sent = None  # when our move went out
+        resigned = False
+        while True:
+            if position.side == color and sent is None and not resigned:
+                moves = legal_moves(position)
+                if color == 0 and len(position.history) >= max_plies:
+                    client.send(op="resign", game=game)
+                    resigned = True
+                elif moves:  # with none the game is over, and the server's end message is on its way
+                    sent = time.perf_counter()
+                    client.send(op="move", game=game, move=move_name(rng.choice(moves)))
+            message = await client.receive()
+            if message is None:
+                results.errors += 1
+                return
+            event = message["event"]
+            if event == "move":
+                if sent is not None and position.side == color:
+                    results.latencies.append(time.perf_counter() - sent)
+                    results.moves += 1
+                    sent = None
+                position.make_move(parse_move(message["move"]))
+            elif event == "end":
+                if color == 0:
+                    results.games += 1
+                    results.endings[message["reason"]] = results.endings.get(message["reason"], 0) + 1
+                return
+            elif event == "error":
+                results.errors += 1
+                client.send(op="resign", game=game)
+    finally:
+        await client.close()
+
+
+async def run(host, port, games, concurrency, rules, base_time, max_plies, seed):
+    """Plays the games, at most concurrency at a time, and returns the Results"""
+    results = Results()
+    rng = random.Random(seed)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one_game():
+        async with slots:
+            # both players seek with the same settings at the same time, so the server pairs them with each other
+            # (or with another pair's player, which is just as good)
+            await asyncio.gather(simulated_player(host, port, rules, base_time, max_plies, rng, results),
+                                 simulated_player(host, port, rules, base_time, max_plies, rng, results))
+
+    await asyncio.gather(*(one_game() for _ in range(games)))
+    return results
+
+
+async def sample_stats(host, port, peak, interval=0.5):
+    """Asks the server for its stats every interval seconds, until cancelled, keeping the busiest sample in peak"""
+    client = await Client.connect(host, port)
+    try:
+        while True:
+            client.send(op="stats")
+            stats = await client.wait_for("stats")
+            if stats["memory_bytes"] > peak.get("memory_bytes", -1):
+                peak.update(stats)
+            await asyncio.sleep(interval)
+    finally:
+        await client.close()
+
+
+async def start_server_process():
+    """Starts a server in a separate process on a free port, so it doesn't share a CPU with the players
+
+    :return (process, port)"""
+    process = await asyncio.create_subprocess_exec(sys.executable, "-m", "anarchist_chess.server", "--port", "0",
+                                                   stdout=asyncio.subprocess.PIPE)
+    line = (await process.stdout.readline()).decode()
+    if not line.startswith("listening on"):
+        process.kill()
+        raise RuntimeError("the server did not start: " + line)
+    return process, int(line.rsplit(":", 1)[1])
+
+
+async def main_async(args):
+    process = None
+    port = args.port
+    if port is None:
+        process, port = await start_server_process()
+    try:
+        peak = {}  # server stats when the games being played took the most memory
+        sampler = asyncio.ensure_future(sample_stats(args.host, port, peak))
+        start = time.perf_counter()
+        results = await run(args.host, port, args.games, args.concurrency, args.rules, args.time, args.max_plies,
+                            args.seed)
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+        client = await Client.connect(args.host, port)
+        client.send(op="stats")
+        stats = await client.wait_for("stats")
+        await client.close()
+    finally:
+        if process is not None:
+            process.terminate()
+            await process.wait()
+
+    print("%d games, %d moves in %.1fs: %.0f moves/sec, %.1f games/sec, %d errors" % (
+        results.games, results.moves, elapsed, results.moves / elapsed, results.games / elapsed, results.errors))
+    print("move latency ms: p50 %.2f  p90 %.2f  p99 %.2f  max %.2f" % tuple(
+        1000 * results.percentile(fraction) for fraction in (0.5, 0.9, 0.99, 1.0)))
+    print("endings: " + ", ".join("%s %d" % item for item in sorted(results.endings.items(), key=lambda item: -item[1])))
+    print("server: %d games finished, %d moves" % (stats["finished"], stats["moves"]))
+    if peak:
+        print("server memory at peak: %d games, %.1f KiB in all, %.1f KiB per game, %.1f KiB the largest" % (
+            peak["games"], peak["memory_bytes"] / 1024, peak["memory_bytes_per_game"] / 1024,
+            peak["memory_bytes_max_game"] / 1024))
+    return 1 if results.errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.loadtest",
+                                     description="Drives many simulated games against the server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="server to test; by default one is started for the test")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=250, help="games played at the same time")
+    parser.add_argument("--rules", type=Rules.parse, default=ANARCHIST)
+    parser.add_argument("--time", type=float, default=0, help="seconds on each clock, 0 for no clock")
+    parser.add_argument("--max-plies", type=int, default=200, help="white resigns games still going after this")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
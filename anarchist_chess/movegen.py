@@ -0,0 +1,172 @@
+# Lists every legal move in a position.
+# Pins and checks come from Position.check_info(), so moves are filtered with masks as they are generated
+# instead of being played and tested one by one. Rule kinks the masks can't describe (a horsey that can be
+# blocked) fall back to playing and testing every candidate. Which of those a game uses, and whether en passant is
+# forced, is settled once per Rules by compile_generator(), so legal_moves() doesn't ask again at every node.
+
+from .attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, BETWEEN, LINE, bishop_attacks, rook_attacks, \
+    queen_attacks, squares_of, lowest_square
+from .position import WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+ALL_SQUARES = (1 << 64) - 1
+
+
+def legal_moves(position):
+    """:return list of every legal move for the side to move, encoded as in position.encode_move()"""
+    return (position.rules.generate or compile_generator(position.rules))(position)
+
+
+def compile_generator(rules):
+    """Picks the move generator for the rules' kinks and keeps it on the rules as rules.generate
+
+    :return the generator, a function of a position returning its legal moves"""
+    generate = masked_moves if rules.standard_horsey else tested_moves
+    if rules.forced_en_passant:
+        generate = forcing_en_passant(generate)
+    rules.generate = generate
+    return generate
+
+
+def forcing_en_passant(generate):
+    """:return a generator that only lists the en passant captures among the moves of generate, when there are any"""
+    def generate_forced(position):
+        moves = generate(position)
+        ep_square = position.ep_square
+        if ep_square is not None:
+            board = position.board
+            captures = [move for move in moves if move >> 6 & 63 == ep_square and board[move & 63] & 7 == PAWN]
+            if captures:  # en passant is forced
+                return captures
+        return moves
+    return generate_forced
+
+
+def masked_moves(position):
+    """:return list of legal moves, found with the pin and check masks; only right for a jumping horsey"""
+    checkers, pinned, attacked = position.check_info()
+    color = position.side
+    base = color << 3
+    pieces = position.pieces
+    own = position.occupancy[color]
+    enemies = position.occupancy[1 - color]
+    occupied = position.occupied
+    king = position.kings[color]
+    moves = []
+    append = moves.append
+
+    # squares a non-King move has to land on: anywhere not our own, or onto/in front of a single checker
+    targets = ALL_SQUARES & ~own
+    if king is not None:
+        for to in squares_of(KING_ATTACKS[king] & targets & ~attacked):
+            append(king | to << 6)
+        if not checkers or position.rules.castle_out_of_check:
+            for to in castle_destinations(position, king):
+                append(king | to << 6)
+        if checkers:
+            if checkers & (checkers - 1):  # double check, only the King can move
+                return moves
+            targets &= checkers | BETWEEN[king][lowest_square(checkers)]
+
+    for square in squares_of(pieces[base | KNIGHT] & ~pinned):  # a pinned knight can never move
+        for to in squares_of(KNIGHT_ATTACKS[square] & targets):
+            append(square | to << 6)
+
+    for sliders, attacks in ((pieces[base | BISHOP] | pieces[base | QUEEN], bishop_attacks),
+                             (pieces[base | ROOK] | pieces[base | QUEEN], rook_attacks)):
+        for square in squares_of(sliders):
+            reach = attacks(square, occupied) & targets
+            if pinned >> square & 1:
+                reach &= LINE[king][square]
+            for to in squares_of(reach):
+                append(square | to << 6)
+
+    forward = 8 if color == WHITE else -8
+    start_rank = 1 if color == WHITE else 6
+    last_rank = 7 if color == WHITE else 0
+    ep_square = position.ep_square
+    for square in squares_of(pieces[base | PAWN]):
+        allowed = targets & LINE[king][square] if pinned >> square & 1 else targets
+        destinations = PAWN_ATTACKS[color][square] & enemies & allowed
+        to = square + forward
+        if not occupied >> to & 1:
+            destinations |= allowed & (1 << to)
+            if square >> 3 == start_rank and not occupied >> (to + forward) & 1:
+                destinations |= allowed & (1 << (to + forward))
+        for to in squares_of(destinations):
+            if to >> 3 == last_rank:
+                for kind in PROMOTIONS:
+                    append(square | to << 6 | kind << 12)
+            else:
+                append(square | to << 6)
+        # en passant can uncover a check along the rank, so it is left to the exact test
+        if ep_square is not None and PAWN_ATTACKS[color][square] >> ep_square & 1 and \
+                not position.leaves_king_in_check(square, ep_square):
+            append(square | ep_square << 6)
+    return moves
+
+
+def tested_moves(position):
+    """:return list of legal moves, found by trying every square each piece could reach with make/unmake"""
+    color = position.side
+    board = position.board
+    own = position.occupancy[color]
+    occupied = position.occupied
+    forward = 8 if color == WHITE else -8
+    last_rank = 7 if color == WHITE else 0
+    home = 4 if color == WHITE else 60
+    castle_targets = position.rules.castle_targets[color]
+    moves = []
+    for square in squares_of(own):
+        kind = board[square] & 7
+        if kind == PAWN:
+            candidates = PAWN_ATTACKS[color][square] | 1 << (square + forward)
+            if 0 <= square + 2 * forward < 64:
+                candidates |= 1 << (square + 2 * forward)
+        elif kind == KNIGHT:
+            candidates = KNIGHT_ATTACKS[square]
+        elif kind == KING:
+            candidates = KING_ATTACKS[square]
+            if square == home:
+                for to in castle_targets:
+                    candidates |= 1 << to
+        else:
+            candidates = queen_attacks(square, occupied)
+        for to in squares_of(candidates & ~own):
+            if not position.allowed_piece_move(square, to) or position.leaves_king_in_check(square, to):
+                continue
+            if kind == PAWN and to >> 3 == last_rank:
+                for promotion in PROMOTIONS:
+                    moves.append(square | to << 6 | promotion << 12)
+            else:
+                moves.append(square | to << 6)
+    return moves
+
+
+def castle_destinations(position, king):
+    """Yields the squares the King may castle to, for a side that is not in check (or may castle out of it)"""
+    if king != (4 if position.side == WHITE else 60) or not position.castling:
+        return
+    attacked = position.check_info()[2]
+    for to in position.rules.castle_targets[position.side]:
+        if not attacked >> to & 1 and position.castle(king, to):
+            yield to
+
+
+def is_checkmate(position):
+    """:return Boolean value for whether the side to move is checkmated"""
+    return position.in_check() and not legal_moves(position)
+
+
+def is_stalemate(position):
+    """:return Boolean value for whether the side to move has no legal moves but is not in check"""
+    return not position.in_check() and not legal_moves(position)
+
+
+def moves_by_destination(moves, square):
+    """:return dict of square -> the moves among moves that take the piece on square there (several if it promotes)"""
+    destinations = {}
+    for move in moves:
+        if move & 63 == square:
+            destinations.setdefault(move >> 6 & 63, []).append(move)
+    return destinations
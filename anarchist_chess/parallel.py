@@ -0,0 +1,181 @@
+# Root-splitting search over a pool of worker processes.
+# Every iteration of the iterative deepening searches the expected best root move first to get a score to beat,
+# then hands the other root moves to whichever worker is free with a null window around that score: most of them
+# only have to prove they are no better, which is cheap. The few that turn out better are searched again in full.
+# Each worker keeps its own Searcher and transposition table between tasks, so earlier work is reused.
+#
+# Usage:
+#     python -m anarchist_chess.parallel --workers 1,2,4 --depth 4    time-to-depth on BENCH_POSITIONS
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from .engine import Searcher, SearchTimeout, INFINITY, MAX_DEPTH, MATE
+from .movegen import legal_moves
+from .position import Position, START_FEN, move_name
+
+# a fixed set of positions for comparing worker counts
+BENCH_POSITIONS = [
+    START_FEN,
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+]
+
+_searcher = None  # the Searcher of this worker process
+_search_id = None  # the search the worker's Searcher last worked on
+
+
+def _start_worker(tt_megabytes):
+    global _searcher
+    _searcher = Searcher(tt_megabytes=tt_megabytes)
+
+
+def _search_root_move(task):
+    """Runs in a worker: searches one root move to the given depth.
+
+    :param task: (search id, position, move, depth, alpha, beta, wall-clock deadline or None)
+    :return (move, score or None if time ran out, nodes searched)"""
+    global _search_id
+    search_id, position, move, depth, alpha, beta, deadline = task
+    time_limit = None if deadline is None else deadline - time.time()
+    _searcher.prepare(time_limit, new_search=search_id != _search_id)
+    _search_id = search_id
+    if time_limit is not None and time_limit <= 0:
+        return move, None, 0
+    position.make_move(move)
+    try:
+        score = -_searcher.alpha_beta(position, depth - 1, -beta, -alpha, 1)
+    except SearchTimeout:
+        return move, None, _searcher.nodes
+    return move, score, _searcher.nodes
+
+
+class ParallelSearcher:
+
+    def __init__(self, workers=None, tt_megabytes=16):
+        """:param workers: number of worker processes, all cores by default
+        :param tt_megabytes: size of each worker's transposition table"""
+        self.workers = workers or os.cpu_count() or 1
+        self.tt_megabytes = tt_megabytes
+        self.pool = None
+        self.nodes = 0
+        self.searches = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def search(self, position, max_depth=MAX_DEPTH, time_limit=None, on_iteration=None):
+        """Searches the position like Searcher.search(), spreading the root moves over the workers.
+
+        :return (best move, score) for the side to move; best move is None if there are no legal moves"""
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers, _start_worker, (self.tt_megabytes,))
+        self.nodes = 0
+        self.searches += 1
+        deadline = None if time_limit is None else time.time() + time_limit
+
+        moves = legal_moves(position)
+        if not moves:
+            return None, -MATE if position.in_check() else 0
+        best_move, best_score = moves[0], -INFINITY
+        for depth in range(1, max(1, min(max_depth, MAX_DEPTH)) + 1):
+            try:
+                score, move = self.search_iteration(position, moves, depth, deadline)
+            except SearchTimeout:
+                break  # the unfinished iteration is thrown away, the previous one still stands
+            best_move, best_score = move, score
+            if on_iteration is not None:
+                on_iteration(depth, best_score, best_move, self.nodes)
+            if abs(best_score) >= MATE - MAX_DEPTH:
+                break
+        return best_move, best_score
+
+    def search_iteration(self, position, moves, depth, deadline):
+        """Searches every root move to depth and reorders moves best first for the next iteration
+
+        :return (score, best move)"""
+        def run(tasks):
+            results = []
+            for move, score, nodes in self.pool.imap_unordered(_search_root_move, tasks):
+                self.nodes += nodes
+                if score is None:
+                    raise SearchTimeout()
+                results.append((move, score))
+            return results
+
+        search_id = self.searches
+        best_move, alpha = run([(search_id, position, moves[0], depth, -INFINITY, INFINITY, deadline)])[0]
+        # the other moves only need to show they are no better than alpha
+        tasks = [(search_id, position, move, depth, alpha, alpha + 1, deadline) for move in moves[1:]]
+        better = [move for move, score in run(tasks) if score > alpha]
+        if better:  # those that might be better are searched with an open window, best result wins
+            for move, score in run([(search_id, position, move, depth, alpha, INFINITY, deadline) for move in better]):
+                if score > alpha:
+                    best_move, alpha = move, score
+        moves.remove(best_move)
+        moves.insert(0, best_move)
+        return alpha, best_move
+
+
+def benchmark(worker_counts, depth, out=sys.stdout):
+    """Searches every position in BENCH_POSITIONS to a fixed depth with each worker count.
+
+    :return dict of worker count -> seconds taken for the whole set"""
+    timings = {}
+    for workers in worker_counts:
+        with ParallelSearcher(workers) as searcher:
+            searcher.search(Position(), 1)  # starts the pool outside the timing
+            start = time.perf_counter()
+            nodes = 0
+            for fen in BENCH_POSITIONS:
+                move, score = searcher.search(Position(fen), depth)
+                nodes += searcher.nodes
+            elapsed = time.perf_counter() - start
+        timings[workers] = elapsed
+        out.write("%2d workers  %8.2fs  %10d nodes  %8.0f nodes/sec  speedup %.2fx\n" % (
+            workers, elapsed, nodes, nodes / elapsed, timings[worker_counts[0]] / elapsed))
+        out.flush()
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.parallel",
+                                     description="Measures how the root-splitting search scales with workers.")
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts to compare")
+    parser.add_argument("--depth", type=int, default=4, help="depth to search every benchmark position to")
+    parser.add_argument("--fen", help="search this position once instead of running the benchmark")
+    parser.add_argument("--time", type=float, help="with --fen, seconds to search for")
+    args = parser.parse_args(argv)
+
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    if args.fen is None:
+        benchmark(worker_counts, args.depth)
+        return 0
+
+    with ParallelSearcher(worker_counts[-1]) as searcher:
+        start = time.perf_counter()
+        def report(depth, score, move, nodes):
+            print("depth %d score %d move %s nodes %d" % (depth, score, move_name(move), nodes))
+
+        move, score = searcher.search(Position(args.fen), args.depth, args.time, report)
+        elapsed = time.perf_counter() - start
+    print("bestmove %s (%.2fs, %d nodes)" % (move_name(move) if move is not None else "none", elapsed, searcher.nodes))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# Perft: counts the leaf nodes of the legal move tree to a fixed depth.
+# The counts for the positions in SUITE are well known, so a wrong number means a bug in the rules,
+# and the nodes per second show whether the move generator got slower.
+#
+# Usage:
+#     python -m anarchist_chess.perft                      run the suite up to 1,000,000 nodes per position
+#     python -m anarchist_chess.perft --depth 5            run the suite to depth 5
+#     python -m anarchist_chess.perft --fen "<FEN>" --depth 3 --divide
+
+import argparse
+import sys
+import time
+
+from .movegen import legal_moves
+from .position import Position, START_FEN, move_name
+from .rules import Rules, STANDARD
+
+# (name, FEN, node counts for depth 1, 2, 3, ...) under the regular rules, i.e. without b1 castling
+SUITE = [
+    ("start", START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("talkchess", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def perft(position, depth):
+    """Counts the positions reached after exactly depth moves from position.
+
+    The last ply is counted from the length of the move list rather than played out."""
+    moves = legal_moves(position)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    """:return dict of move name -> perft count below that move, for finding which move a wrong count comes from"""
+    counts = {}
+    for move in legal_moves(position):
+        position.make_move(move)
+        counts[move_name(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return counts
+
+
+def run_suite(max_depth=None, max_nodes=1000000, out=sys.stdout):
+    """Runs perft on every position in SUITE and compares with the known counts.
+
+    :param max_depth: deepest depth to run, or None to go as deep as max_nodes allows
+    :param max_nodes: when max_depth is None, skip depths whose known count is larger than this
+    :return Boolean value for whether every count matched"""
+    all_passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in SUITE:
+        for depth, count in enumerate(expected, start=1):
+            if max_depth is not None and depth > max_depth or max_depth is None and count > max_nodes:
+                break
+            position = Position(fen, rules=STANDARD)
+            start = time.perf_counter()
+            nodes = perft(position, depth)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            passed = nodes == count
+            all_passed = all_passed and passed
+            out.write("%-11s depth %d  %12d nodes  %8.3fs  %10.0f nodes/sec  %s\n" % (
+                name, depth, nodes, elapsed, nodes / elapsed if elapsed else 0.0,
+                "ok" if passed else "FAIL, expected %d" % count))
+            out.flush()
+    out.write("total %d nodes in %.3fs, %.0f nodes/sec\n" % (
+        total_nodes, total_time, total_nodes / total_time if total_time else 0.0))
+    return all_passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.perft",
+                                     description="Counts the legal move tree to a depth.")
+    parser.add_argument("--fen", help="count this position instead of running the suite")
+    parser.add_argument("--depth", type=int, help="depth to count to (the suite goes up to it)")
+    parser.add_argument("--max-nodes", type=int, default=1000000,
+                        help="without --depth, skip suite depths with more nodes than this")
+    parser.add_argument("--divide", action="store_true", help="print the count below each first move")
+    parser.add_argument("--rules", type=Rules.parse, default=STANDARD,
+                        help="kinks to count with, ex: b1,forced-ep,horsey-leg (only with --fen; the suite counts "
+                             "assume regular rules)")
+    args = parser.parse_args(argv)
+
+    if args.fen is None:
+        return 0 if run_suite(args.depth, args.max_nodes) else 1
+
+    position = Position(args.fen, rules=args.rules)
+    depth = args.depth or 1
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(position, depth)
+        for name in sorted(counts):
+            print("%s: %d" % (name, counts[name]))
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(position, depth)
+    elapsed = time.perf_counter() - start
+    print("depth %d: %d nodes in %.3fs, %.0f nodes/sec" % (depth, nodes, elapsed, nodes / elapsed if elapsed else 0.0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
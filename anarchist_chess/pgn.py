@@ -0,0 +1,333 @@
+# Games in Portable Game Notation, and moves in Standard Algebraic Notation (SAN).
+# Databases can be many gigabytes, so read_games() walks a memory-mapped file and hands out one game at a time;
+# only the game being looked at is ever decoded.
+# Castling with b1 (b8) has no SAN of its own: it is written as the King's move, "Kb1".
+#
+# Usage:
+#     python -m anarchist_chess.pgn games.pgn                      count the games and how fast they are read
+#     python -m anarchist_chess.pgn games.pgn --check              also replay every game and list those that
+#                                                                  break the rules
+#     python -m anarchist_chess.pgn games.pgn --check --rules standard
+
+import argparse
+import mmap
+import os
+import re
+import sys
+import time
+
+from .attacks import squares_of
+from .movegen import legal_moves
+from .position import (WHITE, EMPTY, PAWN, QUEEN, KING, FILES, PIECE_LETTERS, START_FEN,
+                       Position, make_piece, parse_square, square_name, encode_move)
+from .rules import Rules, ANARCHIST
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")  # the tags every game has, in order
+LINE_LENGTH = 79
+
+SAN = re.compile(r"([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQnbrq]))?")
+TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# comments, variations, move numbers and annotations are recognised so they can be skipped
+TOKEN = re.compile(r"\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};$]+")
+TAG_LINE = re.compile(rb"(?m)^[ \t]*\[")
+
+
+class IllegalMoveError(ValueError):
+    """Raised when a game's move is not allowed in its position"""
+
+    def __init__(self, ply, san, reason):
+        """:param ply: how many moves of the game were played before this one
+        :param san: the move as written in the game"""
+        ValueError.__init__(self, "move %d%s %s: %s" % (ply // 2 + 1, "." if ply % 2 == 0 else "...", san, reason))
+        self.ply = ply
+        self.san = san
+
+
+class Game:
+
+    def __init__(self, headers=None, moves=None, result="*"):
+        """:param headers: dict of tag name -> value, ex: {\"White\": \"Jerry\"}
+        :param moves: list of moves in SAN, starting from the FEN tag or the regular starting position
+        :param result: one of RESULTS"""
+        self.headers = dict(headers or {})
+        self.moves = list(moves or [])
+        self.result = result
+
+    def start_fen(self):
+        return self.headers.get("FEN", START_FEN)
+
+    def rules(self, default=ANARCHIST):
+        """:return the Rules named by the game's Rules tag, or default if it has none"""
+        if "Rules" in self.headers:
+            return Rules.parse(self.headers["Rules"])
+        return default
+
+    def replay(self, rules=None):
+        """Plays the game through, checking each move against the rules.
+
+        :param rules: the Rules to check with, by default those of the game's Rules tag
+        :return the Position after the last move, with every move in its history"""
+        position = Position(self.start_fen(), rules or self.rules())
+        for ply, text in enumerate(self.moves):
+            try:
+                move = parse_san(position, text)
+            except ValueError as error:
+                raise IllegalMoveError(ply, text, error)
+            position.make_move(move)
+        return position
+
+    def pgn(self):
+        """:return the game in PGN, ending with a blank line so games can be written one after another"""
+        headers = dict(self.headers)
+        headers["Result"] = self.result
+        lines = ['[%s "%s"]' % (name, headers.pop(name, "?").replace("\\", "\\\\").replace('"', '\\"'))
+                 for name in SEVEN_TAG_ROSTER]
+        lines.extend('[%s "%s"]' % (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+                     for name, value in headers.items())
+        lines.append("")
+
+        fields = self.start_fen().split()
+        black_first = fields[1] == "b"
+        number = int(fields[5]) if len(fields) > 5 else 1
+        tokens = []
+        for ply, text in enumerate(self.moves):
+            if (ply + black_first) % 2 == 0:
+                tokens.append("%d." % number)
+            elif ply == 0:
+                tokens.append("%d..." % number)
+            if (ply + black_first) % 2 == 1:
+                number += 1
+            tokens.append(text)
+        tokens.append(self.result)
+
+        line = ""
+        for token in tokens:
+            if line and len(line) + 1 + len(token) > LINE_LENGTH:
+                lines.append(line)
+                line = token
+            else:
+                line = line + " " + token if line else token
+        lines.append(line)
+        return "\n".join(lines) + "\n\n"
+
+    @staticmethod
+    def from_position(position, headers=None, result="*"):
+        """Makes the game that was played to reach the position, from the moves in its history
+
+        :param headers: extra tags, ex: {\"White\": \"Jerry\"}"""
+        start = position.copy()
+        while start.history:
+            start.unmake_move()
+        game = Game({"Event": "Anarchist Chess game", "Site": "?", "Date": time.strftime("%Y.%m.%d"),
+                     "Round": "-", "White": "?", "Black": "?"}, result=result)
+        if start.fen() != START_FEN:
+            game.headers["SetUp"] = "1"
+            game.headers["FEN"] = start.fen()
+        game.headers["Rules"] = position.rules.name()
+        game.headers.update(headers or {})
+        for record in position.history:
+            game.moves.append(san(start, record[0]))
+            start.make_move(record[0])
+        return game
+
+
+def san(position, move):
+    """:return the move in Standard Algebraic Notation, ex: \"Nbd7\", \"exd6\", \"e8=Q+\" or \"O-O\"
+
+    :param position: the position before the move, which must be legal there"""
+    sq1, sq2, promotion = move & 63, move >> 6 & 63, move >> 12
+    piece = position.board[sq1]
+    kind = piece & 7
+    rooks = position.castle_rook_squares(sq1, sq2) if kind == KING else None
+    if rooks is not None and sq2 & 7 in (2, 6):
+        text = "O-O" if sq2 & 7 == 6 else "O-O-O"
+    elif kind == PAWN:
+        text = square_name(sq2)
+        if sq1 & 7 != sq2 & 7:
+            text = FILES[sq1 & 7] + "x" + text
+        if promotion:
+            text += "=" + PIECE_LETTERS[promotion].upper()
+    else:
+        # other pieces of the same kind that could go to the same square make the origin part of the name
+        rivals = [square for square in squares_of(position.pieces[piece] & ~(1 << sq1))
+                  if position.is_legal(square, sq2)]
+        origin = ""
+        if rivals:
+            if all(square & 7 != sq1 & 7 for square in rivals):
+                origin = FILES[sq1 & 7]
+            elif all(square >> 3 != sq1 >> 3 for square in rivals):
+                origin = str((sq1 >> 3) + 1)
+            else:
+                origin = square_name(sq1)
+        text = PIECE_LETTERS[kind].upper() + origin + ("x" if position.board[sq2] != EMPTY else "") + square_name(sq2)
+
+    position.make_move(move)
+    if position.in_check():
+        text += "#" if not legal_moves(position) else "+"
+    position.unmake_move()
+    return text
+
+
+def parse_san(position, text):
+    """Finds the legal move written in Standard Algebraic Notation
+
+    :raise ValueError if it isn't SAN, is ambiguous, or is not allowed in the position
+    :return the encoded move"""
+    token = text.rstrip("+#!?")
+    side = position.side
+    if token in ("O-O", "O-O-O", "0-0", "0-0-0"):
+        king = position.kings[side]
+        to = (0 if side == WHITE else 56) + (6 if len(token) == 3 else 2)
+        if king is None or position.castle_rook_squares(king, to) is None or not position.is_legal(king, to):
+            raise ValueError("castling is not allowed")
+        return encode_move(king, to)
+
+    match = SAN.fullmatch(token)
+    if match is None:
+        raise ValueError("not a move in standard algebraic notation")
+    letter, file, rank, capture, to_name, promotion = match.groups()
+    kind = PIECE_LETTERS.find(letter.lower()) if letter else PAWN
+    to = parse_square(to_name)
+    if kind == PAWN:  # a pawn push names no origin; a capture names the file it comes from, and takes something
+        if capture is None:
+            if file not in (None, to_name[0]):
+                raise ValueError("a pawn that doesn't capture stays on its file")
+            file = to_name[0]
+        elif file is None or file == to_name[0] or position.board[to] == EMPTY and to != position.ep_square:
+            raise ValueError("not a pawn capture")
+    origins = [square for square in squares_of(position.pieces[make_piece(side, kind)])
+               if (file is None or FILES[square & 7] == file) and (rank is None or str((square >> 3) + 1) == rank)
+               and position.is_legal(square, to)]
+    if not origins:
+        raise ValueError("no %s can legally go to %s" % (("pawn", "knight", "bishop", "rook", "queen", "king")[kind - 1],
+                                                          to_name))
+    if len(origins) > 1:
+        raise ValueError("ambiguous, it could come from " + " or ".join(square_name(square) for square in origins))
+
+    sq1 = origins[0]
+    if not position.is_promotion(sq1, to):
+        return encode_move(sq1, to)
+    if promotion is None:
+        return encode_move(sq1, to, QUEEN)  # some programs leave the piece out; a queen is what they mean
+    return encode_move(sq1, to, PIECE_LETTERS.find(promotion.lower()))
+
+
+def parse_game(text):
+    """Reads one game of PGN text: its tags, its main line of moves (comments and variations are dropped) and
+    its result
+
+    :return a Game"""
+    headers = {}
+    movetext = []
+    for line in text.splitlines():
+        if line.lstrip().startswith("[") and not movetext:
+            for name, value in TAG.findall(line):
+                headers[name] = value.replace('\\"', '"').replace("\\\\", "\\")
+        elif not line.startswith("%"):  # lines starting with % are escaped and ignored
+            movetext.append(line)
+
+    moves = []
+    result = headers.get("Result", "*")
+    depth = 0  # variations nest in parentheses
+    for token in TOKEN.findall("\n".join(movetext)):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth = max(0, depth - 1)
+        elif depth or token[0] in "{;$" or token[0].isdigit() and token.endswith("."):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return Game(headers, moves, result if result in RESULTS else "*")
+
+
+def game_texts(path):
+    """Yields the PGN text of each game in the file as bytes, one game at a time.
+
+    The file is memory-mapped rather than read, so even a database bigger than memory costs only the game
+    in hand. A game starts at a tag line that follows the moves of the game before it."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = tags_end = 3 if data[:3] == b"\xef\xbb\xbf" else 0  # skips a UTF-8 byte order mark
+            for match in TAG_LINE.finditer(data, start):
+                line = match.start()
+                if data[tags_end:line].strip():  # moves since the last tag line, so this tag begins a new game
+                    yield data[start:line]
+                    start = line
+                end = data.find(b"\n", line)
+                tags_end = len(data) if end < 0 else end + 1
+            if data[start:].strip():
+                yield data[start:]
+
+
+def read_games(path, encoding="utf-8"):
+    """Yields each game of a PGN file as a Game, see game_texts()"""
+    for text in game_texts(path):
+        yield parse_game(text.decode(encoding, "replace"))
+
+
+def read_fen(path):
+    """:return the first FEN in a file that holds one position per line"""
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                return line.strip()
+    raise ValueError("no position in " + path)
+
+
+def check_games(path, rules=None, out=sys.stdout, limit=None):
+    """Replays every game in a PGN file and reports those that break the rules.
+
+    :param rules: Rules to check every game with; by default each game's Rules tag, or the Anarchist rules
+    :param limit: stop after this many games
+    :return (games read, games that broke the rules)"""
+    games = broken = 0
+    start = time.perf_counter()
+    for game in read_games(path):
+        if limit is not None and games >= limit:
+            break
+        games += 1
+        try:
+            game.replay(rules)
+        except ValueError as error:  # an illegal move, or a FEN tag that can't be read
+            broken += 1
+            out.write("game %d (%s - %s): %s\n" % (games, game.headers.get("White", "?"),
+                                                   game.headers.get("Black", "?"), error))
+    elapsed = time.perf_counter() - start
+    out.write("%d games, %d broke the rules, %.1fs, %.0f games/sec\n" % (
+        games, broken, elapsed, games / elapsed if elapsed else 0.0))
+    out.flush()
+    return games, broken
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.pgn",
+                                     description="Reads PGN files, optionally checking every game against the rules.")
+    parser.add_argument("path", help="PGN file to read")
+    parser.add_argument("--check", action="store_true", help="replay every game and list those that break the rules")
+    parser.add_argument("--rules", type=Rules.parse,
+                        help="kinks to check with, ex: b1,forced-ep (default: each game's Rules tag, else b1)")
+    parser.add_argument("--limit", type=int, help="stop after this many games")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 1 if check_games(args.path, args.rules, limit=args.limit)[1] else 0
+    games = moves = 0
+    start = time.perf_counter()
+    for game in read_games(args.path):
+        if args.limit is not None and games >= args.limit:
+            break
+        games += 1
+        moves += len(game.moves)
+    elapsed = time.perf_counter() - start
+    print("%d games, %d moves, %.1fs, %.0f games/sec" % (games, moves, elapsed, games / elapsed if elapsed else 0.0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# Material and piece-square tables, with a middlegame and an endgame value for every piece on every square.
+# Position adds these up as pieces are put down and picked up, the way it keeps its Zobrist key, so the evaluation
+# never has to walk the board. Like anarchist_chess.zobrist this module indexes by piece code
+# (kind | color << 3, see anarchist_chess.position) and imports nothing, so Position can use it.
+# The three running totals (middlegame score, endgame score, game phase) are packed into one int, so that putting a
+# piece down is a single addition; unpack() takes them apart again.
+
+PIECE_VALUES = [0, 100, 320, 330, 500, 900, 0]  # middlegame values, indexed by kind
+ENDGAME_VALUES = [0, 120, 300, 320, 530, 950, 0]  # pawns grow in worth as the board empties, knights shrink
+PHASE_WEIGHTS = [0, 0, 1, 1, 2, 4, 0]  # how much each kind counts towards the middlegame
+FULL_PHASE = 24  # the phase of the starting position: all of the pieces on the board
+
+# piece-square tables as seen by white, written with the 8th rank on top like a diagram; indexed by kind
+_MIDDLEGAME = [
+    None,
+    # pawn
+    [0, 0, 0, 0, 0, 0, 0, 0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+     5, 5, 10, 25, 25, 10, 5, 5,
+     0, 0, 0, 20, 20, 0, 0, 0,
+     5, -5, -10, 0, 0, -10, -5, 5,
+     5, 10, 10, -20, -20, 10, 10, 5,
+     0, 0, 0, 0, 0, 0, 0, 0],
+    # knight
+    [-50, -40, -30, -30, -30, -30, -40, -50,
+     -40, -20, 0, 0, 0, 0, -20, -40,
+     -30, 0, 10, 15, 15, 10, 0, -30,
+     -30, 5, 15, 20, 20, 15, 5, -30,
+     -30, 0, 15, 20, 20, 15, 0, -30,
+     -30, 5, 10, 15, 15, 10, 5, -30,
+     -40, -20, 0, 5, 5, 0, -20, -40,
+     -50, -40, -30, -30, -30, -30, -40, -50],
+    # bishop
+    [-20, -10, -10, -10, -10, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 10, 10, 5, 0, -10,
+     -10, 5, 5, 10, 10, 5, 5, -10,
+     -10, 0, 10, 10, 10, 10, 0, -10,
+     -10, 10, 10, 10, 10, 10, 10, -10,
+     -10, 5, 0, 0, 0, 0, 5, -10,
+     -20, -10, -10, -10, -10, -10, -10, -20],
+    # rook
+    [0, 0, 0, 0, 0, 0, 0, 0,
+     5, 10, 10, 10, 10, 10, 10, 5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     0, 0, 0, 5, 5, 0, 0, 0],
+    # queen
+    [-20, -10, -10, -5, -5, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 5, 5, 5, 0, -10,
+     -5, 0, 5, 5, 5, 5, 0, -5,
+     0, 0, 5, 5, 5, 5, 0, -5,
+     -10, 5, 5, 5, 5, 5, 0, -10,
+     -10, 0, 5, 0, 0, 0, 0, -10,
+     -20, -10, -10, -5, -5, -10, -10, -20],
+    # king: tucked away behind its pawns
+    [-30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -20, -30, -30, -40, -40, -30, -30, -20,
+     -10, -20, -20, -20, -20, -20, -20, -10,
+     20, 20, 0, 0, 0, 0, 20, 20,
+     20, 30, 10, 0, 0, 10, 30, 20],
+]
+
+# in the endgame pawns race to promote and the King comes out to the middle; the other pieces play as before
+_ENDGAME = list(_MIDDLEGAME)
+_ENDGAME[1] = [0, 0, 0, 0, 0, 0, 0, 0,
+               80, 80, 80, 80, 80, 80, 80, 80,
+               50, 50, 50, 50, 50, 50, 50, 50,
+               30, 30, 30, 30, 30, 30, 30, 30,
+               15, 15, 15, 15, 15, 15, 15, 15,
+               5, 5, 5, 5, 5, 5, 5, 5,
+               0, 0, 0, 0, 0, 0, 0, 0,
+               0, 0, 0, 0, 0, 0, 0, 0]
+_ENDGAME[6] = [-50, -40, -30, -20, -20, -30, -40, -50,
+               -30, -20, -10, 0, 0, -10, -20, -30,
+               -30, -10, 20, 30, 30, 20, -10, -30,
+               -30, -10, 30, 40, 40, 30, -10, -30,
+               -30, -10, 30, 40, 40, 30, -10, -30,
+               -30, -10, 20, 30, 30, 20, -10, -30,
+               -30, -30, 0, 0, 0, 0, -30, -30,
+               -50, -30, -30, -30, -30, -30, -30, -50]
+
+
+def pack(middlegame, endgame, phase=0):
+    """:return the three values as one int; packed values can be added and subtracted as they are"""
+    return middlegame + (endgame << 16) + (phase << 32)
+
+
+def unpack(packed):
+    """:return (middlegame, endgame, phase) of a packed value, see pack()"""
+    middlegame = ((packed + 0x8000) & 0xFFFF) - 0x8000
+    packed = (packed - middlegame) >> 16
+    endgame = ((packed + 0x8000) & 0xFFFF) - 0x8000
+    return middlegame, endgame, (packed - endgame) >> 16
+
+
+# PIECE_SQUARE[piece code][square]: packed material plus table bonus, positive for white pieces and negative for black;
+# the phase is counted up for both colors
+PIECE_SQUARE = [[0] * 64 for _ in range(16)]
+for _kind in range(1, 7):
+    for _square in range(64):
+        _file, _rank = _square & 7, _square >> 3
+        _white, _black = (7 - _rank) * 8 + _file, _rank * 8 + _file  # where the square is on the diagrams
+        PIECE_SQUARE[_kind][_square] = pack(PIECE_VALUES[_kind] + _MIDDLEGAME[_kind][_white],
+                                            ENDGAME_VALUES[_kind] + _ENDGAME[_kind][_white], PHASE_WEIGHTS[_kind])
+        PIECE_SQUARE[_kind | 8][_square] = pack(-PIECE_VALUES[_kind] - _MIDDLEGAME[_kind][_black],
+                                                -ENDGAME_VALUES[_kind] - _ENDGAME[_kind][_black], PHASE_WEIGHTS[_kind])
+del _kind, _square, _file, _rank, _white, _black
@@ -0,0 +1,661 @@
+# Headless model of a game of Anarchist Chess.
+# The Tk Board in Chess.py used to learn what was on a square by asking each button for its image
+# ("pyimage5" and friends). The Position below owns that state instead, so the rules can run without a display.
+
+import string  # for a string to store alphabet
+
+from .attacks import (KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, BETWEEN, LINE, ALIGNMENT, ORTHOGONAL, DIAGONAL,
+                      rook_attacks, bishop_attacks, knight_leg_attacks, squares_of, lowest_square)
+from .piece_square import PIECE_SQUARE
+from .rules import ANARCHIST
+from .zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_KEYS
+
+# colors
+WHITE = 0
+BLACK = 1
+
+# piece kinds; a piece code is kind | (color << 3), so white pieces are 1-6 and black pieces are 9-14
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+
+# castling rights are stored as bits in a single integer
+WHITE_SHORT = 1
+WHITE_LONG = 2
+BLACK_SHORT = 4
+BLACK_LONG = 8
+
+FILES = string.ascii_lowercase[0:8]  # a to h
+PIECE_LETTERS = " pnbrqk"  # indexed by kind
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def make_piece(color, kind):
+    return kind | (color << 3)
+
+
+def piece_kind(piece):
+    return piece & 7
+
+
+def piece_color(piece):
+    return piece >> 3
+
+
+def parse_square(name):
+    """Converts a square name into its index, a1 = 0, b1 = 1, ..., h8 = 63
+
+    :param name: the square as a string, ex: \"e2\"
+    :raises ValueError: if name isn't a square"""
+    if len(name) != 2 or name[0] not in FILES or name[1] not in "12345678":
+        raise ValueError("not a square: " + name)
+    return FILES.index(name[0]) + 8 * (int(name[1]) - 1)
+
+
+def square_name(square):
+    """Converts a square index back into its name, ex: 12 -> \"e2\""""
+    return FILES[square & 7] + str((square >> 3) + 1)
+
+
+def encode_move(sq1, sq2, promotion=EMPTY):
+    """Packs a move into an int: from square in bits 0-5, to square in bits 6-11, promotion kind above that"""
+    return sq1 | sq2 << 6 | promotion << 12
+
+
+def move_name(move):
+    """:return the move in coordinate notation, ex: \"e2e4\" or \"e7e8q\""""
+    name = square_name(move & 63) + square_name(move >> 6 & 63)
+    return name + PIECE_LETTERS[move >> 12] if move >> 12 else name
+
+
+def parse_move(name):
+    """Converts coordinate notation such as \"e7e8q\" into an encoded move"""
+    promotion = EMPTY
+    if len(name) == 5:
+        promotion = PIECE_LETTERS.find(name[4].lower())
+        if not KNIGHT <= promotion <= QUEEN:
+            raise ValueError("bad promotion piece in move: " + name)
+    elif len(name) != 4:
+        raise ValueError("moves look like e2e4 or e7e8q, not " + name)
+    return encode_move(parse_square(name[0:2]), parse_square(name[2:4]), promotion)
+
+
+class Position:
+
+    def __init__(self, fen=START_FEN, rules=ANARCHIST):
+        """Creates a position from a FEN string.
+
+        :param fen: the position to start from, defaults to the regular starting position
+        :param rules: the kinks the game is played with, see anarchist_chess.rules"""
+        self.rules = rules
+        self.board = [EMPTY] * 64  # piece code on each square, a1 first
+        self.pieces = [0] * 16  # bitboard of the squares holding each piece code
+        self.occupancy = [0, 0]  # bitboard of the squares holding each color's pieces
+        self.occupied = 0  # bitboard of every occupied square
+        self.kings = [None, None]  # square of each color's king, kept up to date as pieces move
+        self.check_cache = None  # (checkers, pinned, attacked) for the side to move, see check_info()
+        self.side = WHITE  # side to move
+        self.castling = 0  # castling rights bits
+        self.ep_square = None  # square a pawn may capture onto en passant
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.history = []  # undo records of the moves made, see make_move()
+        self.redo_moves = []  # moves taken back with undo(), the next one to redo last
+        self.key = 0  # Zobrist key of the position, see anarchist_chess.zobrist
+        self.score = 0  # packed sum of the pieces' PIECE_SQUARE values, see anarchist_chess.piece_square
+        self.set_fen(fen)
+
+    def set_fen(self, fen):
+        """Loads a position from Forsyth-Edwards Notation.
+
+        :param fen: a string such as the one stored in START_FEN"""
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: " + fen)
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("FEN needs 8 ranks: " + fen)
+
+        self.board = [EMPTY] * 64
+        self.pieces = [0] * 16
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.kings = [None, None]
+        self.check_cache = None
+        self.key = 0
+        self.score = 0
+        for row_index, row in enumerate(rows):
+            rank = 7 - row_index  # FEN lists the 8th rank first
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                    continue
+                kind = PIECE_LETTERS.find(char.lower())
+                if kind < 1 or file > 7:
+                    raise ValueError("bad piece placement in FEN: " + fen)
+                color = WHITE if char.isupper() else BLACK
+                self.put_piece(rank * 8 + file, make_piece(color, kind))
+                file += 1
+            if file != 8:
+                raise ValueError("bad piece placement in FEN: " + fen)
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError("bad side to move in FEN: " + fen)
+        self.side = WHITE if fields[1] == "w" else BLACK
+
+        self.castling = 0
+        for char in fields[2]:
+            self.castling |= {"K": WHITE_SHORT, "Q": WHITE_LONG, "k": BLACK_SHORT, "q": BLACK_LONG}.get(char, 0)
+
+        self.ep_square = None if fields[3] == "-" else parse_square(fields[3])
+        if self.ep_square is not None and not self.ep_capturable(self.ep_square):
+            self.ep_square = None  # kept only when it matters, so equal positions get equal keys
+        self.history = []
+        self.redo_moves = []
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        self.key ^= CASTLING_KEYS[self.castling] ^ (SIDE_KEY if self.side else 0)
+        if self.ep_square is not None:
+            self.key ^= EP_KEYS[self.ep_square & 7]
+
+    def fen(self):
+        """:return the position in Forsyth-Edwards Notation"""
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ""
+            blanks = 0
+            for file in range(8):
+                piece = self.board[rank * 8 + file]
+                if piece == EMPTY:
+                    blanks += 1
+                    continue
+                if blanks:
+                    row += str(blanks)
+                    blanks = 0
+                letter = PIECE_LETTERS[piece_kind(piece)]
+                row += letter.upper() if piece_color(piece) == WHITE else letter
+            if blanks:
+                row += str(blanks)
+            rows.append(row)
+
+        castling = ""
+        for bit, char in ((WHITE_SHORT, "K"), (WHITE_LONG, "Q"), (BLACK_SHORT, "k"), (BLACK_LONG, "q")):
+            if self.castling & bit:
+                castling += char
+        ep = "-" if self.ep_square is None else square_name(self.ep_square)
+        return " ".join(("/".join(rows), "wb"[self.side], castling or "-", ep,
+                         str(self.halfmove_clock), str(self.fullmove_number)))
+
+    def copy(self):
+        """:return an independent Position with the same state"""
+        other = Position.__new__(Position)
+        other.rules = self.rules
+        other.board = self.board[:]
+        other.pieces = self.pieces[:]
+        other.occupancy = self.occupancy[:]
+        other.occupied = self.occupied
+        other.kings = self.kings[:]
+        other.check_cache = self.check_cache
+        other.side = self.side
+        other.castling = self.castling
+        other.ep_square = self.ep_square
+        other.halfmove_clock = self.halfmove_clock
+        other.fullmove_number = self.fullmove_number
+        other.history = self.history[:]
+        other.redo_moves = self.redo_moves[:]
+        other.key = self.key
+        other.score = self.score
+        return other
+
+    def piece_at(self, square):
+        return self.board[square]
+
+    def color_at(self, square):
+        """:return WHITE or BLACK for the piece on the square, or None if it is empty"""
+        piece = self.board[square]
+        return None if piece == EMPTY else piece >> 3
+
+    def put_piece(self, square, piece):
+        """Places a piece on an empty square, keeping the bitboards in step with the board"""
+        bit = 1 << square
+        self.board[square] = piece
+        self.pieces[piece] |= bit
+        self.occupancy[piece >> 3] |= bit
+        self.occupied |= bit
+        self.key ^= PIECE_KEYS[piece][square]
+        self.score += PIECE_SQUARE[piece][square]
+        if piece & 7 == KING:
+            self.kings[piece >> 3] = square
+
+    def remove_piece(self, square):
+        """Empties a square, keeping the bitboards in step with the board
+
+        :return the piece code that was on the square"""
+        piece = self.board[square]
+        if piece != EMPTY:
+            bit = 1 << square
+            self.board[square] = EMPTY
+            self.pieces[piece] ^= bit
+            self.occupancy[piece >> 3] ^= bit
+            self.occupied ^= bit
+            self.key ^= PIECE_KEYS[piece][square]
+            self.score -= PIECE_SQUARE[piece][square]
+        return piece
+
+    def find_king(self, color):
+        """Finds the square the king of the given color is on.
+
+        :return King square as an index, or None if there is no such king"""
+        return self.kings[color]
+
+    def friendly_fire(self, sq1, sq2):
+        """Prevents capturing your own pieces.
+
+        :return Boolean value determining whether 'friendly fire' has occurred, i.e. white tries to capture white"""
+        target = self.board[sq2]
+        return target != EMPTY and piece_color(target) == piece_color(self.board[sq1])
+
+    def clear_path(self, sq1, sq2):
+        """Ensures that there are no occupied squares between sq1 and sq2.
+
+        The squares must share a file, rank or diagonal; sq1 and sq2 themselves are not checked."""
+        return not BETWEEN[sq1][sq2] & self.occupied
+
+    def allowed_piece_move(self, sq1, sq2):
+        """Checks whether the piece on sq1 can go to sq2 based on its movement capabilities.
+
+        Whether the move leaves the mover's own king in check is not considered here, see is_legal().
+
+        :return Boolean value for whether the move is allowed."""
+        piece = self.board[sq1]
+        if piece == EMPTY or sq1 == sq2 or self.friendly_fire(sq1, sq2):
+            return False
+        kind = piece_kind(piece)
+        color = piece_color(piece)
+
+        # pawns move forwards one square, two from their starting rank, and capture diagonally (or en passant)
+        if kind == PAWN:
+            forward = 8 if color == WHITE else -8
+            if sq2 == sq1 + forward:
+                return self.board[sq2] == EMPTY
+            if sq2 == sq1 + 2 * forward:
+                start_rank = 1 if color == WHITE else 6
+                return sq1 >> 3 == start_rank and not (1 << sq2 | 1 << (sq1 + forward)) & self.occupied
+            if PAWN_ATTACKS[color][sq1] >> sq2 & 1:
+                return self.board[sq2] != EMPTY or sq2 == self.ep_square
+            return False
+
+        # knight's move: if x changes by 1, then y changes by 2. Else if x changes by 2, then y changes by 1
+        if kind == KNIGHT:
+            return bool(self.knight_attacks(sq1, self.occupied) >> sq2 & 1)
+
+        # King's move: it may be a 1 square adjacent move OR a castle
+        if kind == KING:
+            return bool(KING_ATTACKS[sq1] >> sq2 & 1) or self.castle(sq1, sq2)
+
+        # bishops, rooks and queens need a clear line to the destination
+        alignment = ALIGNMENT[sq1][sq2]
+        if kind == ROOK and alignment != ORTHOGONAL or kind == BISHOP and alignment != DIAGONAL or \
+                alignment == 0:
+            return False
+        return self.clear_path(sq1, sq2)
+
+    def castle_rook_squares(self, sq1, sq2):
+        """:return (rook origin, rook destination) if moving a king from sq1 to sq2 is a castling attempt, else None"""
+        if sq1 == 4 and self.board[sq1] == make_piece(WHITE, KING):
+            return self.rules.castle_rooks[WHITE].get(sq2)
+        if sq1 == 60 and self.board[sq1] == make_piece(BLACK, KING):
+            return self.rules.castle_rooks[BLACK].get(sq2)
+        return None
+
+    def castle(self, sq1, sq2):
+        """Checks to see if castle is allowed, i.e. king hasn't moved, rook in question hasn't moved,
+        the squares between them are empty and the king is not castling out of or through check.
+        Whether the king lands in check is left to is_legal(), as for every other move; which squares it may not
+        leave or pass when attacked are compiled into the rules (see Rules.castle_passed).
+
+        :return Boolean value representing whether the king on sq1 may castle by moving to sq2."""
+        rooks = self.castle_rook_squares(sq1, sq2)
+        if rooks is None:
+            return False
+        color = piece_color(self.board[sq1])
+        rook_square = rooks[0]
+        if rook_square > sq1:
+            right = WHITE_SHORT if color == WHITE else BLACK_SHORT
+        else:
+            right = WHITE_LONG if color == WHITE else BLACK_LONG
+        if not self.castling & right or self.board[rook_square] != make_piece(color, ROOK):
+            return False
+        if not self.clear_path(sq1, rook_square):
+            return False
+
+        # the king may not leave, or pass through, an attacked square
+        passed = self.rules.castle_passed[sq2]
+        if color == self.side:
+            return not self.check_info()[2] & passed
+        for square in squares_of(passed):
+            if self.is_attacked(square, 1 - color):
+                return False
+        return True
+
+    def is_attacked(self, square, by_color):
+        """Checks whether any piece of by_color attacks the square.
+
+        A piece attacks the square exactly when the same piece standing on the square would attack it,
+        so each kind is one table lookup against that kind's bitboard."""
+        pieces = self.pieces
+        base = by_color << 3
+        if KING_ATTACKS[square] & pieces[base | KING] or PAWN_ATTACKS[1 - by_color][square] & pieces[base | PAWN] or \
+                self.knights_attacking(square, by_color, self.occupied):
+            return True
+        queens = pieces[base | QUEEN]
+        return bool(rook_attacks(square, self.occupied) & (pieces[base | ROOK] | queens) or
+                    bishop_attacks(square, self.occupied) & (pieces[base | BISHOP] | queens))
+
+    def knight_attacks(self, square, occupied):
+        """:return squares a knight on square attacks, which depends on the horsey rule of the game"""
+        return self.rules.knight_attacks(square, occupied)
+
+    def knights_attacking(self, square, color, occupied):
+        """:return bitboard of the knights of the given color that attack the square"""
+        knights = KNIGHT_ATTACKS[square] & self.pieces[make_piece(color, KNIGHT)]
+        if knights and not self.rules.standard_horsey:
+            for knight in squares_of(knights):
+                if not knight_leg_attacks(knight, occupied) >> square & 1:  # something stands on the horsey's leg
+                    knights ^= 1 << knight
+        return knights
+
+    def attack_map(self, color, occupied=None):
+        """:return bitboard of every square a piece of the given color attacks
+
+        :param occupied: occupied squares to slide through, the real ones by default"""
+        if occupied is None:
+            occupied = self.occupied
+        pieces = self.pieces
+        base = color << 3
+        attacked = 0
+        for square in squares_of(pieces[base | PAWN]):
+            attacked |= PAWN_ATTACKS[color][square]
+        for square in squares_of(pieces[base | KNIGHT]):
+            attacked |= self.knight_attacks(square, occupied)
+        for square in squares_of(pieces[base | BISHOP] | pieces[base | QUEEN]):
+            attacked |= bishop_attacks(square, occupied)
+        for square in squares_of(pieces[base | ROOK] | pieces[base | QUEEN]):
+            attacked |= rook_attacks(square, occupied)
+        for square in squares_of(pieces[base | KING]):
+            attacked |= KING_ATTACKS[square]
+        return attacked
+
+    def check_info(self):
+        """Works out, once per position, what the side to move has to respect to keep its King safe.
+
+        :return (checkers, pinned, attacked) bitboards: the enemy pieces giving check, our pieces pinned to our King,
+        and the squares the enemy attacks with our King taken off the board (so it can't step back along a ray)"""
+        if self.check_cache is not None:
+            return self.check_cache
+        color = self.side
+        enemy = 1 - color
+        king = self.kings[color]
+        if king is None:
+            self.check_cache = (0, 0, self.attack_map(enemy))
+            return self.check_cache
+
+        pieces = self.pieces
+        base = enemy << 3
+        king_bit = 1 << king
+        attacked = self.attack_map(enemy, self.occupied ^ king_bit)
+
+        checkers = 0
+        if attacked & king_bit:
+            checkers = self.knights_attacking(king, enemy, self.occupied) | \
+                       (PAWN_ATTACKS[color][king] & pieces[base | PAWN]) | \
+                       (rook_attacks(king, self.occupied) & (pieces[base | ROOK] | pieces[base | QUEEN])) | \
+                       (bishop_attacks(king, self.occupied) & (pieces[base | BISHOP] | pieces[base | QUEEN]))
+
+        # sliders that would see our King through our own pieces pin the single piece in between
+        pinned = 0
+        enemies = self.occupancy[enemy]
+        snipers = (rook_attacks(king, enemies) & (pieces[base | ROOK] | pieces[base | QUEEN])) | \
+                  (bishop_attacks(king, enemies) & (pieces[base | BISHOP] | pieces[base | QUEEN]))
+        for sniper in squares_of(snipers):
+            blockers = BETWEEN[king][sniper] & self.occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers & self.occupancy[color]
+
+        self.check_cache = (checkers, pinned, attacked)
+        return self.check_cache
+
+    def in_check(self, color=None):
+        """Checks if the King of the given color (the side to move by default) is in check"""
+        if color is None or color == self.side:
+            return bool(self.check_info()[0])
+        king = self.kings[color]
+        return king is not None and self.is_attacked(king, 1 - color)
+
+    def leaves_king_in_check(self, sq1, sq2):
+        """Checks whether moving the piece on sq1 to sq2 would leave the side to move in check.
+
+        Uses the checkers, pins and attacked squares from check_info(), so nothing is played on the board,
+        except for en passant which can uncover a check along the rank of both pawns, and for every move when
+        horseys can be blocked."""
+        checkers, pinned, attacked = self.check_info()
+        king = self.kings[self.side]
+        if sq1 == king:
+            return bool(attacked >> sq2 & 1)
+        if king is None:
+            return False
+        if sq2 == self.ep_square and piece_kind(self.board[sq1]) == PAWN or not self.rules.standard_horsey:
+            # a horsey that needs its leg square free can be let through by any piece, so play it and look
+            color = self.side
+            self.make_move(encode_move(sq1, sq2))
+            exposed = self.is_attacked(king, 1 - color)
+            self.unmake_move()
+            return exposed
+        if pinned >> sq1 & 1 and not LINE[king][sq1] >> sq2 & 1:  # a pinned piece may only move along the pin
+            return True
+        if checkers:
+            if checkers & (checkers - 1):  # double check, only the King can move
+                return True
+            # a single check has to be captured or blocked
+            return not (checkers | BETWEEN[king][lowest_square(checkers)]) >> sq2 & 1
+        return False
+
+    def is_promotion(self, sq1, sq2):
+        """:return Boolean value for whether moving the piece on sq1 to sq2 promotes a pawn"""
+        piece = self.board[sq1]
+        return piece_kind(piece) == PAWN and (sq2 >> 3) == (7 if piece_color(piece) == WHITE else 0)
+
+    def is_legal(self, sq1, sq2):
+        """Checks whether the side to move may play sq1 to sq2, including that its King is not left in check"""
+        if self.color_at(sq1) != self.side or not self.allowed_piece_move(sq1, sq2):
+            return False
+        if self.rules.forced_en_passant and not (sq2 == self.ep_square and piece_kind(self.board[sq1]) == PAWN) and \
+                self.en_passant_captures():
+            return False  # en passant is forced
+        return not self.leaves_king_in_check(sq1, sq2)
+
+    def en_passant_captures(self):
+        """:return list of squares of the pawns that may legally capture en passant right now"""
+        if self.ep_square is None:
+            return []
+        pawns = PAWN_ATTACKS[1 - self.side][self.ep_square] & self.pieces[make_piece(self.side, PAWN)]
+        return [pawn for pawn in squares_of(pawns) if not self.leaves_king_in_check(pawn, self.ep_square)]
+
+    def make_move(self, move):
+        """Plays an encoded move (see encode_move()) without checking legality, updating castling rights,
+        en passant and clocks. Everything needed to take it back is pushed onto self.history.
+
+        :return the undo record that was pushed"""
+        sq1 = move & 63
+        sq2 = move >> 6 & 63
+        promotion = move >> 12
+        piece = self.board[sq1]
+        kind = piece & 7
+        color = piece >> 3
+
+        captured = self.board[sq2]
+        capture_square = sq2
+        rooks = None
+        if kind == PAWN and sq2 == self.ep_square:  # en passant removes the pawn behind the destination square
+            capture_square = sq2 - 8 if color == WHITE else sq2 + 8
+            captured = self.board[capture_square]
+        elif kind == KING:
+            rooks = self.castle_rook_squares(sq1, sq2)
+
+        # the undo record: the move (promotion piece included), the piece captured and its square, the castling
+        # rook's (from, to) squares, then the castling rights, en passant square, clock, check info and key before it
+        record = (move, captured, capture_square, rooks, self.castling, self.ep_square, self.halfmove_clock,
+                  self.check_cache, self.key)
+        self.history.append(record)
+
+        if captured != EMPTY:
+            self.remove_piece(capture_square)
+        if rooks is not None:
+            self.put_piece(rooks[1], self.remove_piece(rooks[0]))
+        self.remove_piece(sq1)
+        self.put_piece(sq2, make_piece(color, promotion) if promotion else piece)
+
+        self.halfmove_clock = 0 if kind == PAWN or captured != EMPTY else self.halfmove_clock + 1
+        key = self.key ^ SIDE_KEY ^ CASTLING_KEYS[self.castling]
+        if self.ep_square is not None:
+            key ^= EP_KEYS[self.ep_square & 7]
+        # a double pawn push leaves the skipped square open to en passant, if an enemy pawn is there to take it
+        self.ep_square = None
+        if kind == PAWN and (sq2 - sq1 == 16 or sq1 - sq2 == 16) and \
+                PAWN_ATTACKS[color][(sq1 + sq2) >> 1] & self.pieces[make_piece(1 - color, PAWN)]:
+            self.ep_square = (sq1 + sq2) >> 1
+            key ^= EP_KEYS[sq1 & 7]
+        # moving a king or rook, or capturing a rook on its home square, loses the matching castling rights
+        self.castling &= CASTLING_MASK[sq1] & CASTLING_MASK[sq2]
+        self.key = key ^ CASTLING_KEYS[self.castling]
+
+        if color == BLACK:
+            self.fullmove_number += 1
+        self.side = 1 - color
+        self.check_cache = None
+        return record
+
+    def unmake_move(self):
+        """Takes back the last move made with make_move(), restoring the position exactly
+
+        :return the move that was taken back"""
+        move, captured, capture_square, rooks, castling, ep_square, halfmove_clock, check_cache, key = \
+            self.history.pop()
+        sq1 = move & 63
+        sq2 = move >> 6 & 63
+        color = 1 - self.side
+
+        piece = self.remove_piece(sq2)
+        if move >> 12:  # a promoted piece goes back to being a pawn
+            piece = make_piece(color, PAWN)
+        self.put_piece(sq1, piece)
+        if captured != EMPTY:
+            self.put_piece(capture_square, captured)
+        if rooks is not None:
+            self.put_piece(rooks[0], self.remove_piece(rooks[1]))
+
+        if color == BLACK:
+            self.fullmove_number -= 1
+        self.side = color
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.check_cache = check_cache
+        self.key = key  # put_piece and remove_piece above changed it, but the old one is known
+        return move
+
+    def ep_capturable(self, ep_square):
+        """:return Boolean value for whether a pawn of the side to move stands next to the en passant square"""
+        return bool(PAWN_ATTACKS[1 - self.side][ep_square] & self.pieces[make_piece(self.side, PAWN)])
+
+    def repetitions(self):
+        """Counts how many times the current position occurred before, going back no further than the last
+        capture or pawn move (nothing before those can repeat)
+
+        :return the number of earlier occurrences, so 2 means the position is on the board for the third time"""
+        history = self.history
+        count = 0
+        # the same side is to move every second ply; record[-1] is the key from before that record's move
+        for back in range(2, min(self.halfmove_clock, len(history)) + 1, 2):
+            if history[-back][-1] == self.key:
+                count += 1
+        return count
+
+    def can_claim_draw(self):
+        """:return Boolean value for whether a draw may be claimed by threefold repetition or the fifty-move rule"""
+        return self.halfmove_clock >= 100 or self.repetitions() >= 2
+
+    def insufficient_material(self):
+        """:return Boolean value for whether neither side has the pieces left to ever give mate:
+        bare Kings, or Kings and a single knight or bishop between them"""
+        pieces = self.pieces
+        for color in (WHITE, BLACK):
+            base = color << 3
+            if pieces[base | PAWN] or pieces[base | ROOK] or pieces[base | QUEEN]:
+                return False
+        minors = self.occupied & ~(pieces[make_piece(WHITE, KING)] | pieces[make_piece(BLACK, KING)])
+        return not minors & (minors - 1)
+
+    def apply_move(self, sq1, sq2, promotion=QUEEN):
+        """Moves the piece on sq1 to sq2 without checking legality, see make_move().
+
+        :param promotion: the kind a pawn reaching the last rank becomes
+        :return list of squares whose contents changed, so a display only has to redraw those"""
+        move = encode_move(sq1, sq2, promotion if self.is_promotion(sq1, sq2) else EMPTY)
+        if self.redo_moves and self.redo_moves[-1] == move:
+            self.redo_moves.pop()  # the game goes on the way it went before, so the rest can still be redone
+        else:
+            self.redo_moves = []
+        return changed_squares(self.make_move(move))
+
+    def undo(self):
+        """Takes back the last move, keeping it for redo()
+
+        :return list of changed squares, see apply_move(), or None if no move was made"""
+        if not self.history:
+            return None
+        record = self.history[-1]
+        self.redo_moves.append(self.unmake_move())
+        return changed_squares(record)
+
+    def redo(self):
+        """Plays again the last move taken back with undo()
+
+        :return list of changed squares, see apply_move(), or None if there is nothing to redo"""
+        if not self.redo_moves:
+            return None
+        return changed_squares(self.make_move(self.redo_moves.pop()))
+
+    def move(self, sq1, sq2, promotion=QUEEN):
+        """Plays a move for the side to move after making sure it is legal.
+
+        :return list of changed squares, see apply_move()"""
+        if not self.is_legal(sq1, sq2):
+            raise ValueError("illegal move: " + square_name(sq1) + square_name(sq2))
+        return self.apply_move(sq1, sq2, promotion)
+
+
+def changed_squares(record):
+    """:return list of the squares a move changed, from its undo record (see Position.make_move())"""
+    move, captured, capture_square, rooks = record[:4]
+    changed = [move & 63, move >> 6 & 63]
+    if capture_square != changed[1]:
+        changed.append(capture_square)
+    if rooks is not None:
+        changed.extend(rooks)
+    return changed
+
+
+# castling rights kept after a move touches each square
+CASTLING_MASK = [15] * 64
+CASTLING_MASK[parse_square("a1")] = 15 & ~WHITE_LONG
+CASTLING_MASK[parse_square("h1")] = 15 & ~WHITE_SHORT
+CASTLING_MASK[parse_square("e1")] = 15 & ~(WHITE_SHORT | WHITE_LONG)
+CASTLING_MASK[parse_square("a8")] = 15 & ~BLACK_LONG
+CASTLING_MASK[parse_square("h8")] = 15 & ~BLACK_SHORT
+CASTLING_MASK[parse_square("e8")] = 15 & ~(BLACK_SHORT | BLACK_LONG)
@@ -0,0 +1,115 @@
+# Premoves: moves a player lines up while the other side is still thinking, played the moment their turn comes.
+# While it isn't the player's turn nothing can be checked against the rules yet, so a premove only has to be a move
+# the piece could make on an empty board (a pawn may step forwards or take diagonally). It is checked for real when
+# its turn comes; if it isn't legal then, it and every premove queued after it are dropped, as on lichess.
+# Later premoves may move the pieces earlier ones moved: the queue keeps the board as it would look after them.
+
+from collections import deque
+
+from .attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, queen_attacks, rook_attacks, bishop_attacks
+from .position import WHITE, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, encode_move
+
+MAX_PREMOVES = 8
+
+
+def reach(board, square, rules):
+    """:return bitboard of the squares the piece on square could go to on an otherwise empty board, for a premove;
+    castling counts when the King is on its home square"""
+    piece = board[square]
+    kind, color = piece & 7, piece >> 3
+    if kind == PAWN:
+        forward = 8 if color == WHITE else -8
+        squares = PAWN_ATTACKS[color][square]
+        if 0 <= square + forward < 64:
+            squares |= 1 << (square + forward)
+        if square >> 3 == (1 if color == WHITE else 6):
+            squares |= 1 << (square + 2 * forward)
+        return squares
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if kind == BISHOP:
+        return bishop_attacks(square, 0)
+    if kind == ROOK:
+        return rook_attacks(square, 0)
+    if kind == QUEEN:
+        return queen_attacks(square, 0)
+    if kind == KING:
+        squares = KING_ATTACKS[square]
+        if square == (4 if color == WHITE else 60):
+            for to in rules.castle_targets[color]:
+                squares |= 1 << to
+        return squares
+    return 0
+
+
+class PremoveQueue:
+    """The premoves of one color, first to be played first"""
+
+    def __init__(self, color, limit=MAX_PREMOVES):
+        self.color = color
+        self.limit = limit
+        self.moves = deque()  # (from square, to square, promotion kind)
+
+    def __len__(self):
+        return len(self.moves)
+
+    def clear(self):
+        self.moves.clear()
+
+    def board(self, position):
+        """:return the position's board as it would look after the premoves, played without any rules (castling
+        moves the rook too, en passant is left alone)"""
+        board = position.board[:]
+        for sq1, sq2, promotion in self.moves:
+            piece = board[sq1]
+            board[sq1] = EMPTY
+            board[sq2] = piece if not promotion else promotion | self.color << 3
+            rooks = position.rules.castle_rooks[self.color].get(sq2) if piece & 7 == KING and \
+                sq1 == (4 if self.color == WHITE else 60) else None
+            if rooks is not None:
+                board[rooks[1]] = board[rooks[0]]
+                board[rooks[0]] = EMPTY
+        return board
+
+    def destinations(self, position, square):
+        """:return bitboard of where the piece on square (after the premoves) could be premoved to, 0 if the square
+        doesn't hold a piece of this color"""
+        board = self.board(position)
+        if board[square] == EMPTY or board[square] >> 3 != self.color or len(self.moves) >= self.limit:
+            return 0
+        return reach(board, square, position.rules) & ~self.own(board)
+
+    def own(self, board):
+        """:return bitboard of the squares holding this color's pieces on board"""
+        bits = 0
+        for square, piece in enumerate(board):
+            if piece != EMPTY and piece >> 3 == self.color:
+                bits |= 1 << square
+        return bits
+
+    def is_promotion(self, position, sq1, sq2):
+        """:return Boolean value for whether the premove would take a pawn to the last rank"""
+        return self.board(position)[sq1] & 7 == PAWN and sq2 >> 3 == (7 if self.color == WHITE else 0)
+
+    def add(self, sq1, sq2, promotion=EMPTY):
+        """Queues a premove; promotion is the kind a pawn reaching the last rank becomes"""
+        self.moves.append((sq1, sq2, promotion))
+
+    def squares(self):
+        """:return set of the squares the premoves move from and to, for showing them"""
+        return set(square for sq1, sq2, _promotion in self.moves for square in (sq1, sq2))
+
+    def take(self, position, legal_moves):
+        """Takes the first premove off the queue, when it is this color's turn
+
+        :param legal_moves: the legal moves of the position
+        :return the encoded move to play, None if there is no premove to play now, or False if the first one
+        turned out illegal, in which case the whole queue was dropped"""
+        if not self.moves or position.side != self.color:
+            return None
+        sq1, sq2, promotion = self.moves.popleft()
+        move = encode_move(sq1, sq2, promotion if position.is_promotion(sq1, sq2) else EMPTY)
+        if move not in legal_moves:
+            self.moves.clear()
+            return False
+        return move
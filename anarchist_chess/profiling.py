@@ -0,0 +1,139 @@
+# Optional timing of chosen functions, to see where a game spends its time.
+# Nothing is measured until a function is wrapped: Profiler.wrap() swaps a timing wrapper in for the attribute,
+# and unwrap_all() puts the originals back, so with profiling switched off the code runs exactly as written.
+#
+# Usage:
+#     profiler = Profiler()
+#     profiler.wrap(Position, "in_check")                     call counts and latencies
+#     profiler.wrap(canvas, "itemconfigure", timed=False)    call counts only
+#     profiler.wrap(Position, "make_move", thread=threading.current_thread())     calls from this thread only
+#     ...
+#     profiler.dump("profile.json")
+
+import functools
+import json
+import threading
+import time
+
+SAMPLES = 4096  # latest durations kept per function for the percentiles
+
+
+class Stat:
+    """Calls of one function: how many, their total time and the latest durations"""
+
+    __slots__ = ("calls", "total", "samples", "next_sample")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0  # seconds, including the functions it calls
+        self.samples = []  # ring buffer of the latest SAMPLES durations
+        self.next_sample = 0
+
+    def add(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        if len(self.samples) < SAMPLES:
+            self.samples.append(seconds)
+        else:
+            self.samples[self.next_sample] = seconds
+            self.next_sample = (self.next_sample + 1) % SAMPLES
+
+    def percentile(self, fraction):
+        """:return the duration that fraction of the sampled calls took at most, in seconds"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Profiler:
+
+    def __init__(self):
+        self.stats = {}  # name -> Stat
+        self.patches = []  # (owner, attribute, original, Boolean value for whether owner had its own attribute)
+        self.lock = threading.Lock()  # the computer's search thread calls the same functions as the window
+
+    def enabled(self):
+        return bool(self.patches)
+
+    def wrap(self, owner, attribute, name=None, timed=True, thread=None):
+        """Replaces owner.attribute with a wrapper that records its calls.
+
+        :param owner: a class, to measure a method for every instance, or a single object
+        :param name: name in the report, \"Class.attribute\" by default
+        :param timed: False to only count calls, for cheap functions called very often such as widget configs
+        :param thread: only record calls made from this thread; calls from other threads, such as the computer's
+                       search calling the same Position methods as the window, go straight to the original"""
+        original = getattr(owner, attribute)
+        if name is None:
+            name = getattr(owner, "__name__", type(owner).__name__) + "." + attribute
+        stat = self.stats.setdefault(name, Stat())
+        lock = self.lock
+        perf_counter = time.perf_counter
+        current_thread = threading.current_thread
+
+        if timed:
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                if thread is not None and current_thread() is not thread:
+                    return original(*args, **kwargs)
+                start = perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    elapsed = perf_counter() - start
+                    with lock:
+                        stat.add(elapsed)
+        else:
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                if thread is not None and current_thread() is not thread:
+                    return original(*args, **kwargs)
+                with lock:
+                    stat.calls += 1
+                return original(*args, **kwargs)
+
+        # what the owner itself held is put back later: a class's plain function, or nothing for an object
+        # that only had the method through its class
+        own = attribute in vars(owner)
+        saved = vars(owner)[attribute] if own else original
+        self.patches.append((owner, attribute, saved, own))
+        setattr(owner, attribute, wrapper)
+
+    def unwrap_all(self):
+        """Puts every wrapped attribute back the way it was, newest first"""
+        while self.patches:
+            owner, attribute, original, own = self.patches.pop()
+            if own:
+                setattr(owner, attribute, original)
+            else:
+                delattr(owner, attribute)
+
+    def reset(self):
+        """Forgets everything recorded so far; the Stat objects stay, the wrappers hold on to them"""
+        with self.lock:
+            for stat in self.stats.values():
+                stat.__init__()
+
+    def report(self):
+        """:return dict of name -> {calls, total_ms, p50_us, p99_us}; latencies are 0 for counted-only names"""
+        with self.lock:
+            return dict((name, {"calls": stat.calls, "total_ms": round(stat.total * 1e3, 3),
+                                "p50_us": round(stat.percentile(0.5) * 1e6, 1),
+                                "p99_us": round(stat.percentile(0.99) * 1e6, 1)})
+                        for name, stat in self.stats.items())
+
+    def summary(self):
+        """:return the report as lines of text, the most time consuming first"""
+        report = self.report()
+        lines = ["%-28s %8s %10s %9s %9s" % ("", "calls", "total ms", "p50 us", "p99 us")]
+        for name in sorted(report, key=lambda name: (-report[name]["total_ms"], -report[name]["calls"])):
+            row = report[name]
+            lines.append("%-28s %8d %10.1f %9.1f %9.1f" % (name[:28], row["calls"], row["total_ms"], row["p50_us"],
+                                                         row["p99_us"]))
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Writes the report to a JSON file"""
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=2, sort_keys=True)
@@ -0,0 +1,148 @@
+# The Anarchist kinks a game is played with.
+# Every kink is declared once below, with the name it goes by in a rules string ("b1,forced-ep") and what it changes.
+# A Rules object is compiled when it is made: the kinks it has fill in castling tables and pick the horsey's attack
+# function, so Position and the move generator look things up instead of asking which kinks are on at every move.
+# Rules are switched per game by handing Position a different Rules object; don't change one after it is made.
+
+from .attacks import KNIGHT_ATTACKS, knight_leg_attacks
+
+# how the horsey (knight) gets to its square
+HORSEY_JUMP = "jump"  # the usual L-shaped jump over anything in the way
+HORSEY_LEG = "leg"  # takes one straight step first, so a piece on that square blocks it (like the xiangqi horse)
+HORSEY_PATHS = (HORSEY_JUMP, HORSEY_LEG)
+
+# the King's home square and the squares it castles to, with the rook's (from, to) squares, for (white, black)
+HOMES = (4, 60)
+CASTLES = ({6: (7, 5), 2: (0, 3)}, {62: (63, 61), 58: (56, 59)})
+B1_CASTLES = ({1: (0, 3)}, {57: (56, 59)})
+
+
+def _knight_jumps(square, occupied):
+    """:return squares a horsey that jumps attacks from square, whatever is in the way"""
+    return KNIGHT_ATTACKS[square]
+
+
+class Kink:
+    """One of the Anarchist kinks, see kink()"""
+
+    def __init__(self, name, option, value, description, apply):
+        self.name = name
+        self.option = option
+        self.value = value
+        self.description = description
+        self.apply = apply
+
+    def __repr__(self):
+        return "Kink(%r)" % self.name
+
+
+KINKS = {}  # name -> Kink, in the order they were declared, which is the order Rules.name() lists them
+
+
+def kink(name, option, value=True):
+    """Declares a kink; the function decorated changes the compiled Rules for it, and its docstring says what it does
+
+    :param name: what the kink is called in a rules string, ex: \"forced-ep\"
+    :param option: the Rules argument that turns it on
+    :param value: the value of that argument that means this kink"""
+    def declare(apply):
+        KINKS[name] = Kink(name, option, value, apply.__doc__, apply)
+        return apply
+    return declare
+
+
+@kink("b1", "b1_castling")
+def _b1_castling(rules):
+    """castling long may be done by moving the King to b1 (b8); it lands there, rook on d1"""
+    for color in (0, 1):
+        rules.castle_rooks[color].update(B1_CASTLES[color])
+
+
+@kink("forced-ep", "forced_en_passant")
+def _forced_en_passant(rules):
+    """when en passant is possible it must be played"""
+
+
+@kink("horsey-leg", "horsey", HORSEY_LEG)
+def _horsey_leg(rules):
+    """the horsey steps straight first, and a piece on that square blocks it"""
+    rules.standard_horsey = False
+    rules.knight_attacks = knight_leg_attacks
+
+
+@kink("castle-through-check", "castle_through_check")
+def _castle_through_check(rules):
+    """the King may castle out of check and through attacked squares, but not into check"""
+    rules.castle_out_of_check = True
+
+
+class Rules:
+
+    def __init__(self, b1_castling=True, forced_en_passant=False, horsey=HORSEY_JUMP, castle_through_check=False):
+        """:param b1_castling: castling long may be done by moving the King to b1 (b8); it lands there, rook on d1
+        :param forced_en_passant: when en passant is possible it must be played
+        :param horsey: one of HORSEY_PATHS
+        :param castle_through_check: the King may castle out of check and through attacked squares"""
+        if horsey not in HORSEY_PATHS:
+            raise ValueError("unknown horsey path %r, expected one of %s" % (horsey, ", ".join(HORSEY_PATHS)))
+        self.b1_castling = b1_castling
+        self.forced_en_passant = forced_en_passant
+        self.horsey = horsey
+        self.castle_through_check = castle_through_check
+        self.kinks = tuple(kink for kink in KINKS.values() if getattr(self, kink.option) == kink.value)
+
+        # what the kinks compile into; the regular rules first, then each kink changes what it is about
+        self.standard_horsey = True
+        self.knight_attacks = _knight_jumps  # function of (square, occupied) -> squares a horsey there attacks
+        self.castle_rooks = [dict(CASTLES[0]), dict(CASTLES[1])]  # [color][King destination]: (rook from, rook to)
+        self.castle_out_of_check = False
+        for kink in self.kinks:
+            kink.apply(self)
+        self.castle_targets = tuple(tuple(destinations) for destinations in self.castle_rooks)
+        # castle_passed[King destination]: bitboard of the squares the King may not castle from or through when
+        # attacked; where it lands is checked like for any other move
+        self.castle_passed = {}
+        for home, destinations in zip(HOMES, self.castle_targets):
+            for to in destinations:
+                passed = 0
+                if not self.castle_out_of_check:
+                    for square in range(home, to, 1 if to > home else -1):
+                        passed |= 1 << square
+                self.castle_passed[to] = passed
+        self.generate = None  # legal move generator for these rules, compiled by anarchist_chess.movegen
+
+    def name(self):
+        """:return a short description such as \"b1,forced-ep,horsey-leg\", the form parse() reads"""
+        return ",".join(kink.name for kink in self.kinks) or "standard"
+
+    @staticmethod
+    def parse(text):
+        """Reads a comma separated list of kinks, ex: \"b1,forced-ep,horsey-leg\"; \"standard\" means none"""
+        options = {"b1_castling": False}
+        for name in text.split(","):
+            name = name.strip()
+            if name in ("", "standard"):
+                continue
+            if name == "anarchist":
+                name = "b1"
+            if name not in KINKS:
+                raise ValueError("unknown kink %r, expected some of %s" % (name, ", ".join(KINKS)))
+            options[KINKS[name].option] = KINKS[name].value
+        return Rules(**options)
+
+    def __reduce__(self):
+        # the compiled functions don't pickle, so a Rules is sent to other processes as its name and compiled there
+        return Rules.parse, (self.name(),)
+
+    def __eq__(self, other):
+        return isinstance(other, Rules) and self.name() == other.name()
+
+    def __hash__(self):
+        return hash(self.name())
+
+    def __repr__(self):
+        return "Rules.parse(%r)" % self.name()
+
+
+STANDARD = Rules(b1_castling=False)  # regular chess, what the perft counts assume
+ANARCHIST = Rules()  # the game as Chess.py plays it: castling with b1 is allowed
@@ -0,0 +1,205 @@
+# Self-play tournaments without a display: plays many games between engine or random players over a pool of
+# worker processes, to see how the Anarchist kinks change the results.
+# Every finished game is written out as soon as it comes back, as one JSON line or as PGN (--format pgn), and a
+# summary of the results and the games per second is printed at the end (and every --report games along the way).
+#
+# Usage:
+#     python -m anarchist_chess.selfplay --games 10000 --players random --rules b1,forced-ep
+#     python -m anarchist_chess.selfplay --games 200 --players engine --depth 2 --rules b1,horsey-leg --out games.jsonl
+#     python -m anarchist_chess.selfplay --games 200 --format pgn --out games.pgn
+#     python -m anarchist_chess.selfplay --games 200 --players engine,random     colors swap every game
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from .engine import Searcher
+from .movegen import legal_moves
+from .pgn import Game
+from .position import WHITE, START_FEN, Position, move_name
+from .rules import Rules, ANARCHIST
+
+PLAYERS = ("engine", "random")
+FORMATS = ("jsonl", "pgn")
+
+# game results, from white's point of view as in PGN
+WHITE_WINS = "1-0"
+BLACK_WINS = "0-1"
+DRAW = "1/2-1/2"
+
+_searcher = None  # the engine of this worker process, made on first use
+
+
+def _engine_move(position, depth, time_limit):
+    global _searcher
+    if _searcher is None:
+        _searcher = Searcher(tt_megabytes=4)
+    return _searcher.search(position, depth, time_limit)[0]
+
+
+def play_game(task):
+    """Plays one game from start to end; runs in a worker process.
+
+    :param task: (game number, white player, black player, Rules, start FEN, engine depth, engine seconds per move
+                  or None, random opening plies, max plies, seed, Boolean value for whether to include the PGN)
+    :return dict describing the game, see the keys below"""
+    number, white, black, rules, fen, depth, time_limit, random_plies, max_plies, seed, with_pgn = task
+    rng = random.Random(seed)
+    position = Position(fen, rules)
+    if _searcher is not None:
+        _searcher.tt.clear()  # results from the previous game would make the engine play it again
+    start = time.perf_counter()
+    moves = []
+    result, termination = DRAW, "max plies"
+    while len(moves) < max_plies:
+        legal = legal_moves(position)
+        if not legal:
+            if position.in_check():
+                result, termination = BLACK_WINS if position.side == WHITE else WHITE_WINS, "checkmate"
+            else:
+                termination = "stalemate"
+            break
+        if position.halfmove_clock >= 100:
+            termination = "fifty-move rule"
+            break
+        if position.repetitions() >= 2:
+            termination = "repetition"
+            break
+        if position.insufficient_material():
+            termination = "insufficient material"
+            break
+        player = white if position.side == WHITE else black
+        if player == "random" or len(moves) < random_plies:
+            move = rng.choice(legal)
+        else:
+            move = _engine_move(position, depth, time_limit)
+        position.make_move(move)
+        moves.append(move_name(move))
+    record = {"game": number, "white": white, "black": black, "rules": rules.name(), "fen": fen, "result": result,
+              "termination": termination, "plies": len(moves), "moves": moves,
+              "seconds": round(time.perf_counter() - start, 4)}
+    if with_pgn:  # written here rather than by the parent, which would have to replay every game
+        record["pgn"] = Game.from_position(position, {"Event": "Self-play", "Round": str(number + 1), "White": white,
+                                                      "Black": black, "Termination": termination}, result).pgn()
+    return record
+
+
+def tasks(games, players, rules, fen, depth, time_limit, random_plies, max_plies, seed, with_pgn):
+    """Yields the play_game() task of every game; with two different players, colors swap every game"""
+    for number in range(games):
+        white, black = players if number % 2 == 0 else players[::-1]
+        yield (number, white, black, rules, fen, depth, time_limit, random_plies, max_plies, seed * 1000003 + number,
+               with_pgn)
+
+
+class Summary:
+    """Adds up the results of finished games"""
+
+    def __init__(self):
+        self.games = 0
+        self.plies = 0
+        self.results = {WHITE_WINS: 0, DRAW: 0, BLACK_WINS: 0}
+        self.terminations = {}
+        self.scores = {}  # player -> [wins, draws, losses]
+        self.start = time.perf_counter()
+
+    def add(self, record):
+        self.games += 1
+        self.plies += record["plies"]
+        result = record["result"]
+        self.results[result] += 1
+        self.terminations[record["termination"]] = self.terminations.get(record["termination"], 0) + 1
+        for color, player in enumerate((record["white"], record["black"])):
+            score = self.scores.setdefault(player, [0, 0, 0])
+            if result == DRAW:
+                score[1] += 1
+            else:
+                score[0 if (result == WHITE_WINS) == (color == WHITE) else 2] += 1
+
+    def report(self, out):
+        elapsed = time.perf_counter() - self.start
+        games = max(1, self.games)
+        out.write("%d games in %.1fs, %.1f games/sec, %.1f plies/game\n" % (
+            self.games, elapsed, self.games / elapsed if elapsed else 0.0, self.plies / float(games)))
+        out.write("white wins %d (%.1f%%)  draws %d (%.1f%%)  black wins %d (%.1f%%)\n" % (
+            self.results[WHITE_WINS], 100.0 * self.results[WHITE_WINS] / games,
+            self.results[DRAW], 100.0 * self.results[DRAW] / games,
+            self.results[BLACK_WINS], 100.0 * self.results[BLACK_WINS] / games))
+        if len(self.scores) > 1:
+            for player in sorted(self.scores):
+                out.write("%-7s W/D/L %d/%d/%d\n" % ((player,) + tuple(self.scores[player])))
+        out.write("endings: %s\n" % ", ".join(
+            "%s %d" % (name, count) for name, count in sorted(self.terminations.items(), key=lambda item: -item[1])))
+        out.flush()
+
+
+def run(games, players, rules=ANARCHIST, fen=START_FEN, depth=2, time_limit=None, random_plies=4, max_plies=400,
+        seed=0, processes=None, out=sys.stdout, log=sys.stderr, report_every=0, output_format="jsonl"):
+    """Plays the games over a process pool, writing each one to out as it finishes.
+
+    :param players: (white player, black player) of the first game, each one of PLAYERS
+    :param output_format: one of FORMATS, a JSON line per game or PGN
+    :return the Summary of the results"""
+    summary = Summary()
+    with_pgn = output_format == "pgn"
+    pool = multiprocessing.Pool(processes or os.cpu_count() or 1)
+    try:
+        for record in pool.imap_unordered(play_game, tasks(games, players, rules, fen, depth, time_limit,
+                                                           random_plies, max_plies, seed, with_pgn)):
+            out.write(record["pgn"] if with_pgn else json.dumps(record) + "\n")
+            out.flush()
+            summary.add(record)
+            if report_every and summary.games % report_every == 0:
+                summary.report(log)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.selfplay",
+                                     description="Plays games between computer players without a display.")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--players", default="random",
+                        help="who plays: engine, random, or white,black such as engine,random")
+    parser.add_argument("--rules", type=Rules.parse, default=ANARCHIST,
+                        help="kinks to play with, ex: b1,forced-ep,horsey-leg or standard (default: b1)")
+    parser.add_argument("--fen", default=START_FEN, help="position every game starts from")
+    parser.add_argument("--depth", type=int, default=2, help="engine search depth")
+    parser.add_argument("--time", type=float, help="engine seconds per move, on top of the depth limit")
+    parser.add_argument("--random-plies", type=int, default=4,
+                        help="plies played at random at the start of every game, so engine games differ")
+    parser.add_argument("--max-plies", type=int, default=400, help="games still going after this many are drawn")
+    parser.add_argument("--processes", type=int, help="worker processes, all cores by default")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random moves")
+    parser.add_argument("--out", help="file to write the games to (default: stdout)")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl", help="one JSON line per game, or PGN")
+    parser.add_argument("--report", type=int, default=0, help="print the summary every this many games")
+    args = parser.parse_args(argv)
+
+    players = args.players.split(",")
+    if len(players) == 1:
+        players *= 2
+    if len(players) != 2 or any(player not in PLAYERS for player in players):
+        parser.error("--players takes engine, random or two of them separated by a comma")
+
+    out = sys.stdout if args.out is None else open(args.out, "w")
+    try:
+        summary = run(args.games, tuple(players), args.rules, args.fen, args.depth, args.time, args.random_plies,
+                      args.max_plies, args.seed, args.processes, out, sys.stderr, args.report, args.format)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    sys.stderr.write("rules: %s\n" % args.rules.name())
+    summary.report(sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
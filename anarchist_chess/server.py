@@ -0,0 +1,280 @@
+# Garry Chess as a network service: one asyncio process hosting many games at once.
+# Players talk to it over TCP, one JSON object per line. Every move is checked with Position.is_legal() before
+# it is pushed to both players, and the server keeps both clocks.
+#
+# Messages from a player:
+#     {"op": "seek", "rules": "b1", "time": 300, "increment": 2}     find an opponent with the same settings
+#     {"op": "move", "game": 7, "move": "e2e4"}                       coordinate notation, "e7e8q" to promote
+#     {"op": "resign", "game": 7}
+#     {"op": "stats"}                                                 games, players and memory of the server
+# Messages from the server:
+#     {"event": "start", "game": 7, "color": "white", "rules": "b1", "time": 300, "increment": 2}
+#     {"event": "move", "game": 7, "move": "e2e4", "clocks": [299500, 300000]}   clocks in milliseconds
+#     {"event": "end", "game": 7, "result": "1-0", "reason": "checkmate"}
+#     {"event": "error", "message": "..."}
+#     {"event": "stats", ...}
+# Time 0 means untimed. A player who disconnects loses their games.
+#
+# Usage:
+#     python -m anarchist_chess.server --port 8765
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+
+from .movegen import legal_moves
+from .position import WHITE, QUEEN, Position, parse_move, move_name
+from .rules import Rules
+
+DEFAULT_PORT = 8765
+COLOR_NAMES = ("white", "black")
+MAX_LINE = 4096  # longest message a player may send, in bytes
+
+
+class ServerGame:
+    """One game being played on the server"""
+
+    def __init__(self, number, rules, base_time, increment, players, now):
+        """:param base_time: seconds on each clock at the start, 0 for an untimed game
+        :param players: the (white, black) Connections
+        :param now: the event loop's clock"""
+        self.number = number
+        self.position = Position(rules=rules)
+        self.players = players
+        self.base_time = base_time
+        self.increment = increment
+        self.clocks = [float(base_time), float(base_time)]  # seconds left on each side's clock
+        self.turn_started = now
+        self.flag_timer = None  # asyncio.TimerHandle that ends the game when the side to move runs out of time
+
+    def timed(self):
+        return self.base_time > 0
+
+    def clock_millis(self):
+        return [int(clock * 1000) for clock in self.clocks]
+
+    def memory(self):
+        """:return roughly how many bytes the game takes: the objects the game and its position own, with one
+        undo record per move played"""
+        position = self.position
+        size = sys.getsizeof(self) + sys.getsizeof(self.__dict__) + sys.getsizeof(self.clocks)
+        size += sys.getsizeof(position) + sys.getsizeof(position.__dict__)
+        for part in (position.board, position.pieces, position.occupancy, position.kings, position.history,
+                     position.redo_moves):
+            size += sys.getsizeof(part)
+        for record in position.history:
+            size += sys.getsizeof(record)
+        return size
+
+
+class Connection:
+    """A connected player"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.games = {}  # game number -> ServerGame the player is in
+        self.seek = None  # settings the player is waiting for an opponent with
+
+    def send(self, message):
+        self.writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+class GameServer:
+
+    def __init__(self):
+        self.games = {}  # game number -> ServerGame being played
+        self.seeks = {}  # (rules name, time, increment) -> Connection waiting for an opponent
+        self.connections = set()
+        self.next_game = 1
+        self.finished = 0  # games that have ended
+        self.moves = 0  # moves played on all games
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """:return the asyncio Server, already listening"""
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+
+    async def handle(self, reader, writer):
+        """Serves one player until they disconnect"""
+        connection = Connection(writer)
+        self.connections.add(connection)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):  # a line over MAX_LINE, or the connection broke
+                    break
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    self.dispatch(connection, message)
+                except (ValueError, KeyError, TypeError) as error:  # bad JSON or a bad field
+                    connection.send({"event": "error", "message": str(error)})
+                try:
+                    await writer.drain()
+                except ConnectionError:  # reset or closed by the player while their messages were being sent
+                    break
+        finally:
+            self.disconnect(connection)
+            writer.close()
+
+    def dispatch(self, connection, message):
+        operation = message["op"]
+        if operation == "seek":
+            self.seek(connection, Rules.parse(str(message.get("rules", "b1"))), float(message.get("time", 0)),
+                      float(message.get("increment", 0)))
+        elif operation == "move":
+            self.move(connection, self.player_game(connection, message), str(message["move"]))
+        elif operation == "resign":
+            game = self.player_game(connection, message)
+            loser = game.players.index(connection)
+            self.end(game, "0-1" if loser == WHITE else "1-0", "resignation")
+        elif operation == "stats":
+            connection.send(dict(self.stats(), event="stats"))
+        else:
+            raise ValueError("unknown op %r" % operation)
+
+    def player_game(self, connection, message):
+        game = connection.games.get(message["game"])
+        if game is None:
+            raise ValueError("you are not playing game %r" % message["game"])
+        return game
+
+    def seek(self, connection, rules, base_time, increment):
+        """Pairs the player with one waiting for the same settings, or makes them wait"""
+        if not (math.isfinite(base_time) and math.isfinite(increment)) or base_time < 0 or increment < 0:
+            raise ValueError("time and increment must be numbers of seconds, 0 or more")
+        key = (rules.name(), base_time, increment)
+        opponent = self.seeks.pop(key, None)
+        if opponent is None or opponent is connection:
+            if connection.seek is not None:
+                self.seeks.pop(connection.seek, None)
+            self.seeks[key] = connection
+            connection.seek = key
+            return
+        opponent.seek = None
+        number = self.next_game
+        self.next_game += 1
+        game = ServerGame(number, rules, base_time, increment, (opponent, connection),
+                          asyncio.get_running_loop().time())
+        self.games[number] = game
+        for color, player in enumerate(game.players):
+            player.games[number] = game
+            player.send({"event": "start", "game": number, "color": COLOR_NAMES[color], "rules": rules.name(),
+                         "time": base_time, "increment": increment})
+        self.start_clock(game)
+
+    def move(self, connection, game, name):
+        position = game.position
+        if game.players[position.side] is not connection:
+            raise ValueError("it is not your move")
+        move = parse_move(name)  # raises ValueError for a name that isn't a move
+        if not move >> 12 and position.is_promotion(move & 63, move >> 6 & 63):
+            move |= QUEEN << 12  # "e7e8" promotes to a queen
+        if move not in legal_moves(position):
+            raise ValueError("illegal move " + name)
+
+        if game.timed():
+            now = asyncio.get_running_loop().time()
+            game.clocks[position.side] -= now - game.turn_started
+            if game.clocks[position.side] <= 0:
+                self.flag(game)
+                return
+            game.clocks[position.side] += game.increment
+            game.turn_started = now
+        position.make_move(move)
+        self.moves += 1
+        update = {"event": "move", "game": game.number, "move": move_name(move), "clocks": game.clock_millis()}
+        for player in game.players:
+            player.send(update)
+
+        if not legal_moves(position):
+            if position.in_check():
+                self.end(game, "0-1" if position.side == WHITE else "1-0", "checkmate")
+            else:
+                self.end(game, "1/2-1/2", "stalemate")
+        elif position.halfmove_clock >= 100:
+            self.end(game, "1/2-1/2", "fifty-move rule")
+        elif position.repetitions() >= 2:
+            self.end(game, "1/2-1/2", "repetition")
+        elif position.insufficient_material():
+            self.end(game, "1/2-1/2", "insufficient material")
+        else:
+            self.start_clock(game)
+
+    def start_clock(self, game):
+        """Sets the timer that ends the game if the side to move doesn't move in time"""
+        if not game.timed():
+            return
+        if game.flag_timer is not None:
+            game.flag_timer.cancel()
+        game.flag_timer = asyncio.get_running_loop().call_later(game.clocks[game.position.side], self.flag, game)
+
+    def flag(self, game):
+        """The side to move ran out of time"""
+        if game.number not in self.games:
+            return
+        game.clocks[game.position.side] = 0.0
+        self.end(game, "0-1" if game.position.side == WHITE else "1-0", "time")
+
+    def end(self, game, result, reason):
+        if self.games.pop(game.number, None) is None:
+            return
+        self.finished += 1
+        if game.flag_timer is not None:
+            game.flag_timer.cancel()
+        for player in game.players:
+            player.games.pop(game.number, None)
+            player.send({"event": "end", "game": game.number, "result": result, "reason": reason,
+                         "clocks": game.clock_millis()})
+
+    def disconnect(self, connection):
+        """A player who leaves loses the games they were playing"""
+        self.connections.discard(connection)
+        if connection.seek is not None and self.seeks.get(connection.seek) is connection:
+            del self.seeks[connection.seek]
+        for game in list(connection.games.values()):
+            loser = game.players.index(connection)
+            self.end(game, "0-1" if loser == WHITE else "1-0", "disconnection")
+
+    def stats(self):
+        """:return dict of numbers about the server, including the memory taken by the games being played"""
+        sizes = [game.memory() for game in self.games.values()]
+        return {"games": len(self.games), "finished": self.finished, "players": len(self.connections),
+                "waiting": len(self.seeks), "moves": self.moves, "memory_bytes": sum(sizes),
+                "memory_bytes_per_game": sum(sizes) // len(sizes) if sizes else 0,
+                "memory_bytes_max_game": max(sizes) if sizes else 0}
+
+
+async def serve(host, port, ready=None):
+    """Runs a GameServer until cancelled
+
+    :param ready: called with the port actually listened on, useful with port 0"""
+    server = await GameServer().start(host, port)
+    if ready is not None:
+        ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.server", description="Hosts games over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+
+    args = parser.parse_args(argv)
+
+    def ready(port):
+        print("listening on %s:%d" % (args.host, port), flush=True)
+
+    try:
+        asyncio.run(serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# Compact binary snapshots of a game, for autosaving and resuming it, and for archives of many games.
+# A snapshot is a fixed-size record of the position the game started from, followed by its moves, two bytes each
+# (as encoded by anarchist_chess.position), then the moves taken back with UNDO that REDO can still play. Loading
+# one replays the moves with make_move(), which for a game of a few hundred moves takes about a millisecond.
+# An archive is just snapshots one after another. Player names and the other PGN tags are not kept.
+#
+# Usage:
+#     python -m anarchist_chess.snapshot from-pgn games.pgn --output games.acs       PGN to an archive of snapshots
+#     python -m anarchist_chess.snapshot to-pgn games.acs --output games.pgn         and back
+#     python -m anarchist_chess.snapshot info                                        what the autosave holds
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from .pgn import RESULTS, Game, read_games
+from .position import WHITE, BLACK, EMPTY, KNIGHT, QUEEN, PIECE_LETTERS, Position, move_name
+from .rules import KINKS, Rules
+
+# magic, format version, kinks (bit i for the i-th kink declared in anarchist_chess.rules), 64 piece codes two to
+# a byte (a1 in the low half of the first), side to move, castling rights, en passant square (255 for none),
+# result (index into RESULTS), halfmove clock, fullmove number, moves played, moves that can be redone
+RECORD = struct.Struct("<4sBB32sBBBBHHHH")
+MAGIC = b"ACSN"
+VERSION = 1
+NO_SQUARE = 255
+
+_rules = {}  # kink bits -> Rules, so every game with the same kinks shares one compiled Rules
+
+
+def default_path():
+    """:return where the game in progress is autosaved, under $XDG_CACHE_HOME (~/.cache by default)"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "anarchist-chess", "autosave.acs")
+
+
+def rules_bits(rules):
+    """:return the kinks of the rules as bits, see RECORD"""
+    return sum(1 << index for index, kink in enumerate(KINKS.values()) if kink in rules.kinks)
+
+
+def bits_rules(bits):
+    """:return the Rules with the kinks in bits, see rules_bits()"""
+    rules = _rules.get(bits)
+    if rules is None:
+        names = [kink.name for index, kink in enumerate(KINKS.values()) if bits >> index & 1]
+        if bits >> len(KINKS):
+            raise ValueError("snapshot has kinks this version doesn't know")
+        rules = _rules[bits] = Rules.parse(",".join(names))
+    return rules
+
+
+def dumps(position, result="*"):
+    """:return the game that led to the position as a snapshot
+
+    :param result: one of pgn.RESULTS"""
+    start = position.copy()
+    while start.history:
+        start.unmake_move()
+    board = start.board
+    moves = [record[0] for record in position.history]
+    redo_moves = position.redo_moves
+    header = RECORD.pack(MAGIC, VERSION, rules_bits(position.rules),
+                         bytes(board[square] | board[square + 1] << 4 for square in range(0, 64, 2)),
+                         start.side, start.castling, NO_SQUARE if start.ep_square is None else start.ep_square,
+                         RESULTS.index(result), min(start.halfmove_clock, 0xFFFF), min(start.fullmove_number, 0xFFFF),
+                         len(moves), len(redo_moves))
+    return header + struct.pack("<%dH" % (len(moves) + len(redo_moves)), *moves, *redo_moves)
+
+
+def start_fen(packed_board, side, castling, ep_square, halfmove_clock, fullmove_number):
+    """:return the FEN of a snapshot's starting position, from the fields of its RECORD"""
+    rows = []
+    for rank in range(7, -1, -1):
+        row = ""
+        blanks = 0
+        for square in range(rank * 8, rank * 8 + 8):
+            piece = packed_board[square >> 1] >> (square & 1) * 4 & 15
+            if piece == EMPTY:
+                blanks += 1
+                continue
+            if piece & 7 > 6 or piece == 8:
+                raise ValueError("snapshot has an unknown piece code %d" % piece)
+            if blanks:
+                row += str(blanks)
+                blanks = 0
+            letter = PIECE_LETTERS[piece & 7]
+            row += letter.upper() if piece >> 3 == WHITE else letter
+        rows.append(row + (str(blanks) if blanks else ""))
+    if side not in (WHITE, BLACK) or castling > 15 or 63 < ep_square < NO_SQUARE:
+        raise ValueError("snapshot has a bad side to move, castling rights or en passant square")
+    rights = "".join(char for bit, char in enumerate("KQkq") if castling >> bit & 1) or "-"
+    ep = "-" if ep_square == NO_SQUARE else "abcdefgh"[ep_square & 7] + str((ep_square >> 3) + 1)
+    return "%s %s %s %s %d %d" % ("/".join(rows), "wb"[side], rights, ep, halfmove_clock, fullmove_number)
+
+
+def loads(data, offset=0, check=False):
+    """Reads the snapshot starting at offset in data and replays its moves
+
+    :param check: make sure every move is legal, not only that it moves a piece of the side to move; worth it for
+                  files from elsewhere, left out when resuming the game this program saved
+    :return (Position with the moves in its history and redo moves, result, offset of the byte after the snapshot)"""
+    try:
+        magic, version, bits, packed_board, side, castling, ep_square, result, halfmove_clock, fullmove_number, \
+            played, redone = RECORD.unpack_from(data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a version %d snapshot" % VERSION)
+        offset += RECORD.size
+        moves = struct.unpack_from("<%dH" % (played + redone), data, offset)
+    except struct.error:
+        raise ValueError("snapshot is cut short")
+    if result >= len(RESULTS):
+        raise ValueError("snapshot has an unknown result")
+    position = Position(start_fen(packed_board, side, castling, ep_square, halfmove_clock, fullmove_number),
+                        bits_rules(bits))
+    for move in moves[:played]:
+        if position.color_at(move & 63) != position.side or check and not legal(position, move):
+            raise ValueError("snapshot move %d, %s, is not legal" % (len(position.history) + 1, move_name(move)))
+        position.make_move(move)
+    position.redo_moves = list(moves[played:])
+    return position, RESULTS[result], offset + 2 * (played + redone)
+
+
+def legal(position, move):
+    """:return Boolean value for whether the encoded move may be played in the position, promotion included"""
+    sq1, sq2, promotion = move & 63, move >> 6 & 63, move >> 12
+    if not position.is_legal(sq1, sq2):
+        return False
+    return KNIGHT <= promotion <= QUEEN if position.is_promotion(sq1, sq2) else promotion == EMPTY
+
+
+def write(path, position, result="*"):
+    """Writes the game to a snapshot file, replacing it in one step so a reader never sees half of one"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary, "wb") as file:
+        file.write(dumps(position, result))
+    os.replace(temporary, path)
+
+
+def read(path, check=False):
+    """:return (Position, result) of the snapshot file, see loads()"""
+    with open(path, "rb") as file:
+        return loads(file.read(), check=check)[:2]
+
+
+def read_archive(path, check=True):
+    """Yields (Position, result) for each snapshot of an archive, reading it through a memory map"""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset < len(data):
+                position, result, offset = loads(data, offset, check)
+                yield position, result
+
+
+class Autosaver:
+    """Writes the game to a snapshot file from a thread of its own, so a move never waits for the disk.
+    When moves come faster than they are written, only the latest game is."""
+
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        self.pending = None  # (Position, result) waiting to be written
+        self.closed = False
+        self.error = None  # the last OSError writing the file, if any
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.thread.start()
+
+    def save(self, position, result="*"):
+        """Queues the game to be written; the position is copied, so it may be played on at once"""
+        with self.condition:
+            self.pending = (position.copy(), result)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                position, result = self.pending
+                self.pending = None
+            try:
+                write(self.path, position, result)
+                self.error = None
+            except OSError as error:
+                self.error = error
+
+    def close(self):
+        """Writes out the game still waiting, if there is one, and stops the thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+
+def pgn_to_archive(paths, output, rules=None, out=sys.stdout):
+    """Replays the games of PGN files and writes them to an archive of snapshots
+
+    :param rules: Rules to replay every game with, by default each game's Rules tag, or the Anarchist rules
+    :return (games written, games left out because they broke the rules)"""
+    games = broken = 0
+    start = time.perf_counter()
+    with open(output, "wb") as file:
+        for path in paths:
+            for game in read_games(path):
+                try:
+                    position = game.replay(rules)
+                except ValueError as error:
+                    broken += 1
+                    out.write("left out game %d of %s: %s\n" % (games + broken, path, error))
+                    continue
+                file.write(dumps(position, game.result if game.result in RESULTS else "*"))
+                games += 1
+    elapsed = time.perf_counter() - start
+    out.write("%d games written, %d left out, %.1fs, %.0f games/sec\n" % (
+        games, broken, elapsed, games / elapsed if elapsed else 0.0))
+    out.flush()
+    return games, broken
+
+
+def archive_to_pgn(paths, output, out=sys.stdout):
+    """Writes the snapshots of archives out as PGN
+
+    :return the number of games written"""
+    games = 0
+    start = time.perf_counter()
+    with open(output, "w") as file:
+        for path in paths:
+            for position, result in read_archive(path):
+                file.write(Game.from_position(position, {"Date": "????.??.??"}, result).pgn())
+                games += 1
+    elapsed = time.perf_counter() - start
+    out.write("%d games written, %.1fs, %.0f games/sec\n" % (games, elapsed, games / elapsed if elapsed else 0.0))
+    out.flush()
+    return games
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.snapshot",
+                                     description="Converts between game snapshots and PGN.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    from_pgn = commands.add_parser("from-pgn", help="write the games of PGN files as an archive of snapshots")
+    from_pgn.add_argument("paths", nargs="+", help="PGN files to read")
+    from_pgn.add_argument("--output", required=True, help="archive to write")
+    from_pgn.add_argument("--rules", type=Rules.parse,
+                          help="kinks to replay with, ex: b1,forced-ep (default: each game's Rules tag, else b1)")
+    to_pgn = commands.add_parser("to-pgn", help="write the snapshots of archives as PGN")
+    to_pgn.add_argument("paths", nargs="+", help="archives to read")
+    to_pgn.add_argument("--output", required=True, help="PGN file to write")
+    info = commands.add_parser("info", help="show the game in a snapshot file and how long it takes to load")
+    info.add_argument("path", nargs="?", help="snapshot to read (default: %s)" % default_path())
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "from-pgn":
+            return 1 if pgn_to_archive(args.paths, args.output, args.rules)[1] else 0
+        if args.command == "to-pgn":
+            archive_to_pgn(args.paths, args.output)
+            return 0
+        start = time.perf_counter()
+        position, result = read(args.path or default_path())
+        elapsed = time.perf_counter() - start
+    except (OSError, ValueError) as error:
+        print(error)
+        return 1
+    print("%s\nrules %s, %d moves played, %d to redo, result %s, loaded in %.2fms" % (
+        position.fen(), position.rules.name(), len(position.history), len(position.redo_moves), result,
+        1000 * elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# Piece images at any square size, decoded and scaled as few times as possible.
+# The PNGs in White/ and Black/ are 512x512, so decoding and scaling them is the slow part of starting up.
+# A scaled sprite is kept in memory and in an on-disk cache keyed by the source file's mtime and size; the next
+# launch reads the small cached PNG instead. Sprites are only made when a square first needs them, and a decoded
+# source is kept so that resizing the window only re-scales it. Only the CACHED_SIZES sizes of each piece used
+# most recently stay on disk, so resizing the window doesn't leave a file behind for every size it went through.
+# Needs Pillow, but no display; Chess.py turns the images into Tk PhotoImages.
+
+import os
+
+from PIL import Image
+
+from .position import WHITE, EMPTY
+
+FILE_NAMES = ("blank", "p", "n", "b", "r", "q", "k")  # indexed by piece kind
+COLOR_DIRECTORIES = ("White", "Black")  # indexed by color
+CACHED_SIZES = 4  # sizes of each piece kept in the disk cache, the ones most recently used
+
+
+def default_cache_directory():
+    """:return where scaled sprites are kept between launches, under $XDG_CACHE_HOME (~/.cache by default)"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "anarchist-chess", "sprites")
+
+
+class SpriteCache:
+
+    def __init__(self, directory, cache_directory=None):
+        """:param directory: the folder holding the White and Black image folders
+        :param cache_directory: where scaled sprites are stored, default_cache_directory() by default;
+                                the cache is skipped if it can't be written to"""
+        self.directory = directory
+        self.cache_directory = cache_directory or default_cache_directory()
+        self.sources = {}  # (color, kind) -> decoded full size image
+        self.sprites = {}  # (color, kind, size) -> scaled image
+        self.decoded = 0  # number of source PNGs decoded, to see that the caches work
+        self.scaled = 0  # number of sprites scaled
+
+    def source_path(self, color, kind):
+        return os.path.join(self.directory, COLOR_DIRECTORIES[color], FILE_NAMES[kind] + ".png")
+
+    def sprite(self, color, kind, size):
+        """:return the image of a piece scaled to size x size pixels, as an RGBA PIL image
+
+        :param kind: piece kind, EMPTY for the blank image"""
+        key = (color, kind, size)
+        image = self.sprites.get(key)
+        if image is None:
+            image = self.load_cached(color, kind, size)
+            if image is None:
+                image = self.scale(color, kind, size)
+            self.sprites[key] = image
+        return image
+
+    def piece(self, piece, size):
+        """:return the image of a piece code (see anarchist_chess.position) at the given size"""
+        return self.sprite(WHITE if piece == EMPTY else piece >> 3, piece & 7, size)
+
+    def scale(self, color, kind, size):
+        """Scales the source image to size, decoding it only if no earlier size needed it, and writes the
+        result to the disk cache"""
+        source = self.sources.get((color, kind))
+        if source is None:
+            source = Image.open(self.source_path(color, kind)).convert("RGBA")
+            self.sources[(color, kind)] = source
+            self.decoded += 1
+        image = source.resize((size, size), Image.LANCZOS)
+        self.scaled += 1
+        self.store_cached(color, kind, size, image)
+        return image
+
+    def cache_path(self, color, kind, size):
+        """:return the file a sprite is cached in; the source's mtime and size are part of the name, so editing
+        a source image makes its old sprites miss"""
+        stat = os.stat(self.source_path(color, kind))
+        return os.path.join(self.cache_directory, "%s-%s-%d-%d-%d.png" % (
+            COLOR_DIRECTORIES[color].lower(), FILE_NAMES[kind], size, stat.st_mtime_ns, stat.st_size))
+
+    def load_cached(self, color, kind, size):
+        """:return the sprite from the disk cache, or None if it isn't there"""
+        try:
+            path = self.cache_path(color, kind, size)
+            with Image.open(path) as image:
+                image.load()
+        except (OSError, ValueError):  # not cached yet, or a damaged file that will be written again
+            return None
+        try:
+            os.utime(path)  # used now, so prune() keeps it over sizes not seen for longer
+        except OSError:
+            pass
+        return image
+
+    def store_cached(self, color, kind, size, image):
+        path = self.cache_path(color, kind, size)
+        try:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            temporary = "%s.%d.tmp" % (path, os.getpid())  # renamed into place, so a reader never sees half a file
+            image.save(temporary, "PNG")
+            os.replace(temporary, path)
+            self.prune(color, kind, path)
+        except OSError:  # a read-only home directory only costs the speed-up
+            pass
+
+    def prune(self, color, kind, path):
+        """Deletes the piece's cached sprites made from an older version of its source image, and all but the
+        CACHED_SIZES sizes used most recently
+
+        :param path: the sprite just written, see cache_path()"""
+        prefix = "%s-%s-" % (COLOR_DIRECTORIES[color].lower(), FILE_NAMES[kind])
+        version = os.path.basename(path)[len(prefix):].partition("-")[2]  # source mtime and size, ex: "17-9.png"
+        cached = []  # (when last used, file)
+        for name in os.listdir(self.cache_directory):
+            if not name.startswith(prefix) or name.endswith(".tmp"):  # another piece, or being written
+                continue
+            file = os.path.join(self.cache_directory, name)
+            if name[len(prefix):].partition("-")[2] != version:
+                os.remove(file)
+            else:
+                cached.append((os.stat(file).st_mtime_ns, file))
+        cached.sort(reverse=True)
+        for _used, file in cached[CACHED_SIZES:]:
+            if file != path:
+                os.remove(file)
@@ -0,0 +1,573 @@
+# Endgame tablebases: every position of a small endgame (KQK, KRK, KPK, KBNK, ...) solved, so the engine and the
+# hint in the window know the result and the distance to mate instead of searching for them.
+# A table is worked out backwards from the checkmates. First every position is scored once with the rules the game
+# is played with (legal_moves()), noting which positions each move leads to; moves that capture or promote lead to a
+# smaller table, generated before. Then the mates are spread to the positions leading to them, one ply at a time:
+# a position is won when some move reaches a lost one, and lost when every move reaches a won one.
+# Each table is a file per material signature: a header, then one byte per position, so a lookup works out the
+# position's index and reads one byte of a memory-mapped file.
+# Tables assume no castling rights, no en passant square and no fifty-move rule, and need the tables of the
+# endgames they can turn into. One side only may have pawns, so that no en passant square ever comes up.
+#
+# Usage:
+#     python -m anarchist_chess.tablebase KQK KRK KPK --processes 4     generates tables and those they need
+#     python -m anarchist_chess.tablebase KBNK --rules horsey-leg
+#     python -m anarchist_chess.tablebase --probe "8/8/8/4k3/8/8/8/4K2Q w - - 0 1"
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from .attacks import squares_of
+from .evaluate import PIECE_VALUES
+from .movegen import legal_moves
+from .position import WHITE, BLACK, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, Position, make_piece, \
+    move_name
+from .rules import Rules, HORSEY_JUMP, ANARCHIST
+
+MAX_PIECES = 4  # the tables grow 64 times with every piece; five would be hours of pure Python
+DEFAULT_TABLES = ("KQK", "KRK", "KPK")
+LETTERS = "KQRBNP"  # the order pieces are listed in a signature
+KINDS = {"K": KING, "Q": QUEEN, "R": ROOK, "B": BISHOP, "N": KNIGHT, "P": PAWN}
+CHUNK = 4096  # positions a worker scores per task
+
+# a table file starts with: magic, format version, number of pieces, signature, horsey rule
+HEADER = struct.Struct("<4sBB10s8s8x")
+MAGIC = b"ACTB"
+VERSION = 1
+
+# one byte per position: 0 is a draw, INVALID a position that can't happen (pieces on the same square, a pawn on
+# the first or last rank, the side not to move in check), anything else is the distance to mate in plies, plus one.
+# The winner mates on an odd ply, so the parity tells which side wins.
+DRAWN = 0
+INVALID = 255
+LONGEST = INVALID - 2  # most plies to mate a table can hold
+
+# what probe() reports, for the side to move
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+
+def _square_map(flip_file, flip_rank, transpose):
+    squares = []
+    for square in range(64):
+        file, rank = square & 7, square >> 3
+        if flip_file:
+            file = 7 - file
+        if flip_rank:
+            rank = 7 - rank
+        if transpose:
+            file, rank = rank, file
+        squares.append(rank * 8 + file)
+    return squares
+
+
+# a position means the same mirrored left to right, and without pawns also top to bottom and along the a1-h8
+# diagonal, so the white King is mirrored into a1-d1-d4 (10 squares), or with pawns onto files a-d (32 squares).
+# *_MAPS[king square] maps every square of a position with the white King there
+PAWN_MAPS = [_square_map((king & 7) > 3, False, False) for king in range(64)]
+PAWNLESS_MAPS = []
+for _king in range(64):
+    _flip_file, _flip_rank = (_king & 7) > 3, (_king >> 3) > 3
+    _mirrored = _square_map(_flip_file, _flip_rank, False)[_king]
+    PAWNLESS_MAPS.append(_square_map(_flip_file, _flip_rank, (_mirrored >> 3) > (_mirrored & 7)))
+del _king, _flip_file, _flip_rank, _mirrored
+PAWN_KING_SQUARES = sorted(set(PAWN_MAPS[king][king] for king in range(64)))
+PAWNLESS_KING_SQUARES = sorted(set(PAWNLESS_MAPS[king][king] for king in range(64)))
+
+
+def default_directory():
+    """:return where tables are kept, under $XDG_CACHE_HOME (~/.cache by default)"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "anarchist-chess", "tablebases")
+
+
+def file_name(signature, horsey=HORSEY_JUMP):
+    """:return the file a table is stored in; the horsey rule changes every table with a knight, so it is kept apart"""
+    return signature + ("" if horsey == HORSEY_JUMP else "-horsey-" + horsey) + ".tb"
+
+
+def split_signature(signature):
+    """:return the (white, black) pieces of a signature, ex: \"KRKP\" -> (\"KR\", \"KP\")"""
+    if not signature.startswith("K") or signature.count("K") != 2 or any(c not in KINDS for c in signature):
+        raise ValueError("a signature lists each side's pieces starting with its King, ex: KBNK, not %r" % signature)
+    second = signature.index("K", 1)
+    return signature[:second], signature[second:]
+
+
+def _strength(pieces):
+    return sum(PIECE_VALUES[KINDS[letter]] for letter in pieces), len(pieces), [-LETTERS.index(c) for c in pieces]
+
+
+def canonical(white, black):
+    """:return (signature, Boolean value for whether the colors were swapped): the stronger side is put first"""
+    white = "".join(sorted(white, key=LETTERS.index))
+    black = "".join(sorted(black, key=LETTERS.index))
+    if _strength(black) > _strength(white):
+        return black + white, True
+    return white + black, False
+
+
+def insufficient(white, black):
+    """:return Boolean value for whether the material can't mate, as Position.insufficient_material() judges it"""
+    pieces = white[1:] + black[1:]
+    return not any(letter in "QRP" for letter in pieces) and len(pieces) <= 1
+
+
+def dependencies(signature):
+    """:return set of the signatures a capture or a promotion turns the endgame into, drawn ones left out"""
+    sides = split_signature(signature)
+    found = set()
+    for side in (0, 1):
+        pieces = sides[side]
+        for index in range(1, len(pieces)):
+            changes = [pieces[:index] + pieces[index + 1:]]  # captured
+            if pieces[index] == "P":
+                changes += [pieces[:index] + promoted + pieces[index + 1:] for promoted in "QRBN"]
+            for changed in changes:
+                white, black = (changed, sides[1]) if side == 0 else (sides[0], changed)
+                if not insufficient(white, black):
+                    found.add(canonical(white, black)[0])
+    return found
+
+
+def generation_order(signatures):
+    """:return the signatures and every table they need, each after the tables it needs"""
+    needed = set()
+    waiting = [canonical(*split_signature(signature))[0] for signature in signatures]
+    while waiting:
+        signature = waiting.pop()
+        if signature not in needed:
+            needed.add(signature)
+            waiting.extend(dependencies(signature))
+    # a capture takes a piece off and a promotion takes a pawn off, so either way the table needed comes first
+    return sorted(needed, key=lambda signature: (len(signature), signature.count("P"), signature))
+
+
+def material_signature(position):
+    """:return (signature, Boolean value for whether the colors are swapped in the table) of a position"""
+    sides = []
+    for color in (WHITE, BLACK):
+        sides.append("".join(letter * bin(position.pieces[make_piece(color, KINDS[letter])]).count("1")
+                             for letter in LETTERS))
+    return canonical(*sides)
+
+
+def decode_value(value):
+    """:return (WIN, DRAW or LOSS for the side to move, plies to mate) for a table byte, None for INVALID"""
+    if value == INVALID:
+        return None
+    if value == DRAWN:
+        return DRAW, 0
+    plies = value - 1
+    return (WIN if plies % 2 else LOSS), plies
+
+
+class Layout:
+    """How the positions of one signature are numbered: side to move, then the square of each piece in signature
+    order, with the white King's square counted among those left after mirroring"""
+
+    def __init__(self, signature):
+        white, black = split_signature(signature)
+        if "P" in white and "P" in black:
+            raise ValueError("%s: only one side may have pawns, or en passant would have to be in the index" %
+                             signature)
+        if len(signature) > MAX_PIECES:
+            raise ValueError("%s: tables go up to %d pieces" % (signature, MAX_PIECES))
+        self.signature = signature
+        self.codes = [make_piece(WHITE, KINDS[letter]) for letter in white] + \
+                     [make_piece(BLACK, KINDS[letter]) for letter in black]
+        self.groups = []  # (piece code, how many of them), in signature order
+        for code in self.codes:
+            if self.groups and self.groups[-1][0] == code:
+                self.groups[-1] = (code, self.groups[-1][1] + 1)
+            else:
+                self.groups.append((code, 1))
+        self.pawns = "P" in signature
+        self.maps = PAWN_MAPS if self.pawns else PAWNLESS_MAPS
+        self.king_squares = PAWN_KING_SQUARES if self.pawns else PAWNLESS_KING_SQUARES
+        self.king_index = dict((square, index) for index, square in enumerate(self.king_squares))
+        self.size = 2 * len(self.king_squares) * 64 ** (len(self.codes) - 1)
+
+    def index(self, squares, side):
+        """:param squares: square of each piece, in the order of self.codes"""
+        mapping = self.maps[squares[0]]
+        index = side * len(self.king_squares) + self.king_index[mapping[squares[0]]]
+        for square in squares[1:]:
+            index = index * 64 + mapping[square]
+        return index
+
+    def decode(self, index):
+        """:return (squares, side) of an index, see index()"""
+        squares = []
+        for _ in range(len(self.codes) - 1):
+            squares.append(index & 63)
+            index >>= 6
+        squares.append(self.king_squares[index % len(self.king_squares)])
+        squares.reverse()
+        return squares, index // len(self.king_squares)
+
+    def position_index(self, position, flipped=False):
+        """:return the index of a position with this material
+
+        :param flipped: the position has the colors the other way round from the table, see material_signature()"""
+        squares = []
+        pieces = position.pieces
+        for code, count in self.groups:
+            if flipped:
+                squares.extend(square ^ 56 for square in squares_of(pieces[code ^ 8]))
+            else:
+                squares.extend(squares_of(pieces[code]))
+        return self.index(squares, position.side ^ flipped)
+
+
+class Table:
+    """A generated table file, memory-mapped"""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, pieces, signature, horsey = HEADER.unpack_from(self.data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("%s is not a version %d table" % (path, VERSION))
+            self.layout = Layout(signature.rstrip(b"\0").decode("ascii"))
+            self.horsey = horsey.rstrip(b"\0").decode("ascii")
+            if len(self.data) != HEADER.size + self.layout.size:
+                raise ValueError("%s is cut short" % path)
+        except (ValueError, struct.error):
+            self.data.close()
+            raise
+
+    def value(self, index):
+        return self.data[HEADER.size + index]
+
+    def close(self):
+        self.data.close()
+
+
+class Tablebases:
+    """The tables of a directory, opened as they are first needed"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_directory()
+        self.tables = {}  # (signature, horsey) -> Table, or None if there is no such table
+        try:
+            self.files = set(os.listdir(self.directory))
+        except OSError:
+            self.files = set()
+
+    def table(self, signature, horsey=HORSEY_JUMP):
+        """:return the Table, or None if it hasn't been generated"""
+        key = (signature, horsey)
+        if key not in self.tables:
+            name = file_name(signature, horsey)
+            table = None
+            if name in self.files:
+                try:
+                    table = Table(os.path.join(self.directory, name))
+                except (OSError, ValueError):  # damaged, or written by a different version
+                    pass
+            self.tables[key] = table
+        return self.tables[key]
+
+    def probe(self, position):
+        """:return (WIN, DRAW or LOSS for the side to move, plies to mate), or None if no table covers the
+        position; a position already mated is (LOSS, 0)"""
+        if position.castling or position.ep_square is not None or bin(position.occupied).count("1") > MAX_PIECES:
+            return None
+        if position.insufficient_material():
+            return DRAW, 0
+        if not self.files:
+            return None
+        signature, flipped = material_signature(position)
+        table = self.table(signature, position.rules.horsey)
+        if table is None:
+            return None
+        return decode_value(table.value(table.layout.position_index(position, flipped)))
+
+    def best_move(self, position):
+        """:return (move, (result, plies)) with the move that wins quickest, holds the draw, or loses slowest,
+        or None if no table covers the position or it has no legal moves"""
+        result = self.probe(position)
+        moves = legal_moves(position)
+        if result is None or not moves:
+            return None
+        best, best_rank = None, None
+        for move in moves:
+            position.make_move(move)
+            try:
+                reply = self.probe(position)
+            finally:
+                position.unmake_move()
+            if reply is None:
+                return None
+            outcome, plies = reply
+            rank = (2, -plies) if outcome == LOSS else (1, 0) if outcome == DRAW else (0, plies)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best, result
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+
+# flags of a scored position
+INVALID_FLAG = 1
+MATED_FLAG = 2
+DRAW_FLAG = 4  # stalemate, or a move leads to a drawn smaller table
+
+# ((directory, signature, horsey), Layout, Tablebases, Position) of the table this worker process is scoring
+_scoring = None
+
+
+def _score_chunk(task):
+    """Runs in a worker: plays every legal move of positions start to stop - 1 of a table.
+
+    :param task: (directory, signature, horsey, start, stop)
+    :return (start, moves into the table, soonest win, latest loss and flags of each position, then the index
+             reached by every move staying in the table, position by position)"""
+    global _scoring
+    directory, signature, horsey, start, stop = task
+    if _scoring is None or _scoring[0] != (directory, signature, horsey):
+        # the smaller tables are opened again for every new table, they were written since the last one
+        position = Position("8/8/8/8/8/8/8/8 w - - 0 1", Rules(horsey=horsey))
+        _scoring = ((directory, signature, horsey), Layout(signature), Tablebases(directory), position)
+    layout, tablebases, position = _scoring[1:]
+
+    size = stop - start
+    counts = array("H", bytes(2 * size))  # moves staying in the table
+    win_at = array("B", bytes(size))  # plies to the quickest mate through a smaller table, 0 if none
+    lose_at = array("B", bytes(size))  # plies to the slowest mate against us through a smaller table
+    flags = array("B", bytes(size))
+    children = array("I")
+    codes = layout.codes
+    placed = list(squares_of(position.occupied))  # left over from the previous chunk
+    for index in range(start, stop):
+        offset = index - start
+        squares, side = layout.decode(index)
+        if len(set(squares)) < len(squares) or \
+                any(code & 7 == PAWN and square >> 3 in (0, 7) for code, square in zip(codes, squares)):
+            flags[offset] = INVALID_FLAG
+            continue
+        for square in placed:
+            position.remove_piece(square)
+        for code, square in zip(codes, squares):
+            position.put_piece(square, code)
+        placed = squares
+        position.side = side
+        position.check_cache = None
+        if position.in_check(1 - side):
+            flags[offset] = INVALID_FLAG
+            continue
+        moves = legal_moves(position)
+        if not moves:
+            flags[offset] = MATED_FLAG if position.in_check() else DRAW_FLAG
+            continue
+        for move in moves:
+            record = position.make_move(move)
+            try:
+                if record[1] == EMPTY and not move >> 12:
+                    children.append(layout.position_index(position))
+                    counts[offset] += 1
+                    continue
+                # the material changed, the smaller table knows how that ends
+                reply = tablebases.probe(position)
+                if reply is None:
+                    raise RuntimeError("%s needs the %s table, generate it first" % (
+                        signature, material_signature(position)[0]))
+                outcome, plies = reply
+                if outcome == LOSS:
+                    win_at[offset] = min(win_at[offset] or INVALID, plies + 1)
+                elif outcome == WIN:
+                    lose_at[offset] = max(lose_at[offset], plies + 1)
+                else:
+                    flags[offset] = DRAW_FLAG  # a move to a draw, so this side never has to lose
+            finally:
+                position.unmake_move()
+    return start, counts, win_at, lose_at, flags, children
+
+
+def solve(size, counts, win_at, lose_at, flags, children):
+    """Spreads the results back from the mates, ply by ply.
+
+    :param children: the index each move in the table reaches, in index order of the positions moving, so
+                     counts tells which position each move is from
+    :return bytearray of table bytes, see DRAWN and INVALID"""
+    # predecessors[first[child]:first[child + 1]] are the positions with a move to child
+    first = array("I", bytes(4 * (size + 1)))
+    for child in children:
+        first[child + 1] += 1
+    for index in range(size):
+        first[index + 1] += first[index]
+    filled = first[:]
+    predecessors = array("I", bytes(4 * len(children)))
+    move = 0
+    for parent in range(size):
+        for child in children[move:move + counts[parent]]:
+            predecessors[filled[child]] = parent
+            filled[child] += 1
+        move += counts[parent]
+    del filled
+
+    values = bytearray(size)
+    remaining = counts  # moves of each position not yet known to lose, counted down below
+    # levels[plies]: positions that may be decided with that many plies to mate; an odd number of plies is a win
+    levels = {}
+    for index in range(size):
+        flag = flags[index]
+        if flag & INVALID_FLAG:
+            values[index] = INVALID
+        elif flag & MATED_FLAG:
+            levels.setdefault(0, []).append(index)
+        elif win_at[index]:
+            levels.setdefault(win_at[index], []).append(index)
+        elif not remaining[index] and lose_at[index] and not flag & DRAW_FLAG:
+            levels.setdefault(lose_at[index], []).append(index)
+
+    plies = 0
+    while levels:
+        decided = levels.pop(plies, ())
+        winning = plies % 2 == 1
+        for index in decided:
+            if values[index]:  # decided sooner by another move
+                continue
+            if plies > LONGEST:
+                raise OverflowError("mate in more than %d plies doesn't fit in a byte" % LONGEST)
+            values[index] = plies + 1
+            for parent in predecessors[first[index]:first[index + 1]]:
+                if values[parent]:
+                    continue
+                if not winning:  # the parent wins by moving here
+                    levels.setdefault(plies + 1, []).append(parent)
+                    continue
+                remaining[parent] -= 1
+                if not remaining[parent] and not flags[parent] & DRAW_FLAG and not win_at[parent]:
+                    levels.setdefault(max(plies + 1, lose_at[parent]), []).append(parent)
+        plies += 1
+    return values
+
+
+def generate_table(signature, directory, horsey, pool, processes, out=sys.stdout):
+    """Generates one table, whose smaller tables must exist already, and writes it to directory
+
+    :return dict of numbers about the table"""
+    layout = Layout(signature)
+    start = time.perf_counter()
+    size = layout.size
+    counts = array("H", bytes(2 * size))
+    win_at = array("B", bytes(size))
+    lose_at = array("B", bytes(size))
+    flags = array("B", bytes(size))
+    children = array("I")
+    chunk = max(1, min(CHUNK, size // (4 * processes) + 1))
+    tasks = [(directory, signature, horsey, first, min(first + chunk, size)) for first in range(0, size, chunk)]
+    for first, *parts in pool.imap(_score_chunk, tasks):  # in order, so the moves line up with counts
+        last = first + len(parts[0])
+        counts[first:last], win_at[first:last], lose_at[first:last], flags[first:last] = parts[:4]
+        children.extend(parts[4])
+    scored = time.perf_counter()
+
+    values = solve(size, counts, win_at, lose_at, flags, children)
+    path = os.path.join(directory, file_name(signature, horsey))
+    temporary = "%s.%d.tmp" % (path, os.getpid())  # renamed into place, so a reader never sees half a table
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(layout.codes), signature.encode("ascii"), horsey.encode("ascii")))
+        file.write(values)
+    os.replace(temporary, path)
+    elapsed = time.perf_counter() - start
+
+    stats = {"signature": signature, "positions": size, "seconds": round(elapsed, 2),
+             "scoring_seconds": round(scored - start, 2), "moves": len(children), "invalid": values.count(INVALID),
+             "draws": values.count(DRAWN), "longest_mate": 0}
+    wins = losses = 0
+    for value in range(1, INVALID):
+        found = values.count(value)
+        if found:
+            if value % 2 == 0:  # plies + 1, so an even byte is an odd number of plies, a win
+                wins += found
+            else:
+                losses += found
+            stats["longest_mate"] = value - 1
+    stats["wins"], stats["losses"] = wins, losses
+    out.write("%-6s %9d positions  %7.1fs (%.1fs scoring on %d processes)  %6.0f positions/sec  "
+              "wins %d  draws %d  losses %d  longest mate %d plies\n" % (
+                  signature, size, elapsed, scored - start, processes, size / elapsed, wins, stats["draws"],
+                  losses, stats["longest_mate"]))
+    out.flush()
+    return stats
+
+
+def generate(signatures, directory=None, rules=ANARCHIST, processes=None, force=False, out=sys.stdout):
+    """Generates the tables and every smaller table they need, skipping those already there unless force
+
+    :return list of the stats of each table generated, see generate_table()"""
+    directory = directory or default_directory()
+    os.makedirs(directory, exist_ok=True)
+    processes = processes or os.cpu_count() or 1
+    generated = []
+    import multiprocessing  # only generating needs it, and probing tables is part of the engine's startup
+    pool = multiprocessing.Pool(processes)
+    try:
+        for signature in generation_order(signatures):
+            if not force and os.path.exists(os.path.join(directory, file_name(signature, rules.horsey))):
+                out.write("%-6s already generated\n" % signature)
+                continue
+            generated.append(generate_table(signature, directory, rules.horsey, pool, processes, out))
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return generated
+
+
+def describe(result, side):
+    """:return text such as \"white mates in 7\" for a probe() result with side to move"""
+    outcome, plies = result
+    if outcome == DRAW:
+        return "draw"
+    winner = side if outcome == WIN else 1 - side
+    return "%s mates in %d" % ("white" if winner == WHITE else "black", (plies + 1) // 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.tablebase",
+                                     description="Generates and probes endgame tablebases.")
+    parser.add_argument("signatures", nargs="*", help="tables to generate, ex: KQK KBNK (default: %s)" %
+                                                      " ".join(DEFAULT_TABLES))
+    parser.add_argument("--directory", help="where the tables are kept (default: %s)" % default_directory())
+    parser.add_argument("--rules", type=Rules.parse, default=ANARCHIST,
+                        help="kinks to play with; only the horsey rule changes the tables")
+    parser.add_argument("--processes", type=int, help="worker processes, all cores by default")
+    parser.add_argument("--force", action="store_true", help="generate tables again even if they exist")
+    parser.add_argument("--probe", metavar="FEN", help="look a position up instead of generating")
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        position = Position(args.probe, args.rules)
+        tablebases = Tablebases(args.directory)
+        found = tablebases.best_move(position)
+        if found is None:
+            print("no table covers this position")
+            return 1
+        move, result = found
+        print("%s, best move %s" % (describe(result, position.side), move_name(move)))
+        return 0
+
+    try:
+        generate(args.signatures or DEFAULT_TABLES, args.directory, args.rules, args.processes, args.force)
+    except ValueError as error:  # a signature that isn't one, or too big
+        parser.error(str(error))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
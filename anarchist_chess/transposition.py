@@ -0,0 +1,89 @@
+# Transposition table: remembers search results by Zobrist key so positions reached by different move orders
+# are searched once. Entries live in two flat arrays of 64-bit numbers, so the memory used is fixed up front.
+
+from array import array
+
+# bound types: how the stored score relates to the true score
+EXACT = 0
+LOWER = 1  # the search failed high, the true score is at least this
+UPPER = 2  # the search failed low, the true score is at most this
+
+BYTES_PER_ENTRY = 16  # one 64-bit key plus one 64-bit packed entry
+BUCKET = 2  # entries a key may go in; the table picks which one to overwrite
+SCORE_OFFSET = 1 << 31  # scores are stored unsigned in 32 bits
+
+# layout of a packed entry: move in bits 0-14, depth 15-22, bound 23-24, age 25-31, score 32-63
+DEPTH_SHIFT = 15
+BOUND_SHIFT = 23
+AGE_SHIFT = 25
+SCORE_SHIFT = 32
+AGES = 128
+
+
+class TranspositionTable:
+
+    def __init__(self, megabytes=16):
+        """Creates an empty table.
+
+        :param megabytes: memory cap; the number of entries is the largest power of two that fits"""
+        entries = BUCKET
+        while entries * 2 * BYTES_PER_ENTRY <= megabytes * 1024 * 1024:
+            entries *= 2
+        self.size = entries
+        self.mask = entries // BUCKET - 1  # key & mask picks the bucket
+        self.keys = array("Q", bytes(8 * entries))
+        self.data = array("Q", bytes(8 * entries))  # packed entries, see the layout above
+        self.age = 0  # bumped for every new search, so entries from old searches are replaced first
+
+    def clear(self):
+        self.keys = array("Q", bytes(8 * self.size))
+        self.data = array("Q", bytes(8 * self.size))
+        self.age = 0
+
+    def new_search(self):
+        """Marks the entries stored so far as belonging to an older search"""
+        self.age = (self.age + 1) % AGES
+
+    def probe(self, key):
+        """:return (move, depth, bound, score) stored for the key, or None"""
+        index = (key & self.mask) * BUCKET
+        keys = self.keys
+        for slot in range(index, index + BUCKET):
+            if keys[slot] == key:
+                data = self.data[slot]
+                return data & 0x7FFF, data >> DEPTH_SHIFT & 0xFF, data >> BOUND_SHIFT & 3, \
+                    (data >> SCORE_SHIFT) - SCORE_OFFSET
+        return None
+
+    def store(self, key, move, depth, bound, score):
+        """Stores a search result.
+
+        The entry for the same key is overwritten if there is one. Otherwise the entry replaced is the one
+        least worth keeping: left over from an older search first, then the one searched least deep."""
+        index = (key & self.mask) * BUCKET
+        keys = self.keys
+        data = self.data
+        victim = index
+        worst = None
+        for slot in range(index, index + BUCKET):
+            if keys[slot] == key or keys[slot] == 0:
+                victim = slot
+                break
+            old = data[slot]
+            # entries of the current search are worth 256 depths more than old ones
+            worth = (old >> DEPTH_SHIFT & 0xFF) + (256 if (old >> AGE_SHIFT) % AGES == self.age else 0)
+            if worst is None or worth < worst:
+                worst = worth
+                victim = slot
+        if keys[victim] == key and not move:
+            move = data[victim] & 0x7FFF  # keep the best move we already knew about
+        keys[victim] = key
+        data[victim] = move | max(0, min(depth, 255)) << DEPTH_SHIFT | bound << BOUND_SHIFT | \
+            self.age << AGE_SHIFT | (score + SCORE_OFFSET) << SCORE_SHIFT
+
+    def usage(self):
+        """:return how full the table is, as a fraction of the entries used by the current search"""
+        sample = min(self.size, 4000)
+        used = sum(1 for slot in range(sample)
+                   if self.keys[slot] and (self.data[slot] >> AGE_SHIFT) % AGES == self.age)
+        return used / float(sample)
@@ -0,0 +1,280 @@
+# The computer opponent as a UCI engine, for tournament managers, GUIs and test harnesses to drive over stdin/stdout.
+# The process stays up for as many position/go commands as it is sent and keeps its transposition table between
+# them; a search runs in a thread of its own, so "stop" and "isready" are answered while it thinks. Commands
+# that change the game or the options wait for a running search to finish first.
+# Nothing here needs Tk. Startup is kept short by importing only the rules and the engine before "uciok"; the
+# opening book and the endgame tables are opened when the first "isready" or "go" comes in.
+# The kinks are set with the Rules option, ex: "setoption name Rules value b1,forced-ep". Castling with b1 is
+# sent as the King's move, e1b1.
+#
+# Usage:
+#     python -m anarchist_chess.uci                                 speak UCI on stdin/stdout
+#     python -m anarchist_chess.uci --bench-startup --runs 20       time starting up until "readyok"
+
+import argparse
+import sys
+import threading
+import time
+
+from .engine import Searcher, MATE, MAX_DEPTH
+from .movegen import legal_moves
+from .position import WHITE, START_FEN, Position, move_name, parse_move
+from .rules import Rules, ANARCHIST
+from .transposition import TranspositionTable
+
+NAME = "Anarchist Chess"
+AUTHOR = "Jerry Li"
+DEFAULT_HASH_MB = 32
+MAX_HASH_MB = 4096
+MOVES_TO_GO = 30  # moves the remaining time is shared out over when the GUI doesn't say
+MOVE_OVERHEAD = 0.05  # seconds kept back from every move for the GUI and the pipe
+STARTUP_LIMIT_MS = 250  # --bench-startup fails when starting up takes longer than this
+
+
+def think_time(side, wtime=None, btime=None, winc=0, binc=0, movestogo=None, movetime=None):
+    """:return seconds to think for with the clock the GUI sent (times in milliseconds), or None for no limit"""
+    if movetime is not None:
+        return max(0.01, movetime / 1000.0 - MOVE_OVERHEAD)
+    remaining = wtime if side == WHITE else btime
+    if remaining is None:
+        return None
+    increment = (winc if side == WHITE else binc) or 0
+    share = remaining / (movestogo or MOVES_TO_GO) + increment * 3 // 4
+    return max(0.01, min(share, remaining / 2) / 1000.0 - MOVE_OVERHEAD)
+
+
+def uci_score(score):
+    """:return the score as UCI writes it, ex: \"cp 35\" or \"mate -3\" (moves, not plies)"""
+    if score >= MATE - MAX_DEPTH:
+        return "mate %d" % ((MATE - score + 1) // 2)
+    if score <= -(MATE - MAX_DEPTH):
+        return "mate %d" % -((MATE + score + 1) // 2)
+    return "cp %d" % score
+
+
+class Engine:
+    """One UCI session: the game the GUI set up, the options, and the search running, if any"""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.write_lock = threading.Lock()  # the search thread writes too
+        self.rules = ANARCHIST
+        self.position = Position(rules=self.rules)
+        self.hash_mb = DEFAULT_HASH_MB
+        self.own_book = True
+        self.use_tablebases = True
+        self.searcher = None  # made when first needed, see ready()
+        self.thread = None
+        self.stop_event = None
+
+    def write(self, line):
+        with self.write_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def ready(self):
+        """Makes the searcher, with the book and tables if they are wanted and exist; they are looked for here
+        rather than at startup so that "uci" is answered at once"""
+        if self.searcher is None:
+            book = tablebases = None
+            if self.own_book:
+                from .book import Book
+                book = Book.open()
+            if self.use_tablebases:
+                from .tablebase import Tablebases
+                tablebases = Tablebases()
+            self.searcher = Searcher(TranspositionTable(self.hash_mb), tablebases=tablebases, book=book)
+        return self.searcher
+
+    def handle(self, line):
+        """Carries out one command
+
+        :return False once the GUI says quit"""
+        words = line.split()
+        if not words:
+            return True
+        command, arguments = words[0], words[1:]
+        if command == "uci":
+            self.write("id name " + NAME)
+            self.write("id author " + AUTHOR)
+            self.write("option name Hash type spin default %d min 1 max %d" % (DEFAULT_HASH_MB, MAX_HASH_MB))
+            self.write("option name OwnBook type check default true")
+            self.write("option name Tablebases type check default true")
+            self.write("option name Rules type string default " + ANARCHIST.name())
+            self.write("uciok")
+        elif command == "isready":
+            self.ready()
+            self.write("readyok")
+        elif command == "setoption":
+            self.set_option(arguments)
+        elif command == "ucinewgame":
+            self.wait()
+            if self.searcher is not None:
+                self.searcher = Searcher(self.searcher.tt, tablebases=self.searcher.tablebases,
+                                         book=self.searcher.book)
+                self.searcher.tt.clear()
+        elif command == "position":
+            self.wait()
+            self.set_position(arguments)
+        elif command == "go":
+            self.wait()
+            self.go(arguments)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            return False
+        elif command == "d":  # not UCI, but handy when typing at it
+            self.write(self.position.fen())
+        else:
+            self.write("info string unknown command " + command)
+        return True
+
+    def set_option(self, arguments):
+        """Reads \"name <name> value <value>\"; names may have spaces in them"""
+        text = " ".join(arguments)
+        name, _, value = text.partition(" value ")
+        name = name[len("name "):].strip().lower() if name.startswith("name ") else name.strip().lower()
+        value = value.strip()
+        self.wait()
+        try:
+            if name == "hash":
+                self.hash_mb = max(1, min(MAX_HASH_MB, int(value)))
+            elif name == "ownbook":
+                self.own_book = value.lower() == "true"
+            elif name == "tablebases":
+                self.use_tablebases = value.lower() == "true"
+            elif name == "rules":
+                self.rules = Rules.parse(value)
+                self.position = Position(rules=self.rules)
+            else:
+                self.write("info string unknown option " + name)
+                return
+        except ValueError as error:
+            self.write("info string bad value for %s: %s" % (name, error))
+            return
+        self.searcher = None  # made again with the new options
+
+    def set_position(self, arguments):
+        """Reads \"startpos [moves ...]\" or \"fen <FEN> [moves ...]\""""
+        if "moves" in arguments:
+            split = arguments.index("moves")
+            setup, moves = arguments[:split], arguments[split + 1:]
+        else:
+            setup, moves = arguments, []
+        try:
+            if setup[:1] == ["fen"]:
+                position = Position(" ".join(setup[1:]), self.rules)
+            else:
+                position = Position(START_FEN, self.rules)
+            for name in moves:
+                move = parse_move(name)
+                if move not in legal_moves(position):
+                    raise ValueError("illegal move " + name)
+                position.make_move(move)
+        except (ValueError, IndexError) as error:
+            self.write("info string bad position: %s" % error)
+            return
+        self.position = position
+
+    def go(self, arguments):
+        """Reads the search limits and starts searching in a thread; it writes bestmove when it is done"""
+        limits = {}
+        infinite = False
+        words = iter(arguments)
+        for word in words:
+            if word == "infinite":
+                infinite = True
+            elif word in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+                try:
+                    limits[word] = int(next(words))
+                except (StopIteration, ValueError):
+                    self.write("info string %s needs a number" % word)
+                    return
+        depth = max(1, min(MAX_DEPTH, limits.pop("depth", MAX_DEPTH)))
+        time_limit = None if infinite else think_time(self.position.side, **limits)
+        searcher = self.ready()
+        position = self.position.copy()
+        stop = threading.Event()
+        start = time.perf_counter()
+
+        def report(depth, score, move, nodes):
+            elapsed = time.perf_counter() - start
+            self.write("info depth %d score %s nodes %d nps %d time %d pv %s" % (
+                depth, uci_score(score), nodes, nodes / elapsed if elapsed else 0, 1000 * elapsed, move_name(move)))
+
+        def think():
+            move = searcher.search(position, depth, time_limit, stop, report)[0]
+            self.write("bestmove " + (move_name(move) if move is not None else "0000"))
+
+        self.stop_event = stop
+        self.thread = threading.Thread(target=think, name="search", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the running search, if any, and waits for it to write its bestmove"""
+        if self.thread is not None:
+            self.stop_event.set()
+        self.wait()
+
+    def wait(self):
+        """Waits for the running search, if any, to finish on its own; a GUI sends the next position and go after
+        bestmove, but a script piping commands in doesn't wait"""
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            self.stop_event = None
+
+    def run(self, lines=sys.stdin):
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop()
+
+
+def bench_startup(runs, limit_ms=STARTUP_LIMIT_MS, out=sys.stdout):
+    """Starts the engine runs times and times how long it takes to answer \"readyok\", next to a bare Python
+
+    :return the median startup in milliseconds"""
+    import statistics
+    import subprocess
+
+    def timed(command, script):
+        times = []
+        for _run in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, input=script, stdout=subprocess.PIPE, check=True, universal_newlines=True)
+            times.append(1000 * (time.perf_counter() - start))
+        return statistics.median(times), min(times)
+
+    steps = (("bare python", [sys.executable, "-c", "pass"], ""),
+             ("import anarchist_chess.uci", [sys.executable, "-c", "import anarchist_chess.uci"], ""),
+             ("uci, isready, quit", [sys.executable, "-m", "anarchist_chess.uci"], "uci\nisready\nquit\n"))
+    medians = {}
+    for name, command, script in steps:
+        medians[name], fastest = timed(command, script)
+        out.write("%-28s median %7.1fms  fastest %7.1fms\n" % (name, medians[name], fastest))
+    startup = medians["uci, isready, quit"]
+    out.write("startup %.1fms over a bare python, limit %dms\n" % (startup - medians["bare python"], limit_ms))
+    out.flush()
+    return startup - medians["bare python"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m anarchist_chess.uci",
+                                     description="Plays over the UCI protocol on stdin/stdout.")
+    parser.add_argument("--bench-startup", action="store_true",
+                        help="time starting the engine up to readyok instead of playing")
+    parser.add_argument("--runs", type=int, default=10, help="startups to time with --bench-startup")
+    parser.add_argument("--limit", type=float, default=STARTUP_LIMIT_MS,
+                        help="milliseconds of startup --bench-startup allows before it fails")
+    args = parser.parse_args(argv)
+
+    if args.bench_startup:
+        return 1 if bench_startup(max(1, args.runs), args.limit) > args.limit else 0
+    Engine().run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+# Zobrist keys: a random 64-bit number for each feature of a position, XORed together into one key.
+# Playing a move only flips the features it touches, so Position keeps its key up to date move by move.
+# The numbers come from a fixed seed, so keys are the same in every process and can be stored in files.
+
+import random
+
+_random = random.Random(0x6A7279)
+
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)] for _ in range(16)]  # [piece code][square]
+for _unused in (0, 7, 8, 15):  # codes that are not pieces never get hashed
+    PIECE_KEYS[_unused] = [0] * 64
+SIDE_KEY = _random.getrandbits(64)  # XORed in when black is to move
+CASTLING_KEYS = [_random.getrandbits(64) for _ in range(16)]  # [castling rights bits]
+CASTLING_KEYS[0] = 0
+EP_KEYS = [_random.getrandbits(64) for _ in range(8)]  # [file of the en passant square]
+del _random, _unused
+
+
+def compute_key(position):
+    """Builds the key of a position from scratch; Position keeps its own up to date, this is for checking it"""
+    key = 0
+    for square, piece in enumerate(position.board):
+        key ^= PIECE_KEYS[piece][square]
+    if position.side:
+        key ^= SIDE_KEY
+    key ^= CASTLING_KEYS[position.castling]
+    if position.ep_square is not None:
+        key ^= EP_KEYS[position.ep_square & 7]
+    return key
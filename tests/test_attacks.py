@@ -0,0 +1,17 @@
+from anarchist_chess.attacks import KNIGHT_LEGS, horsey_turn
+from anarchist_chess.position import parse_square
+
+
+def test_horsey_turn():
+    b1, g1 = parse_square("b1"), parse_square("g1")
+    assert horsey_turn(b1, parse_square("c3"), 2) == parse_square("b3")
+    assert horsey_turn(b1, parse_square("c3"), 1) == parse_square("b2")
+    assert horsey_turn(g1, parse_square("e2"), 2) == parse_square("e1")
+    assert horsey_turn(g1, parse_square("e2"), 1) == parse_square("f1")
+
+
+def test_the_leg_horsey_turns_on_its_leg_square():
+    for square in range(64):
+        for leg, targets in KNIGHT_LEGS[square]:
+            for target in [target for target in range(64) if targets >> target & 1]:
+                assert horsey_turn(square, target, 1) == leg
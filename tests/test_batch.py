@@ -0,0 +1,37 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from anarchist_chess.batch import Batch, castles, sample  # noqa: E402
+from anarchist_chess.position import Position, encode_move  # noqa: E402
+from anarchist_chess.rules import Rules  # noqa: E402
+
+RULES = ["standard", "b1", "b1,forced-ep", "b1,horsey-leg", "castle-through-check", "b1,castle-through-check"]
+
+
+@pytest.mark.parametrize("name", RULES)
+def test_batch_agrees_with_position(name):
+    rules = Rules.parse(name)
+    positions, moves = sample(2000, rules, seed=1)
+    batch = Batch.from_positions(positions, rules)
+    assert list(batch.in_check()) == [position.in_check() for position in positions]
+    assert list(batch.legal(moves)) == [position.is_legal(move & 63, move >> 6 & 63)
+                                        for position, move in zip(positions, moves)]
+
+
+@pytest.mark.parametrize("name", RULES)
+def test_castles_follow_the_rules(name):
+    rules = Rules.parse(name)
+    table = castles(rules)
+    assert sorted(table) == sorted(rules.castle_targets[0] + rules.castle_targets[1])
+    for to, (color, _right, rook_from, rook_to, _home) in table.items():
+        assert rules.castle_rooks[color][to] == (rook_from, rook_to)
+
+    fens = ["r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1",
+            "r3k2r/8/8/8/8/8/8/R3K2R w Qk - 0 1", "r3k2r/8/8/8/8/5q2/8/R3K2R w KQkq - 0 1",
+            "r3k2r/8/8/8/4r3/8/8/R3K2R w KQkq - 0 1"]
+    positions = [Position(fen, rules) for fen in fens for _to in range(64)]
+    moves = [encode_move(4 if position.side == 0 else 60, to) for position, to in zip(positions, list(range(64)) * 5)]
+    batch = Batch.from_positions(positions, rules)
+    assert list(batch.legal(moves)) == [position.is_legal(move & 63, move >> 6 & 63)
+                                        for position, move in zip(positions, moves)]
@@ -0,0 +1,85 @@
+import io
+import random
+
+import pytest
+
+from anarchist_chess import book
+from anarchist_chess.book import Book, build
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.pgn import Game
+from anarchist_chess.position import Position, move_name, parse_move
+
+GAMES = ('[Result "1-0"]\n\n1. e4 e5 1-0\n\n'
+         '[Result "0-1"]\n\n1. e4 c5 0-1\n\n'
+         '[Result "1/2-1/2"]\n\n1. d4 d5 1/2-1/2\n\n')
+
+
+@pytest.fixture
+def pgn(tmp_path):
+    path = tmp_path / "games.pgn"
+    path.write_text(GAMES)
+    return str(path)
+
+
+def book_moves(path, position):
+    opened = Book(path)
+    try:
+        return [(move_name(move), weight) for move, weight in opened.moves(position)]
+    finally:
+        opened.close()
+
+
+def test_build_and_probe(pgn, tmp_path):
+    path = str(tmp_path / "book.bin")
+    stats = build([pgn], path, out=io.StringIO())
+    assert (stats["games"], stats["moves"]) == (3, 6)
+    position = Position()
+    assert book_moves(path, position) == [("e2e4", 2), ("d2d4", 1)]  # a win counts 2, a draw 1, a loss 0
+    position.make_move(parse_move("e2e4"))
+    assert book_moves(path, position) == [("c7c5", 2)]  # e5 only lost
+    position.make_move(parse_move("c7c5"))
+    assert book_moves(path, position) == []
+    opened = Book(path)
+    assert move_name(opened.choose(Position(), random.Random(1))) in ("e2e4", "d2d4")
+    opened.close()
+
+
+def test_min_games(pgn, tmp_path):
+    path = str(tmp_path / "book.bin")
+    build([pgn], path, min_games=2, out=io.StringIO())
+    assert book_moves(path, Position()) == [("e2e4", 2), ("d2d4", 1)]
+    after_e4 = Position("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1")
+    after_d4 = Position("rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1")
+    assert book_moves(path, after_e4) == [("c7c5", 2)]
+    assert book_moves(path, after_d4) == []  # one game only
+
+
+def test_runs_merge_to_the_same_book(tmp_path):
+    rng = random.Random(0)
+    texts = []
+    for _game in range(20):
+        position = Position()
+        for _ply in range(12):
+            position.make_move(rng.choice(legal_moves(position)))
+        texts.append(Game.from_position(position, result=rng.choice(["1-0", "0-1", "1/2-1/2"])).pgn())
+    pgn = tmp_path / "random.pgn"
+    pgn.write_text("".join(texts))
+    one, many = str(tmp_path / "one.bin"), str(tmp_path / "many.bin")
+    assert build([str(pgn)], one, out=io.StringIO())["runs"] == 1
+    assert build([str(pgn)], many, max_entries=2, out=io.StringIO())["runs"] > 1
+    with open(one, "rb") as first, open(many, "rb") as second:
+        assert first.read() == second.read()
+    assert not [name for name in tmp_path.iterdir() if name.name.endswith(".tmp")]
+
+
+def test_bad_books_and_positions(pgn, tmp_path, capsys):
+    assert Book.open(str(tmp_path / "missing.bin")) is None
+    garbage = tmp_path / "garbage.bin"
+    garbage.write_bytes(b"not a book at all")
+    with pytest.raises(ValueError):
+        Book(str(garbage))
+    path = str(tmp_path / "book.bin")
+    build([pgn], path, out=io.StringIO())
+    assert book.main(["probe", "not a fen", "--book", path]) == 1
+    assert "FEN" in capsys.readouterr().out
+    assert book.main(["probe", Position().fen(), "--book", path]) == 0
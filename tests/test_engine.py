@@ -0,0 +1,41 @@
+import threading
+
+from anarchist_chess.engine import MATE, Searcher
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.position import Position
+
+MATE_IN_TWO = "k7/8/2K5/8/8/8/8/7R w - - 0 1"
+
+
+def test_mate_in_two_is_found_at_depth_3():
+    position = Position(MATE_IN_TWO)
+    move, score = Searcher().search(position, 2)
+    assert score < MATE - 100  # two plies can't see it
+    move, score = Searcher().search(position, 3)
+    assert score == MATE - 3
+    assert position.fen() == MATE_IN_TWO  # the search takes back every move it tries
+    position.make_move(move)
+    for reply in legal_moves(position):  # whatever black does, white mates next
+        position.make_move(reply)
+        mate, score = Searcher().search(position, 1)
+        assert score == MATE - 1
+        position.make_move(mate)
+        assert position.in_check() and not legal_moves(position)
+        position.unmake_move()
+        position.unmake_move()
+
+
+def test_no_moves():
+    assert Searcher().search(Position("k7/1Q6/1K6/8/8/8/8/8 b - - 0 1")) == (None, -MATE)  # mated
+    assert Searcher().search(Position("k7/8/1Q6/8/8/8/8/7K b - - 0 1")) == (None, 0)  # stalemate
+
+
+def test_stopped_search_still_returns_a_legal_move():
+    position = Position()
+    stop = threading.Event()
+    stop.set()
+    iterations = []
+    move, _score = Searcher().search(position, 64, stop_event=stop,
+                                     on_iteration=lambda *iteration: iterations.append(iteration))
+    assert move in legal_moves(position)
+    assert len(iterations) < 64
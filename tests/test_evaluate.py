@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+from anarchist_chess.evaluate import LAZY_MARGIN, check_consistency, evaluate, evaluate_from_scratch, recompute, \
+    sample_positions, taper
+from anarchist_chess.position import WHITE, Position
+from anarchist_chess.rules import ANARCHIST, STANDARD
+
+
+def mirrored(position):
+    """:return the position with the board flipped top to bottom and the colors swapped"""
+    rows = position.fen().split()[0].split("/")
+    board = "/".join(row.swapcase() for row in reversed(rows))
+    return Position("%s %s - - 0 1" % (board, "b" if position.side == WHITE else "w"), position.rules)
+
+
+@pytest.mark.parametrize("rules", [STANDARD, ANARCHIST])
+def test_running_totals_match_a_recompute(rules):
+    out = io.StringIO()
+    assert check_consistency(5, 120, rules, seed=1, out=out) == 0
+    assert "0 disagreed" in out.getvalue()
+
+
+def test_the_start_is_even_and_colors_are_symmetric():
+    assert evaluate(Position()) == 0
+    for position in sample_positions(30, seed=2):
+        assert position.score == recompute(position)
+        assert evaluate(position) == evaluate_from_scratch(position)
+        # the blends from middlegame to endgame round down, which can tip a mirrored score by a centipawn each
+        assert abs(evaluate(mirrored(position)) - evaluate(position)) <= 2
+
+
+def test_lazy_evaluation():
+    for position in sample_positions(30, seed=3):
+        full = evaluate(position)
+        assert evaluate(position, full - 1, full + 1) == full  # inside the window, nothing is left out
+        material = taper(position.score)[0] * (1 if position.side == WHITE else -1)
+        assert evaluate(position, material + LAZY_MARGIN, material + LAZY_MARGIN + 1) == material
+        assert evaluate(position, material - LAZY_MARGIN - 1, material - LAZY_MARGIN) == material
@@ -0,0 +1,23 @@
+from anarchist_chess.movegen import legal_moves, moves_by_destination
+from anarchist_chess.position import START_FEN, Position, move_name, parse_square, square_name
+
+
+def destinations(fen, square):
+    position = Position(fen)
+    found = moves_by_destination(legal_moves(position), parse_square(square))
+    return dict((square_name(to), sorted(move_name(move) for move in moves)) for to, moves in found.items())
+
+
+def test_destinations_of_a_piece():
+    assert destinations(START_FEN, "g1") == {"f3": ["g1f3"], "h3": ["g1h3"]}
+    assert destinations(START_FEN, "e2") == {"e3": ["e2e3"], "e4": ["e2e4"]}
+
+
+def test_a_promotion_is_one_destination():
+    assert destinations("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1", "b7") == {
+        "b8": ["b7b8b", "b7b8n", "b7b8q", "b7b8r"]}
+
+
+def test_a_piece_that_cant_move_has_none():
+    assert destinations("4k3/4r3/8/8/8/8/4N3/4K3 w - - 0 1", "e2") == {}  # pinned
+    assert destinations(START_FEN, "a1") == {}
@@ -0,0 +1,33 @@
+import pytest
+
+from anarchist_chess.engine import MATE, Searcher
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.parallel import BENCH_POSITIONS, ParallelSearcher
+from anarchist_chess.position import Position
+
+
+@pytest.fixture(scope="module")
+def searcher():
+    with ParallelSearcher(2, tt_megabytes=1) as searcher:
+        yield searcher
+
+
+def test_mate_in_two(searcher):
+    position = Position("k7/8/2K5/8/8/8/8/7R w - - 0 1")
+    move, score = searcher.search(position, 3)
+    assert score == MATE - 3
+    assert move in legal_moves(position)
+
+
+def test_no_moves(searcher):
+    assert searcher.search(Position("k7/1Q6/1K6/8/8/8/8/8 b - - 0 1")) == (None, -MATE)
+
+
+@pytest.mark.parametrize("fen", BENCH_POSITIONS[:3])
+def test_split_search_scores_like_one_process(searcher, fen):
+    iterations = []
+    move, score = searcher.search(Position(fen), 3, on_iteration=lambda *iteration: iterations.append(iteration))
+    assert score == Searcher().search(Position(fen), 3)[1]
+    assert move in legal_moves(Position(fen))
+    assert [iteration[0] for iteration in iterations] == [1, 2, 3]
+    assert searcher.nodes > 0
@@ -0,0 +1,106 @@
+import io
+import random
+
+import pytest
+
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.pgn import Game, IllegalMoveError, check_games, parse_game, parse_san, read_games, san
+from anarchist_chess.position import Position, START_FEN, move_name, parse_move
+from anarchist_chess.rules import Rules
+
+# white pawn on c4, black knight on d5: "d5" is not a move, "cxd5" is
+PAWN_AND_KNIGHT = "4k3/8/8/3n4/2P5/8/8/4K3 w - - 0 1"
+
+
+def parsed(fen, text, rules="b1"):
+    return move_name(parse_san(Position(fen, Rules.parse(rules)), text))
+
+
+@pytest.mark.parametrize("name", ["standard", "b1", "b1,forced-ep,horsey-leg"])
+def test_every_move_reads_back(name):
+    rng = random.Random(0)
+    for _game in range(5):
+        position = Position(rules=Rules.parse(name))
+        for _ply in range(100):
+            moves = legal_moves(position)
+            if not moves:
+                break
+            for move in moves:
+                assert parse_san(position, san(position, move)) == move, (position.fen(), move_name(move))
+            position.make_move(rng.choice(moves))
+
+
+def test_pawn_pushes_stay_on_their_file():
+    with pytest.raises(ValueError):
+        parse_san(Position(PAWN_AND_KNIGHT), "d5")
+    with pytest.raises(ValueError):
+        parse_san(Position(PAWN_AND_KNIGHT), "cd5")
+    assert parsed(PAWN_AND_KNIGHT, "cxd5") == "c4d5"
+    assert parsed(PAWN_AND_KNIGHT, "c5") == "c4c5"
+
+
+def test_pawn_captures_take_something():
+    with pytest.raises(ValueError):
+        parse_san(Position(PAWN_AND_KNIGHT), "cxb5")  # nothing on b5
+    with pytest.raises(ValueError):
+        parse_san(Position(PAWN_AND_KNIGHT), "xd5")
+    with pytest.raises(ValueError):
+        parse_san(Position(PAWN_AND_KNIGHT), "cxc5")
+    assert parsed("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "exd6") == "e5d6"  # en passant
+
+
+def test_castling_promotion_and_checks():
+    castles = "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"
+    assert parsed(castles, "O-O") == "e1g1"
+    assert parsed(castles, "O-O-O") == "e1c1"
+    assert parsed(castles, "Kb1") == "e1b1"
+    with pytest.raises(ValueError):
+        parse_san(Position(castles, Rules.parse("standard")), "Kb1")
+    assert parsed("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1", "b8=N+") == "b7b8n"
+    assert parsed("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1", "b8") == "b7b8q"
+    assert san(Position("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1"), parse_move("b7b8q")) == "b8=Q+"
+
+
+def test_ambiguous_and_illegal_moves():
+    rooks = "4k3/8/8/8/8/8/4K3/R6R w - - 0 1"
+    with pytest.raises(ValueError):
+        parse_san(Position(rooks), "Rd1")  # either rook
+    with pytest.raises(ValueError):
+        parse_san(Position(), "Nf6")
+    with pytest.raises(ValueError):
+        parse_san(Position(), "e5")
+    assert parsed(rooks, "Rad1") == "a1d1"
+
+
+def test_parse_game_skips_comments_and_variations():
+    game = parse_game('[White "A \\"quoted\\" name"]\n[Result "1-0"]\n\n'
+                      '1. e4 {best by test} e5 (1... c5 2. Nf3) 2. Nf3 $1 Nc6 ; a comment\n3. Bb5 1-0\n')
+    assert game.headers["White"] == 'A "quoted" name'
+    assert game.moves == ["e4", "e5", "Nf3", "Nc6", "Bb5"]
+    assert game.result == "1-0"
+    assert parse_game(game.pgn()).moves == game.moves
+
+
+def test_illegal_games_are_reported(tmp_path):
+    path = tmp_path / "games.pgn"
+    path.write_text('[Event "good"]\n\n1. e4 e5 2. Nf3 *\n\n'
+                    '[Event "bad"]\n\n1. e4 d5 2. d5 *\n\n'
+                    '[Event "from a FEN"]\n[FEN "%s"]\n[SetUp "1"]\n\n1. cxd5 *\n' % PAWN_AND_KNIGHT)
+    games = list(read_games(str(path)))
+    assert [game.headers["Event"] for game in games] == ["good", "bad", "from a FEN"]
+    with pytest.raises(IllegalMoveError) as error:
+        games[1].replay()
+    assert error.value.ply == 2
+    assert games[2].replay().fen().startswith("4k3/8/8/3P4/8/8/8/4K3 b")
+    assert check_games(str(path), out=io.StringIO()) == (3, 1)
+
+
+def test_from_position():
+    position = Position(rules=Rules.parse("b1,forced-ep"))
+    for name in ("e2e4", "d7d5", "e4d5"):
+        position.make_move(parse_move(name))
+    game = Game.from_position(position, {"White": "Jerry"})
+    assert game.moves == ["e4", "d5", "exd5"]
+    assert game.headers["Rules"] == "b1,forced-ep"
+    assert "FEN" not in game.headers and game.start_fen() == START_FEN
+    assert parse_game(game.pgn()).replay().fen() == position.fen()
@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.position import Position, encode_move, parse_move, parse_square, move_name, square_name
+from anarchist_chess.rules import STANDARD
+from anarchist_chess.zobrist import compute_key
+
+
+def test_parse_square():
+    assert parse_square("a1") == 0
+    assert parse_square("h8") == 63
+    assert parse_square("e2") == 12
+
+
+@pytest.mark.parametrize("name", ["a0", "a9", "i1", "e", "e22", "", "E2"])
+def test_parse_square_rejects(name):
+    with pytest.raises(ValueError):
+        parse_square(name)
+
+
+def test_parse_move():
+    assert parse_move("e2e4") == encode_move(12, 28)
+    assert move_name(parse_move("e7e8q")) == "e7e8q"
+
+
+@pytest.mark.parametrize("name", ["g9e3", "a0a1", "e2e9", "i2e4", "e2e", "e2e4k", "e7e8p", "e2e4qq"])
+def test_parse_move_rejects(name):
+    with pytest.raises(ValueError):
+        parse_move(name)
+
+
+def test_bad_en_passant_square():
+    with pytest.raises(ValueError):
+        Position("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e9 0 1")
+
+
+def test_key_follows_make_and_unmake():
+    rng = random.Random(1)
+    position = Position()
+    keys = []
+    for _ply in range(200):
+        moves = legal_moves(position)
+        if not moves:
+            break
+        keys.append(position.key)
+        position.make_move(rng.choice(moves))
+        assert position.key == compute_key(position)
+    while keys:
+        position.unmake_move()
+        assert position.key == keys.pop() == compute_key(position)
+
+
+def test_threefold_repetition():
+    position = Position()
+    assert not position.can_claim_draw()
+    for _round in range(2):
+        for name in ("g1f3", "g8f6", "f3g1", "f6g8"):
+            position.make_move(parse_move(name))
+    assert position.repetitions() == 2
+    assert position.can_claim_draw()
+    position.unmake_move()
+    assert not position.can_claim_draw()
+
+
+def test_fifty_move_rule():
+    position = Position("4k3/8/8/8/8/8/8/4K2R w - - 99 80")
+    assert not position.can_claim_draw()
+    position.make_move(parse_move("h1h2"))
+    assert position.can_claim_draw()
+
+
+@pytest.mark.parametrize("fen, move, changed", [
+    (None, "e2e4", ["e2", "e4"]),
+    ("4k3/8/8/3p4/4P3/8/8/4K3 w - - 0 1", "e4d5", ["d5", "e4"]),
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", ["d5", "d6", "e5"]),  # the pawn taken en passant
+    ("4k3/8/8/8/8/8/8/4K2R w K - 0 1", "e1g1", ["e1", "f1", "g1", "h1"]),  # the rook moves too
+    ("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1", "b7b8", ["b7", "b8"]),
+])
+def test_apply_move_reports_changed_squares(fen, move, changed):
+    position = Position(fen, STANDARD) if fen else Position(rules=STANDARD)
+    before = position.board[:]
+    squares = position.apply_move(parse_square(move[:2]), parse_square(move[2:]))
+    assert sorted(square_name(square) for square in squares) == changed
+    assert sorted(square_name(square) for square in range(64) if position.board[square] != before[square]) == changed
+
+
+def test_undo_and_redo():
+    position = Position()
+    fens, keys = [position.fen()], [position.key]
+    for name in ("e2e4", "d7d5", "e4d5", "g8f6"):
+        position.apply_move(parse_square(name[:2]), parse_square(name[2:]))
+        fens.append(position.fen())
+        keys.append(position.key)
+    assert sorted(position.undo()) == [parse_square("f6"), parse_square("g8")]
+    assert position.undo() == [parse_square("e4"), parse_square("d5")]
+    assert (position.fen(), position.key) == (fens[2], keys[2])
+    assert position.redo() == [parse_square("e4"), parse_square("d5")]
+    assert (position.fen(), position.key) == (fens[3], keys[3])
+    while position.undo() is not None:
+        pass
+    assert (position.fen(), position.key) == (fens[0], keys[0])
+    for fen, key in zip(fens[1:], keys[1:]):
+        position.redo()
+        assert (position.fen(), position.key) == (fen, key)
+    assert position.redo() is None
+
+
+def test_a_new_move_drops_the_redo_moves():
+    position = Position()
+    position.apply_move(parse_square("e2"), parse_square("e4"))
+    position.apply_move(parse_square("e7"), parse_square("e5"))
+    position.undo()
+    position.undo()
+    position.apply_move(parse_square("e2"), parse_square("e4"))  # the same move again, e7e5 can still be redone
+    assert position.redo() is not None
+    position.undo()
+    position.apply_move(parse_square("c7"), parse_square("c5"))
+    assert position.redo() is None
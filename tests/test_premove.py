@@ -0,0 +1,64 @@
+from anarchist_chess.attacks import squares_of
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.position import WHITE, BLACK, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, Position, make_piece, \
+    parse_move, parse_square, square_name
+from anarchist_chess.premove import PremoveQueue
+from anarchist_chess.rules import Rules
+
+AFTER_E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+
+
+def names(bits):
+    return sorted(square_name(square) for square in squares_of(bits))
+
+
+def test_destinations_ignore_the_other_side():
+    queue = PremoveQueue(WHITE)
+    position = Position(AFTER_E4)
+    assert names(queue.destinations(position, parse_square("g1"))) == ["e2", "f3", "h3"]
+    assert names(queue.destinations(position, parse_square("e7"))) == []  # not white's piece
+    assert "a6" in names(queue.destinations(position, parse_square("f1")))  # anything on the way is ignored
+    assert "d5" in names(queue.destinations(position, parse_square("e4")))  # a capture, in case black plays d5
+
+
+def test_premoves_are_played_in_order():
+    queue = PremoveQueue(WHITE)
+    position = Position(AFTER_E4)
+    queue.add(parse_square("g1"), parse_square("f3"))
+    queue.add(parse_square("f1"), parse_square("c4"))
+    assert queue.take(position, legal_moves(position)) is None  # black's turn
+    position.make_move(parse_move("e7e5"))
+    assert queue.take(position, legal_moves(position)) == parse_move("g1f3")
+    assert len(queue) == 1
+    assert queue.board(position)[parse_square("c4")] == make_piece(WHITE, BISHOP)
+
+
+def test_an_illegal_premove_drops_the_queue():
+    queue = PremoveQueue(WHITE)
+    position = Position(AFTER_E4)
+    queue.add(parse_square("e4"), parse_square("d5"))  # only legal if black plays d5
+    queue.add(parse_square("g1"), parse_square("f3"))
+    position.make_move(parse_move("e7e5"))
+    assert queue.take(position, legal_moves(position)) is False
+    assert len(queue) == 0
+
+
+def test_promotion_and_castling():
+    position = Position("4k3/1P6/8/8/8/8/8/R3K2R b KQ - 0 1", Rules.parse("b1"))
+    queue = PremoveQueue(WHITE)
+    assert queue.is_promotion(position, parse_square("b7"), parse_square("b8"))
+    queue.add(parse_square("b7"), parse_square("b8"), KNIGHT)
+    queue.add(parse_square("e1"), parse_square("b1"))
+    board = queue.board(position)
+    assert board[parse_square("b8")] == make_piece(WHITE, KNIGHT)
+    assert board[parse_square("d1")] == make_piece(WHITE, ROOK) and board[parse_square("a1")] == EMPTY
+    position.make_move(parse_move("e8e7"))
+    assert queue.take(position, legal_moves(position)) == parse_move("b7b8n")
+
+
+def test_limit():
+    queue = PremoveQueue(BLACK, limit=1)
+    position = Position()
+    queue.add(parse_square("e7"), parse_square("e5"))
+    assert queue.destinations(position, parse_square("d7")) == 0
+    assert queue.board(position)[parse_square("e5")] == make_piece(BLACK, PAWN)
@@ -0,0 +1,27 @@
+import threading
+
+from anarchist_chess.position import Position
+from anarchist_chess.profiling import Profiler
+
+
+def test_wrap_and_unwrap():
+    profiler = Profiler()
+    original = Position.in_check
+    profiler.wrap(Position, "in_check")
+    Position().in_check()
+    assert profiler.report()["Position.in_check"]["calls"] == 1
+    profiler.unwrap_all()
+    assert Position.in_check is original
+
+
+def test_other_threads_are_not_recorded():
+    profiler = Profiler()
+    profiler.wrap(Position, "in_check", thread=threading.current_thread())
+    try:
+        worker = threading.Thread(target=lambda: Position().in_check())
+        worker.start()
+        worker.join()
+        Position().in_check()
+    finally:
+        profiler.unwrap_all()
+    assert profiler.report()["Position.in_check"]["calls"] == 1
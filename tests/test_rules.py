@@ -0,0 +1,105 @@
+import pickle
+import random
+
+import pytest
+
+from anarchist_chess import movegen
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.perft import SUITE, perft
+from anarchist_chess.position import Position, START_FEN, move_name
+from anarchist_chess.rules import KINKS, STANDARD, Rules
+
+RULES = ["standard", "b1", "forced-ep", "horsey-leg", "castle-through-check", "b1,forced-ep,horsey-leg",
+         "b1,castle-through-check"]
+CASTLES = "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"
+
+
+def king_moves(fen, rules):
+    position = Position(fen, Rules.parse(rules))
+    king = position.kings[position.side]
+    return sorted(move_name(move) for move in legal_moves(position) if move & 63 == king)
+
+
+def random_positions(rules, games=10, plies=80, seed=0):
+    """Yields the positions of a few random games"""
+    rng = random.Random(seed)
+    for _game in range(games):
+        position = Position(rules=rules)
+        for _ply in range(plies):
+            moves = legal_moves(position)
+            if not moves:
+                break
+            yield position
+            position.make_move(rng.choice(moves))
+
+
+@pytest.mark.parametrize("name, fen, depth, count", [
+    (name, fen, depth, count) for name, fen, counts in SUITE
+    for depth, count in enumerate(counts, start=1) if count <= 10000])
+def test_perft_suite(name, fen, depth, count):
+    assert perft(Position(fen, STANDARD), depth) == count
+
+
+@pytest.mark.parametrize("rules, counts", [
+    ("standard", [20, 400, 8902]), ("b1", [20, 400, 8902]), ("forced-ep", [20, 400, 8902]),
+    ("horsey-leg", [16, 256, 4882]), ("castle-through-check", [20, 400, 8902])])
+def test_perft_start(rules, counts):
+    assert [perft(Position(START_FEN, Rules.parse(rules)), depth) for depth in (1, 2, 3)] == counts
+
+
+@pytest.mark.parametrize("name", RULES)
+def test_legal_moves_agree_with_is_legal(name):
+    rules = Rules.parse(name)
+    for position in random_positions(rules):
+        generated = set((move & 63, move >> 6 & 63) for move in legal_moves(position))
+        tested = set((sq1, sq2) for sq1 in range(64) if position.color_at(sq1) == position.side
+                     for sq2 in range(64) if position.is_legal(sq1, sq2))
+        assert generated == tested, position.fen()
+
+
+@pytest.mark.parametrize("name", ["standard", "b1", "castle-through-check", "b1,castle-through-check"])
+def test_masked_moves_agree_with_tested_moves(name):
+    for position in random_positions(Rules.parse(name), seed=1):
+        assert sorted(movegen.masked_moves(position)) == sorted(movegen.tested_moves(position)), position.fen()
+
+
+def test_b1_castling():
+    assert "e1b1" not in king_moves(CASTLES, "standard")
+    assert "e1b1" in king_moves(CASTLES, "b1")
+    position = Position(CASTLES, Rules.parse("b1"))
+    position.apply_move(4, 1)
+    assert position.fen().startswith("r3k2r/8/8/8/8/8/8/1K1R3R b kq")
+
+
+def test_forced_en_passant():
+    fen = "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1"
+    assert len(legal_moves(Position(fen, Rules.parse("standard")))) == 7
+    assert [move_name(move) for move in legal_moves(Position(fen, Rules.parse("forced-ep")))] == ["e5d6"]
+
+
+def test_horsey_leg():
+    fen = "4k3/8/8/8/8/8/6P1/4K1N1 w - - 0 1"  # the pawn on g2 blocks Ng1-f3 and Ng1-h3
+    jumps = [move_name(move) for move in legal_moves(Position(fen, Rules.parse("standard"))) if move & 63 == 6]
+    legs = [move_name(move) for move in legal_moves(Position(fen, Rules.parse("horsey-leg"))) if move & 63 == 6]
+    assert sorted(jumps) == ["g1e2", "g1f3", "g1h3"]
+    assert legs == ["g1e2"]
+
+
+def test_castle_through_check():
+    in_check = "r3k2r/8/8/8/8/8/4r3/R3K2R w KQkq - 0 1"
+    through = "r3kr2/8/8/8/8/8/8/R3K2R w KQq - 0 1"
+    into = "r3k1r1/8/8/8/8/8/8/R3K2R w KQq - 0 1"
+    for fen, castle in ((in_check, "e1g1"), (in_check, "e1c1"), (through, "e1g1")):
+        assert castle not in king_moves(fen, "standard")
+        assert castle in king_moves(fen, "castle-through-check")
+    assert "e1g1" not in king_moves(into, "castle-through-check")
+
+
+def test_rules_names():
+    for name in RULES:
+        rules = Rules.parse(name)
+        assert Rules.parse(rules.name()) == rules
+        assert pickle.loads(pickle.dumps(rules)).name() == rules.name()
+    assert Rules.parse(",".join(KINKS)).kinks == tuple(KINKS.values())
+    with pytest.raises(ValueError):
+        Rules.parse("two-moves")
@@ -0,0 +1,47 @@
+import io
+import json
+
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.position import START_FEN, Position, parse_move
+from anarchist_chess.rules import STANDARD
+from anarchist_chess.selfplay import BLACK_WINS, DRAW, WHITE_WINS, run
+
+
+def play(games, players, processes=2, **settings):
+    out = io.StringIO()
+    summary = run(games, players, processes=processes, out=out, log=io.StringIO(), **settings)
+    return summary, sorted((json.loads(line) for line in out.getvalue().splitlines()), key=lambda game: game["game"])
+
+
+def test_games_are_recorded_and_counted():
+    summary, games = play(6, ("random", "random"), rules=STANDARD, max_plies=300, seed=3)
+    assert [game["game"] for game in games] == list(range(6))
+    assert summary.games == 6
+    assert summary.plies == sum(game["plies"] for game in games)
+    assert sum(summary.results.values()) == 6
+    for game in games:
+        position = Position(game["fen"], STANDARD)
+        for name in game["moves"]:  # every move was legal when it was played
+            move = parse_move(name)
+            assert move in legal_moves(position)
+            position.make_move(move)
+        assert game["plies"] == len(game["moves"]) <= 300
+        if game["termination"] == "checkmate":
+            assert position.in_check() and not legal_moves(position)
+            assert game["result"] == (WHITE_WINS if position.side else BLACK_WINS)
+        else:
+            assert game["result"] == DRAW
+
+
+def test_seeded_runs_repeat_and_colors_swap():
+    # one process, so the engine's cutoff history carries over from game to game the same way both times
+    settings = dict(depth=1, max_plies=40, random_plies=2, seed=7, processes=1)
+    first = play(4, ("engine", "random"), **settings)[1]
+    assert [(game["white"], game["black"]) for game in first] == [("engine", "random"), ("random", "engine")] * 2
+    for game in first:
+        del game["seconds"]
+    second = play(4, ("engine", "random"), **settings)[1]
+    for game in second:
+        del game["seconds"]
+    assert first == second
+    assert all(game["fen"] == START_FEN and game["rules"] for game in first)
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import pytest
+
+from anarchist_chess.position import START_FEN
+from anarchist_chess.rules import ANARCHIST
+from anarchist_chess.server import Connection, GameServer, ServerGame
+
+
+class Writer:
+
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    def close(self):
+        pass
+
+    def messages(self):
+        return [json.loads(line) for line in self.data.splitlines()]
+
+
+@pytest.fixture
+def game():
+    server = GameServer()
+    players = (Connection(Writer()), Connection(Writer()))
+    game = ServerGame(1, ANARCHIST, 0, 0, players, 0.0)  # untimed, so no event loop is needed
+    server.games[1] = game
+    return server, game
+
+
+@pytest.mark.parametrize("name", ["g9e3", "a0a1", "e2e5", "e2e4q", "nonsense"])
+def test_bad_moves_are_refused(game, name):
+    server, game = game
+    with pytest.raises(ValueError):
+        server.move(game.players[0], game, name)
+    assert game.position.fen() == START_FEN
+
+
+def test_move_is_sent_to_both_players(game):
+    server, game = game
+    server.move(game.players[0], game, "g1f3")
+    for player in game.players:
+        assert player.writer.messages()[-1]["move"] == "g1f3"
+    with pytest.raises(ValueError):
+        server.move(game.players[0], game, "e7e5")  # not white's turn
+
+
+@pytest.mark.parametrize("time, increment", [("inf", 0), ("nan", 0), (-1, 0), (60, "-inf"), (60, "nan")])
+def test_bad_clocks_are_refused(time, increment):
+    server = GameServer()
+    with pytest.raises(ValueError):
+        server.dispatch(Connection(Writer()), {"op": "seek", "time": time, "increment": increment})
+    assert not server.seeks
+
+
+def test_a_reset_while_sending_ends_the_connection_quietly():
+    class ResetWriter(Writer):
+        async def drain(self):
+            raise ConnectionResetError()
+
+    async def serve_one():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b'{"op": "stats"}\n{"op": "stats"}\n')
+        server = GameServer()
+        await server.handle(reader, ResetWriter())  # returns instead of raising
+        return server
+
+    server = asyncio.run(serve_one())
+    assert not server.connections
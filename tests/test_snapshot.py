@@ -0,0 +1,79 @@
+import io
+import random
+
+import pytest
+
+from anarchist_chess import snapshot
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.pgn import Game, read_games
+from anarchist_chess.position import Position
+from anarchist_chess.rules import Rules
+
+
+def random_game(rules, plies=120, seed=0):
+    """:return a Position after a random game, with a couple of moves taken back so there is something to redo"""
+    rng = random.Random(seed)
+    position = Position(rules=rules)
+    for _ply in range(plies):
+        moves = legal_moves(position)
+        if not moves:
+            break
+        position.make_move(rng.choice(moves))
+    position.undo()
+    position.undo()
+    return position
+
+
+@pytest.mark.parametrize("name", ["standard", "b1", "b1,forced-ep,horsey-leg", "castle-through-check"])
+def test_snapshot_round_trip(name):
+    position = random_game(Rules.parse(name))
+    data = snapshot.dumps(position, "1-0")
+    loaded, result, end = snapshot.loads(data, check=True)
+    assert (result, end) == ("1-0", len(data))
+    assert loaded.fen() == position.fen()
+    assert loaded.rules == position.rules
+    assert [record[0] for record in loaded.history] == [record[0] for record in position.history]
+    assert loaded.redo_moves == position.redo_moves
+
+
+def test_snapshot_from_a_fen():
+    position = Position("4k3/8/8/3pP3/8/8/8/4K3 w - d6 3 40", Rules.parse("forced-ep"))
+    position.apply_move(36, 43)
+    loaded = snapshot.loads(snapshot.dumps(position))[0]
+    assert loaded.fen() == position.fen()
+
+
+def test_damaged_snapshots_are_refused():
+    data = snapshot.dumps(random_game(Rules.parse("b1")))
+    with pytest.raises(ValueError):
+        snapshot.loads(data[:-1])
+    with pytest.raises(ValueError):
+        snapshot.loads(b"XXXX" + data[4:])
+    illegal = bytearray(data)
+    illegal[snapshot.RECORD.size:snapshot.RECORD.size + 2] = (12 | 44 << 6).to_bytes(2, "little")  # e2e6
+    with pytest.raises(ValueError):
+        snapshot.loads(bytes(illegal), check=True)
+
+
+def test_write_and_read(tmp_path):
+    position = random_game(Rules.parse("b1"), seed=3)
+    path = str(tmp_path / "game.acs")
+    snapshot.write(path, position, "*")
+    assert snapshot.read(path)[0].fen() == position.fen()
+    saver = snapshot.Autosaver(str(tmp_path / "autosave.acs"))
+    saver.save(position)
+    saver.close()
+    assert snapshot.read(saver.path)[0].fen() == position.fen()
+
+
+def test_pgn_archive_round_trip(tmp_path):
+    games = [Game.from_position(random_game(Rules.parse("b1"), seed=seed), {"Date": "????.??.??"})
+             for seed in range(5)]
+    pgn = tmp_path / "games.pgn"
+    pgn.write_text("".join(game.pgn() for game in games))
+    archive, back = str(tmp_path / "games.acs"), str(tmp_path / "back.pgn")
+    out = io.StringIO()
+    assert snapshot.pgn_to_archive([str(pgn)], archive, out=out) == (5, 0)
+    assert snapshot.archive_to_pgn([archive], back, out=out) == 5
+    assert open(back).read() == pgn.read_text()
+    assert [game.replay().fen() for game in read_games(back)] == [game.replay().fen() for game in games]
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from anarchist_chess.position import WHITE, BLACK, QUEEN, KNIGHT  # noqa: E402
+from anarchist_chess.sprites import CACHED_SIZES, SpriteCache  # noqa: E402
+
+PIECES = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_disk_cache_is_reused(tmp_path):
+    SpriteCache(PIECES, str(tmp_path)).sprite(WHITE, QUEEN, 40)
+    cache = SpriteCache(PIECES, str(tmp_path))
+    assert cache.sprite(WHITE, QUEEN, 40).size == (40, 40)
+    assert cache.decoded == 0
+
+
+def test_only_recent_sizes_are_kept(tmp_path):
+    cache = SpriteCache(PIECES, str(tmp_path))
+    sizes = list(range(20, 20 + CACHED_SIZES + 3))
+    for size in sizes:
+        cache.sprite(WHITE, QUEEN, size)
+    cache.sprite(BLACK, KNIGHT, 20)
+    queens = [name for name in os.listdir(str(tmp_path)) if name.startswith("white-q-")]
+    assert sorted(int(name.split("-")[2]) for name in queens) == sizes[-CACHED_SIZES:]
+    assert any(name.startswith("black-n-20-") for name in os.listdir(str(tmp_path)))
+
+
+def test_older_source_versions_are_removed(tmp_path):
+    stale = tmp_path / "white-q-40-1-2.png"
+    stale.write_bytes(b"")
+    SpriteCache(PIECES, str(tmp_path)).sprite(WHITE, QUEEN, 40)
+    assert not stale.exists()
@@ -0,0 +1,59 @@
+import io
+import random
+
+import pytest
+
+from anarchist_chess.movegen import legal_moves
+from anarchist_chess.position import WHITE, Position, move_name
+from anarchist_chess.rules import ANARCHIST
+from anarchist_chess.tablebase import DRAW, LOSS, WIN, Tablebases, describe, generate
+
+
+@pytest.fixture(scope="module")
+def tablebases(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("tablebases"))
+    stats = generate(["KRK"], directory, ANARCHIST, processes=1, out=io.StringIO())
+    assert [table["signature"] for table in stats] == ["KRK"]
+    assert stats[0]["longest_mate"] == 32  # the longest KRK mate is 16 moves
+    return Tablebases(directory)
+
+
+def test_probe(tablebases):
+    mate_in_one = Position("k7/8/1K6/8/8/8/8/7R w - - 0 1")
+    assert tablebases.probe(mate_in_one) == (WIN, 1)
+    assert move_name(tablebases.best_move(mate_in_one)[0]) == "h1h8"
+    assert describe(tablebases.probe(mate_in_one), WHITE) == "white mates in 1"
+    assert tablebases.probe(Position("R6k/8/6K1/8/8/8/8/8 b - - 0 1")) == (LOSS, 0)  # mated already
+    assert tablebases.probe(Position("8/8/4k3/8/8/8/8/4K3 w - - 0 1")) == (DRAW, 0)
+    assert tablebases.probe(Position("8/8/4k3/8/8/8/8/Q3K3 w - - 0 1")) is None  # no KQK table
+    assert tablebases.probe(Position()) is None
+
+
+def test_values_follow_from_the_moves(tablebases):
+    rng = random.Random(0)
+    checked = 0
+    while checked < 200:
+        squares = rng.sample(range(64), 3)
+        board = ["1"] * 64
+        for square, letter in zip(squares, "KRk"):
+            board[square] = letter
+        rows = ["".join(board[rank * 8:rank * 8 + 8]) for rank in range(7, -1, -1)]
+        position = Position("/".join(rows) + " %s - - 0 1" % "wb"[rng.randrange(2)])
+        if position.is_attacked(position.kings[1 - position.side], position.side) or \
+                abs(squares[0] % 8 - squares[2] % 8) <= 1 and abs(squares[0] // 8 - squares[2] // 8) <= 1:
+            continue  # can't happen
+        result = tablebases.probe(position)
+        replies = []
+        for move in legal_moves(position):
+            position.make_move(move)
+            replies.append(tablebases.probe(position))
+            position.unmake_move()
+        if not replies:
+            assert result[0] in (LOSS, DRAW) and result[1] == 0
+        elif any(outcome == LOSS for outcome, _plies in replies):
+            assert result == (WIN, 1 + min(plies for outcome, plies in replies if outcome == LOSS))
+        elif all(outcome == WIN for outcome, _plies in replies):
+            assert result == (LOSS, 1 + max(plies for _outcome, plies in replies))
+        else:
+            assert result[0] == DRAW
+        checked += 1
@@ -0,0 +1,51 @@
+from anarchist_chess.transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+
+def bucket_keys(table, count):
+    """:return count different keys that all land in the same bucket"""
+    return [12345 + n * (table.mask + 1) for n in range(count)]
+
+
+def test_store_and_probe():
+    table = TranspositionTable(1)
+    assert table.probe(99) is None
+    table.store(99, 1234, 7, LOWER, -250)
+    assert table.probe(99) == (1234, 7, LOWER, -250)
+    table.store(99, 0, 8, UPPER, 30)  # no best move this time, the old one is kept
+    assert table.probe(99) == (1234, 8, UPPER, 30)
+    table.clear()
+    assert table.probe(99) is None
+
+
+def test_the_shallowest_entry_is_replaced():
+    table = TranspositionTable(1)
+    deep, shallow, new = bucket_keys(table, 3)
+    table.store(deep, 1, 10, EXACT, 0)
+    table.store(shallow, 2, 2, EXACT, 0)
+    table.store(new, 3, 5, EXACT, 0)
+    assert table.probe(shallow) is None
+    assert table.probe(deep) is not None and table.probe(new) is not None
+
+
+def test_entries_of_older_searches_go_first():
+    table = TranspositionTable(1)
+    deep, shallow, new, newer = bucket_keys(table, 4)
+    table.store(deep, 1, 10, EXACT, 0)
+    table.store(shallow, 2, 2, EXACT, 0)
+    table.new_search()
+    table.store(new, 3, 1, EXACT, 0)  # both are old, the shallower one goes
+    assert table.probe(shallow) is None
+    table.store(newer, 4, 1, EXACT, 0)  # the deep entry is old, the other one belongs to this search
+    assert table.probe(deep) is None
+    assert table.probe(new) == (3, 1, EXACT, 0)
+    assert table.probe(newer) == (4, 1, EXACT, 0)
+
+
+def test_usage():
+    table = TranspositionTable(1)
+    assert table.usage() == 0
+    for key in range(1, table.size + 1):
+        table.store(key, 0, 1, EXACT, 0)
+    assert table.usage() > 0.5
+    table.new_search()
+    assert table.usage() == 0
@@ -0,0 +1,41 @@
+import io
+
+from anarchist_chess.position import START_FEN
+from anarchist_chess.uci import Engine
+
+
+def run(*commands):
+    """:return the lines the engine writes for the commands"""
+    out = io.StringIO()
+    engine = Engine(out)
+    engine.run(line + "\n" for line in commands)
+    return out.getvalue().splitlines()
+
+
+def test_uci_handshake():
+    lines = run("uci", "quit")
+    assert lines[0].startswith("id name ")
+    assert lines[-1] == "uciok"
+
+
+def test_position_and_go():
+    lines = run("setoption name OwnBook value false", "setoption name Tablebases value false",
+                "position startpos moves e2e4 e7e5", "go depth 2", "quit")
+    assert any(line.startswith("info depth 2 ") for line in lines)
+    assert lines[-1].startswith("bestmove ") and lines[-1] != "bestmove 0000"
+
+
+def test_position_startpos():
+    assert run("position startpos", "d", "quit") == [START_FEN]
+
+
+def test_malformed_move_is_refused():
+    lines = run("position startpos moves g9e3", "d", "quit")
+    assert lines[0].startswith("info string bad position")
+    assert lines[1] == START_FEN
+
+
+def test_illegal_move_is_refused():
+    lines = run("position startpos moves e2e5", "d", "quit")
+    assert lines[0].startswith("info string bad position")
+    assert lines[1] == START_FEN